@@ -7,12 +7,20 @@ expiry='7776000'
 base=$(basename -- ${original})
 original_name=${base%%.*}
 original_ext=${base##*.}
+original_dir=$(dirname -- ${original})
+# the parsed form of the export written by load-questionnaire-data
+cache_ext='parquet'
+cache=${original_dir}/${original_name}.${cache_ext}
 id=$(date '+%y_%m_%d')
 back=${dest}/${original_name}-${id}.${original_ext}
 
 mkdir -p $dest
 mv ${original} ${back}
-for filename in ${dest}/${original_name}*.${original_ext}; do
+if [[ -f ${cache} ]]; then
+  mv ${cache} ${dest}/${original_name}-${id}.${cache_ext}
+fi
+for filename in ${dest}/${original_name}*.${original_ext} ${dest}/${original_name}*.${cache_ext}; do
+  [[ -e ${filename} ]] || continue
   name_file=${filename##*-}
   id_file=${name_file%%.*}
   date_diff=$(($(date -d ${id//_/-} '+%s') - $(date -d ${id_file//_/-} '+%s')))
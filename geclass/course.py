@@ -2,14 +2,16 @@
 from datetime import date, datetime
 import logging
 import os
+import sqlite3
 
 from flask import (
-    Blueprint, flash, redirect, render_template, request, session, url_for, current_app, send_from_directory, send_file
+    Blueprint, abort, flash, redirect, render_template, request, session, url_for, current_app, send_from_directory, send_file
 )
 
 from geclass.auth import login_required
 from geclass.course_db import CourseDB
 from geclass.course_question import HandleCourseQuestions
+from geclass.util.questionnaire_db import QuestionnaireDB
 
 log = logging.getLogger(__name__)
 
@@ -21,7 +23,11 @@ bp = Blueprint(name='course', import_name=__name__)
 def send_pdf(course_name):
     report_dir = os.path.join(current_app.instance_path, course_name)
     #return send_from_directory(report_dir, 'report.pdf')
-    return send_file(os.path.join(report_dir, 'report.pdf'))
+    report_pdf = os.path.join(report_dir, 'report.pdf')
+    # the directory also exists if no report could be created
+    if not os.path.isfile(report_pdf):
+        abort(404)
+    return send_file(report_pdf)
 
 
 @bp.route('/report/example.pdf')
@@ -35,17 +41,27 @@ def send_example():
 def overview():
     course_db = CourseDB()
     courses = course_db.get_overview(session['user_id'])
+    # the responses of all courses are counted in one query
+    try:
+        counts = QuestionnaireDB().get_course_counts(
+            [course[8] for course in courses])
+    except sqlite3.OperationalError as e:
+        # the matched pairs are only counted after migration 004
+        log.warning('Cannot count the responses, the questionnaire database '
+                    'may need `flask migrate-questionnaire-db`: %s', e)
+        counts = {}
     past_courses = []
     current_courses = []
     for course in courses:
+        fields = list(course[:8]) + list(
+            counts.get(course[8], ('-', '-', '-')))
         course_post = datetime.strptime(course[7], '%d.%m.%Y').date()
         if course_post < date.today():
-            report_dir = os.path.join(current_app.instance_path, course[0])
-            if os.path.exists(report_dir):
-                course = list(course) + [course[0]]
-            past_courses.append(course)
+            report_pdf = os.path.join(
+                current_app.instance_path, course[0], 'report.pdf')
+            past_courses.append((fields, os.path.exists(report_pdf)))
         else:
-            current_courses.append(course)
+            current_courses.append(fields)
     return render_template(
         'course/overview.html', current_courses=current_courses,
         past_courses=past_courses)
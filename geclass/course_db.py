@@ -1,5 +1,6 @@
 """A class to handle the course management."""
 from datetime import date
+import collections
 import logging
 import secrets
 import string
@@ -140,6 +141,25 @@ Vielen Dank für die Teilnahme an diesem Projekt.""".format(
         sql = "SELECT id FROM course WHERE identifier = ?"
         return self.execute(sql, (identifier,)).fetchone()
 
+    def get_course_identifier(self, course_id):
+        """Return the identifier of a course or None if it does not exist."""
+        sql = "SELECT identifier FROM course WHERE id = ?"
+        row = self.execute(sql, (course_id,)).fetchone()
+        return None if row is None else row['identifier']
+
+    def get_all_course_ids(self):
+        """Return a dict with the id of every course by its identifier.
+
+        If an identifier is not unique the course with the smallest id is
+        used, like in `get_course_id`.
+
+        """
+        sql = "SELECT identifier, id FROM course ORDER BY id DESC"
+        return {
+            identifier: course_id
+            for identifier, course_id in self.execute(sql, ()).fetchall()
+        }
+
     def get_similar_course_ids(self, course_id):
         """Return the id of similar courses
 
@@ -163,6 +183,34 @@ Vielen Dank für die Teilnahme an diesem Projekt.""".format(
             AND id != ?"""
         return self.execute(sql_similar, info).fetchall()
 
+    def get_cohorts(self, course_ids):
+        """Return the cohort of courses.
+
+        The cohort of a course are the course itself and all similar courses,
+        see `get_similar_course_ids`. Courses of the same cohort get the same
+        tuple, so it can be used to group them.
+
+        Returns:
+            A dict with the sorted tuple of the ids in the cohort for each
+            course id.
+
+        """
+        sql = """
+            SELECT
+                course.id,
+                similar.id
+            FROM course
+            JOIN course AS similar
+                ON similar.experience_id = course.experience_id
+               AND similar.program_id = course.program_id
+            WHERE course.id IN ({})
+            ORDER BY course.id, similar.id"""
+        members = collections.defaultdict(list)
+        for course_id, similar_id in self.execute_in_chunks(
+                sql, dict.fromkeys(course_ids)):
+            members[course_id].append(similar_id)
+        return {course_id: tuple(ids) for course_id, ids in members.items()}
+
     def get_course_report_info(self, course_id):
         """Return information necessary for the report.
 
@@ -179,12 +227,34 @@ Vielen Dank für die Teilnahme an diesem Projekt.""".format(
             WHERE id = ?"""
         return self.execute(sql, (course_id,)).fetchone()
 
+    def get_course_report_infos(self, course_ids):
+        """Return the information necessary for the reports of courses.
+
+        Returns:
+            A dict with the name and the number of students, like
+            `get_course_report_info`, for each course id.
+
+        """
+        sql = """
+            SELECT
+                id,
+                name,
+                number_students
+            FROM
+                course
+            WHERE id IN ({})"""
+        return {
+            course_id: (name, number_students)
+            for course_id, name, number_students in self.execute_in_chunks(
+                sql, dict.fromkeys(course_ids))
+        }
+
     def get_overview(self, user_id):
         """Return information for the overview page.
 
         Information include the course identifier, name, univeristy name,
-        program name, experience level, number of students and start and
-        end time.
+        program name, experience level, number of students, start and
+        end time and the course id.
 
         """
         sql = """
@@ -196,7 +266,8 @@ Vielen Dank für die Teilnahme an diesem Projekt.""".format(
               experience.experience_level,
               number_students,
               strftime('%d.%m.%Y', start_date_pre, 'unixepoch'),
-              strftime('%d.%m.%Y', start_date_post, 'unixepoch')
+              strftime('%d.%m.%Y', start_date_post, 'unixepoch'),
+              course.id
             FROM course, university, program, experience
             WHERE course.user_id = ?
               AND university.id = course.university_id
@@ -217,6 +288,31 @@ Vielen Dank für die Teilnahme an diesem Projekt.""".format(
             return None
         return {"pre": times[0][0], "post": times[0][1]}
 
+    def get_all_questionnaire_dates(self):
+        """Return the dates for the pre and post questionnaire of all courses.
+
+        Returns:
+            A dict with the course identifier as key and the dates in the
+            same form as `get_course_questionnaire_dates`. Identifiers that
+            are not unique are left out.
+
+        """
+        sql = """
+            SELECT
+              identifier,
+              start_date_pre,
+              start_date_post
+            FROM course"""
+        dates = {}
+        duplicates = set()
+        for identifier, pre, post in self.execute(sql, ()).fetchall():
+            if identifier in dates:
+                duplicates.add(identifier)
+            dates[identifier] = {"pre": pre, "post": post}
+        for identifier in duplicates:
+            del dates[identifier]
+        return dates
+
     def _add_and_get_new_id(self, table, column, value):
         """Add a new entry to the given table.
 
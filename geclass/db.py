@@ -9,6 +9,9 @@ as the creation.
 
 """
 
+import contextlib
+import os
+import re
 import sqlite3
 import logging
 
@@ -18,6 +21,10 @@ from flask.cli import with_appcontext
 
 log = logging.getLogger(__name__)
 
+# Maximum number of values bound in one statement by `execute_in_chunks`,
+# older versions of SQLite only allow 999 variables per statement.
+MAX_VALUES_PER_QUERY = 500
+
 
 class DBConnection:
     """Connection handler for the GEclass website.
@@ -74,6 +81,38 @@ class DBConnection:
         log.debug('query "%s" with parameters %s', sql, parameters)
         return self.db.execute(sql, parameters)
 
+    def execute_in_chunks(self, sql, values, parameters=(),
+                          placeholder='?'):
+        """Execute a SQL query for a list of values of any length.
+
+        The `{}` in the SQL statement is replaced by one placeholder for
+        each value, e.g. in `IN ({})`. The statement is executed for chunks
+        of at most MAX_VALUES_PER_QUERY values.
+
+        Args:
+            sql (str): The SQL query with `{}` for the placeholders.
+            values (list): The values for the placeholders.
+            parameters (tuple): Replacements for the other placeholders,
+                which have to come before `{}` in the statement.
+            placeholder (str): The placeholder of one value, e.g. `(?)` for
+                a VALUES list.
+
+        Returns:
+            A list with the rows of all chunks.
+
+        >>> execute_in_chunks('SELECT id FROM user WHERE id IN ({})', [1, 3])
+        [(1,), (3,)]
+
+        """
+        values = list(values)
+        rows = []
+        for i in range(0, len(values), MAX_VALUES_PER_QUERY):
+            chunk = values[i:i + MAX_VALUES_PER_QUERY]
+            rows.extend(self.execute(
+                sql.format(', '.join([placeholder] * len(chunk))),
+                [*parameters, *chunk]).fetchall())
+        return rows
+
     def _select(self, table, column, value):
         """Select entries from a table.
 
@@ -209,6 +248,84 @@ class DBConnection:
         self.db.commit()
         return last_id
 
+    def add_many(self, table, columns, rows):
+        """Add multiple new rows to the database with a single statement.
+
+        Careful: The inputs `table` and `columns` are not sanitized.
+
+        In contrast to `add` nothing is committed, so this is meant to be
+        used inside of `transaction`.
+
+        Args:
+            table (str): The table to add the rows to.
+            columns (list(str)): The columns in which to add data.
+            rows (list(list(str or int or float))): The values to add in the
+                                                 fields, one list per row.
+
+        >>> with transaction():
+        ...     add_many('user', ('email', 'password'),
+        ...              [('a@uni-potsdam.de', 'a'), ('b@uni-potsdam.de', 'b')])
+        >>> select_one('user', 'email', 'b@uni-potsdam.de')
+        (4, 'b@uni-potsdam.de', 'b')
+
+        """
+        value_string = ', '.join(['?'] * len(columns))
+        column_string = ', '.join(columns)
+        sql = 'INSERT INTO {} ({}) VALUES ({})'\
+            ''.format(table, column_string, value_string)
+        log.debug('query "%s" for %d rows', sql, len(rows))
+        self.db.executemany(sql, rows)
+
+    def next_id(self, table):
+        """Return the id the next row added to a table will get.
+
+        Only works for tables with an AUTOINCREMENT primary key. Together
+        with `transaction` this allows to assign the ids of many rows at
+        once, before they are added with `add_many`.
+
+        Args:
+            table (str): The table to get the next id for.
+
+        >>> next_id('user')
+        4
+
+        """
+        sql = 'SELECT seq FROM sqlite_sequence WHERE name = ?'
+        row = self.execute(sql, (table,)).fetchone()
+        return 1 if row is None else row[0] + 1
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group all statements in the block into a single transaction.
+
+        The database is locked for other writers until the block is left.
+        The transaction is committed at the end of the block and rolled back
+        if an exception is raised. Inside an open transaction the block
+        becomes a savepoint, which is only rolled back on its own, the outer
+        transaction stays open.
+
+        >>> with transaction():
+        ...     add_many('user', ('email', 'password'), rows)
+
+        """
+        if self.db.in_transaction:
+            self.db.execute('SAVEPOINT nested_transaction')
+            try:
+                yield self
+            except BaseException:
+                self.db.execute('ROLLBACK TO nested_transaction')
+                self.db.execute('RELEASE nested_transaction')
+                raise
+            self.db.execute('RELEASE nested_transaction')
+            return
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            yield self
+        except BaseException:
+            self.db.rollback()
+            raise
+        self.db.commit()
+
     def update_one(self, table, condition, new_value):
         """Update fields in the database.
 
@@ -239,6 +356,74 @@ class DBConnection:
         self.db.commit()
 
 
+def list_migrations(directory):
+    """Return all migrations in a directory of the app.
+
+    Migrations are SQL scripts named `<version>_<description>.sql`, the
+    versions start at 1 and increase by one for every new migration.
+
+    Args:
+        directory (str): The directory relative to the app root.
+
+    Returns:
+        A sorted list of (version, resource) tuples.
+
+    >>> list_migrations('migrations')
+    [(1, 'migrations/001_add_indexes.sql')]
+
+    """
+    migrations = []
+    for name in os.listdir(os.path.join(current_app.root_path, directory)):
+        match = re.match(r'^(\d+)_\w+\.sql$', name)
+        if match is not None:
+            migrations.append(
+                (int(match.group(1)), '{}/{}'.format(directory, name)))
+    return sorted(migrations)
+
+
+def set_schema_version(db, directory):
+    """Mark a new database as up to date with all migrations."""
+    migrations = list_migrations(directory)
+    version = migrations[-1][0] if migrations else 0
+    db().execute('PRAGMA user_version = {:d}'.format(version))
+
+
+def migrate(db, directory):
+    """Apply all migrations that are newer than the database.
+
+    The version of the database is tracked in `PRAGMA user_version`. Every
+    migration is applied in its own transaction together with the update of
+    the version, so a failing migration leaves the database untouched.
+
+    Args:
+        db (DBConnection): The database to migrate.
+        directory (str): The directory of the migrations relative to the app
+            root.
+
+    Returns:
+        The list of versions that were applied.
+
+    """
+    version = db.execute('PRAGMA user_version', ()).fetchone()[0]
+    applied = []
+    for migration_version, resource in list_migrations(directory):
+        if migration_version <= version:
+            continue
+        log.info('Apply migration %s', resource)
+        with current_app.open_resource(resource) as f:
+            script = f.read().decode('utf8')
+        try:
+            db().executescript(
+                'BEGIN;\n{}\nPRAGMA user_version = {:d};\nCOMMIT;'
+                ''.format(script, migration_version))
+        except sqlite3.Error:
+            if db().in_transaction:
+                db().rollback()
+            raise
+        applied.append(migration_version)
+    return applied
+
+
 def init_db():
     """Remove old database (if it exists) and create a new one."""
     log.info('Create a new database')
@@ -247,6 +432,7 @@ def init_db():
         db().executescript(f.read().decode('utf8'))
     with current_app.open_resource('default.sql') as f:
         db().executescript(f.read().decode('utf8'))
+    set_schema_version(db, 'migrations')
 
 
 @click.command('init-db')
@@ -267,6 +453,24 @@ def init_db_command():
     click.echo('Initialized the database')
 
 
+@click.command('migrate-db')
+@with_appcontext
+def migrate_db_command():
+    """Create CLI for updating the database with `flask migrate-db`.
+
+    All migrations the database is missing are applied, the existing data
+    is kept.
+
+    ::
+
+        $ flask migrate-db
+
+
+    """
+    applied = migrate(DBConnection(), 'migrations')
+    click.echo('Applied {:d} migrations to the database'.format(len(applied)))
+
+
 def close_db(e=None):
     """Close the database. Needed for the teardown."""
     db = g.pop(name='db', default=None)
@@ -278,3 +482,4 @@ def init_app(app):
     """Create connection to the factory."""
     app.teardown_appcontext(close_db)
     app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_db_command)
@@ -16,7 +16,8 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY=key,
         DATABASE=os.path.join(app.instance_path, 'geclass.sqlite'),
-        QUESTIONNAIRE_DB=os.path.join(app.instance_path, 'questionnaire.sqlite')
+        QUESTIONNAIRE_DB=os.path.join(app.instance_path, 'questionnaire.sqlite'),
+        FAST_REPORTS=False,
     )
     if test_config is None:
         app.config.from_pyfile('config.py', silent=True)
@@ -51,6 +52,9 @@ def create_app(test_config=None):
     from .util import questionnaire_db
     questionnaire_db.init_app(app)
 
+    from .util import backfill
+    backfill.init_app(app)
+
     from .util import download_data
     download_data.init_app(app)
 
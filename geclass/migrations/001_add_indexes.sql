@@ -0,0 +1,6 @@
+CREATE INDEX IF NOT EXISTS course_identifier ON course (identifier);
+CREATE INDEX IF NOT EXISTS course_user_id ON course (user_id);
+CREATE INDEX IF NOT EXISTS course_experience_program
+  ON course (experience_id, program_id);
+CREATE INDEX IF NOT EXISTS course_start_date_pre ON course (start_date_pre);
+CREATE INDEX IF NOT EXISTS course_start_date_post ON course (start_date_post);
@@ -126,3 +126,8 @@ CREATE TABLE university_type (
   university_type_name TEXT NOT NULL
 );
 
+CREATE INDEX course_identifier ON course (identifier);
+CREATE INDEX course_user_id ON course (user_id);
+CREATE INDEX course_experience_program ON course (experience_id, program_id);
+CREATE INDEX course_start_date_pre ON course (start_date_pre);
+CREATE INDEX course_start_date_post ON course (start_date_post);
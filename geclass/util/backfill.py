@@ -0,0 +1,164 @@
+"""Load all backed up questionnaire exports at once.
+
+To rebuild the questionnaire database or to recover from a failed night all
+files in /instance/backup_data can be loaded with
+
+    $ flask backfill
+
+The files are read and prepared by multiple processes in parallel (`--jobs`),
+the combined data is then written in a single transaction. Responses that are
+in multiple files or already in the database are only loaded once.
+
+"""
+
+import concurrent.futures
+import logging
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+import pandas as pd
+
+from geclass.course_db import CourseDB
+from geclass.util.questionnaire_db import IngestCache, QuestionnaireDB
+from geclass.util.questionnaire_prepare import PrepareData
+from geclass.util.questionnaire_read import (
+    ARROW_EXTENSIONS, CHUNKSIZE, CSV_EXTENSIONS, EXCEL_EXTENSIONS,
+    LEGACY_EXCEL_EXTENSIONS, PARQUET_EXTENSIONS, cache_location,
+    read_questionnaire_chunks)
+
+log = logging.getLogger(__name__)
+
+
+def find_exports(directory):
+    """Return the exports in the directory sorted by name.
+
+    Parquet files that are the cache of an excel export are left out, the
+    cache is used when the export is read.
+
+    """
+    excel_extensions = EXCEL_EXTENSIONS + LEGACY_EXCEL_EXTENSIONS
+    extensions = (excel_extensions + CSV_EXTENSIONS + PARQUET_EXTENSIONS
+                  + ARROW_EXTENSIONS)
+    files = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if os.path.splitext(name)[1].lower() in extensions
+    )
+    caches = {
+        cache_location(path) for path in files
+        if os.path.splitext(path)[1].lower() in excel_extensions
+    }
+    return [path for path in files if path not in caches]
+
+
+def prepare_export(file_location, course_dates, chunksize=CHUNKSIZE):
+    """Read and prepare one export.
+
+    Args:
+        file_location (str): The path to the export.
+        course_dates (dict): The dates of the courses, see
+            CourseDB.get_all_questionnaire_dates.
+        chunksize (int): The number of rows read at once.
+
+    Returns:
+        The prepared data and the time it took in seconds.
+
+    """
+    start = time.perf_counter()
+    chunks = [
+        PrepareData(chunk, course_dates)
+        for chunk in read_questionnaire_chunks(file_location, chunksize)
+    ]
+    df = pd.concat(chunks, ignore_index=True) if chunks else None
+    return df, time.perf_counter() - start
+
+
+def _prepare_exports(files, course_dates, jobs, chunksize):
+    """Prepare the exports and yield each file with its result.
+
+    A file that cannot be read does not stop the others, it is yielded
+    without result and with the reason of the failure.
+
+    """
+    if jobs <= 1:
+        for path in files:
+            try:
+                result, failure = (
+                    prepare_export(path, course_dates, chunksize), None)
+            except Exception as e:
+                result, failure = None, repr(e)
+            yield path, result, failure
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(prepare_export, path, course_dates, chunksize): path
+            for path in files
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                result, failure = future.result(), None
+            except Exception as e:
+                result, failure = None, repr(e)
+            yield futures[future], result, failure
+
+
+@click.command('backfill')
+@click.option('--directory', default=None,
+              help='Directory with the exports, defaults to the backup '
+                   'directory in the instance folder.')
+@click.option('--jobs', default=os.cpu_count() or 1, show_default=True,
+              help='Number of files read in parallel.')
+@click.option('--chunksize', default=CHUNKSIZE, show_default=True,
+              help='Number of rows read at once.')
+@with_appcontext
+def backfill(directory, jobs, chunksize):
+    """Load all exports of the backup directory into the database."""
+    if directory is None:
+        directory = os.path.join(current_app.instance_path, 'backup_data')
+    files = find_exports(directory)
+    start = time.perf_counter()
+    course_dates = CourseDB().get_all_questionnaire_dates()
+    prepared = {}
+    failed = []
+    for i, (path, result, failure) in enumerate(
+            _prepare_exports(files, course_dates, jobs, chunksize), 1):
+        if failure is not None:
+            log.error('Failed to read %s: %s', path, failure)
+            click.echo('[{}/{}] Failed to read {}: {}'.format(
+                i, len(files), os.path.basename(path), failure))
+            failed.append(path)
+            continue
+        df, seconds = result
+        prepared[path] = df
+        click.echo('[{}/{}] Read {} with {} rows in {:.1f}s'.format(
+            i, len(files), os.path.basename(path),
+            0 if df is None else len(df), seconds))
+    frames = [
+        prepared[path] for path in files
+        if prepared.get(path) is not None
+    ]
+    if frames:
+        # keep the order of the files, so the first copy of a response is
+        # loaded
+        df = pd.concat(frames, ignore_index=True)
+        rows = len(df)
+        df = df.drop_duplicates(ignore_index=True)
+        click.echo('Dropped {} duplicate rows'.format(rows - len(df)))
+        insert_start = time.perf_counter()
+        QuestionnaireDB().insert_data(df, IngestCache())
+        click.echo('Inserted {} rows in {:.1f}s'.format(
+            len(df), time.perf_counter() - insert_start))
+    else:
+        click.echo('No data to load')
+    click.echo('Backfilled {} files in {:.1f}s'.format(
+        len(files) - len(failed), time.perf_counter() - start))
+    if failed:
+        raise click.ClickException('Failed to read {} files: {}'.format(
+            len(failed), ', '.join(os.path.basename(path) for path in failed)))
+
+
+def init_app(app):
+    """Create connection to the factory."""
+    app.cli.add_command(backfill)
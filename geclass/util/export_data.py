@@ -1,5 +1,6 @@
 import click
 from flask.cli import with_appcontext
+import numpy as np
 import pandas as pd
 
 from geclass.course_db import CourseDB
@@ -21,41 +22,36 @@ def export():
             *["q_expert_post_" + str(i) for i in range(1, 31)],
             *["q_mark_" + str(i) for i in range(1, 24)],
     ]
-    data = {}
-    for col in cols:
-        data[col] = []
     course_db = CourseDB()
     questionnaire_db = QuestionnaireDB()
     course_data = list(course_db.get_all_course_data())
+    all_matched = questionnaire_db.get_matched_responses_for_courses(
+            [course["id"] for course in course_data], disagreement=True)
+    metadata_name = (
+            "experience_id", "program_id", "course_type_id",
+            "traditional_id")
+    frames = []
     for course in course_data:
         course_id = course["id"]
-        metadata_name = (
-                "experience_id", "program_id", "course_type_id",
-                "traditional_id")
-        metadata = [course[name] for name in metadata_name]
-        matched = questionnaire_db.get_matched_responses(course_id, disagreement=True)
-        for i in range(matched.size()):
-            data["course_id"].append(course_id)
-            for indx, col in enumerate(metadata_name):
-                data[col].append(metadata[indx])
-            for indx in range(1, 31):
-                data["q_you_pre_" + str(indx)].append(
-                    matched.q_you_pre.responses[i][indx-1]
-                )
-                data["q_you_post_" + str(indx)].append(
-                    matched.q_you_post.responses[i][indx-1]
-                )
-                data["q_expert_pre_" + str(indx)].append(
-                    matched.q_expert_pre.responses[i][indx-1]
-                )
-                data["q_expert_post_" + str(indx)].append(
-                    matched.q_expert_post.responses[i][indx-1]
-                )
-            for indx in range(1, 24):
-                data["q_mark_" + str(indx)].append(
-                    matched.q_mark.responses[i][indx-1]
-                )
-    df = pd.DataFrame(data)
+        matched = all_matched[course_id]
+        if matched.size() == 0:
+            continue
+        answers = np.hstack([
+            matched.q_you_pre.responses,
+            matched.q_you_post.responses,
+            matched.q_expert_pre.responses,
+            matched.q_expert_post.responses,
+            matched.q_mark.responses,
+        ])
+        frame = pd.DataFrame(answers, columns=cols[len(metadata_name) + 1:])
+        frame.insert(0, "course_id", course_id)
+        for indx, name in enumerate(metadata_name):
+            frame.insert(indx + 1, name, course[name])
+        frames.append(frame)
+    if frames:
+        df = pd.concat(frames, ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=cols)
     # shuffle the data
     df = df.sample(frac=1).reset_index(drop=True)
     df.to_csv("/app/instance/export.csv")
@@ -0,0 +1,12 @@
+CREATE INDEX IF NOT EXISTS student_code ON student (code);
+CREATE INDEX IF NOT EXISTS student_course_course_id
+  ON student_course (course_id, student_id);
+CREATE INDEX IF NOT EXISTS student_course_student_id
+  ON student_course (student_id);
+CREATE INDEX IF NOT EXISTS student_unknown_course_student_id
+  ON student_unknown_course (student_id);
+-- covering indexes for matching pre and post questionnaires
+CREATE INDEX IF NOT EXISTS student_pre_matching
+  ON student_pre (student_id, valid_control, valid_time, questionnaire_pre_id);
+CREATE INDEX IF NOT EXISTS student_post_matching
+  ON student_post (student_id, valid_control, valid_time, questionnaire_post_id);
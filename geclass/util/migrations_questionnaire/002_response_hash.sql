@@ -0,0 +1,229 @@
+-- Identify every response by a hash of its content, so loading the same
+-- data twice does not duplicate responses, see response_hash. The answers are
+-- hashed packed, like pack_answers stores them.
+CREATE TABLE IF NOT EXISTS ingested_response (
+  source_hash TEXT PRIMARY KEY,
+  pre_post INTEGER NOT NULL,
+  student_prepost_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS metadata (
+  key TEXT PRIMARY KEY,
+  value INTEGER
+);
+
+INSERT OR IGNORE INTO ingested_response
+  (source_hash, pre_post, student_prepost_id)
+SELECT
+  response_hash(
+    student.code,
+    CASE
+      WHEN student_course.course_id IS NOT NULL
+        THEN course_identifier(student_course.course_id)
+      ELSE student_unknown_course.course_code
+    END,
+    1, student_pre.start_time, student_pre.end_time,
+    pack_answers(
+      you.q1,
+      you.q2,
+      you.q3,
+      you.q4,
+      you.q5,
+      you.q6,
+      you.q7,
+      you.q8,
+      you.q9,
+      you.q10,
+      you.q11,
+      you.q12,
+      you.q13,
+      you.q14,
+      you.q15,
+      you.q16,
+      you.q17,
+      you.q18,
+      you.q19,
+      you.q20,
+      you.q21,
+      you.q22,
+      you.q23,
+      you.q24,
+      you.q25,
+      you.q26,
+      you.q27,
+      you.q28,
+      you.q29,
+      you.q30
+    ),
+    pack_answers(
+      expert.q1,
+      expert.q2,
+      expert.q3,
+      expert.q4,
+      expert.q5,
+      expert.q6,
+      expert.q7,
+      expert.q8,
+      expert.q9,
+      expert.q10,
+      expert.q11,
+      expert.q12,
+      expert.q13,
+      expert.q14,
+      expert.q15,
+      expert.q16,
+      expert.q17,
+      expert.q18,
+      expert.q19,
+      expert.q20,
+      expert.q21,
+      expert.q22,
+      expert.q23,
+      expert.q24,
+      expert.q25,
+      expert.q26,
+      expert.q27,
+      expert.q28,
+      expert.q29,
+      expert.q30
+    )
+  ),
+  1,
+  student_pre.id
+FROM student_pre
+JOIN student ON student.id = student_pre.student_id
+LEFT JOIN student_course ON student_course.student_id = student.id
+LEFT JOIN student_unknown_course
+  ON student_unknown_course.student_id = student.id
+JOIN questionnaire_pre ON questionnaire_pre.id = student_pre.questionnaire_pre_id
+JOIN questionnaire_you AS you ON you.id = questionnaire_pre.questionnaire_you_id
+JOIN questionnaire_expert AS expert
+  ON expert.id = questionnaire_pre.questionnaire_expert_id
+ORDER BY student_pre.id;
+
+INSERT OR IGNORE INTO ingested_response
+  (source_hash, pre_post, student_prepost_id)
+SELECT
+  response_hash(
+    student.code,
+    CASE
+      WHEN student_course.course_id IS NOT NULL
+        THEN course_identifier(student_course.course_id)
+      ELSE student_unknown_course.course_code
+    END,
+    2, student_post.start_time, student_post.end_time,
+    pack_answers(
+      you.q1,
+      you.q2,
+      you.q3,
+      you.q4,
+      you.q5,
+      you.q6,
+      you.q7,
+      you.q8,
+      you.q9,
+      you.q10,
+      you.q11,
+      you.q12,
+      you.q13,
+      you.q14,
+      you.q15,
+      you.q16,
+      you.q17,
+      you.q18,
+      you.q19,
+      you.q20,
+      you.q21,
+      you.q22,
+      you.q23,
+      you.q24,
+      you.q25,
+      you.q26,
+      you.q27,
+      you.q28,
+      you.q29,
+      you.q30
+    ),
+    pack_answers(
+      expert.q1,
+      expert.q2,
+      expert.q3,
+      expert.q4,
+      expert.q5,
+      expert.q6,
+      expert.q7,
+      expert.q8,
+      expert.q9,
+      expert.q10,
+      expert.q11,
+      expert.q12,
+      expert.q13,
+      expert.q14,
+      expert.q15,
+      expert.q16,
+      expert.q17,
+      expert.q18,
+      expert.q19,
+      expert.q20,
+      expert.q21,
+      expert.q22,
+      expert.q23,
+      expert.q24,
+      expert.q25,
+      expert.q26,
+      expert.q27,
+      expert.q28,
+      expert.q29,
+      expert.q30
+    ),
+    pack_answers(
+      mark.q1,
+      mark.q2,
+      mark.q3,
+      mark.q4,
+      mark.q5,
+      mark.q6,
+      mark.q7,
+      mark.q8,
+      mark.q9,
+      mark.q10,
+      mark.q11,
+      mark.q12,
+      mark.q13,
+      mark.q14,
+      mark.q15,
+      mark.q16,
+      mark.q17,
+      mark.q18,
+      mark.q19,
+      mark.q20,
+      mark.q21,
+      mark.q22,
+      mark.q23
+    )
+  ),
+  2,
+  student_post.id
+FROM student_post
+JOIN student ON student.id = student_post.student_id
+LEFT JOIN student_course ON student_course.student_id = student.id
+LEFT JOIN student_unknown_course
+  ON student_unknown_course.student_id = student.id
+JOIN questionnaire_post
+  ON questionnaire_post.id = student_post.questionnaire_post_id
+JOIN questionnaire_you AS you ON you.id = questionnaire_post.questionnaire_you_id
+JOIN questionnaire_expert AS expert
+  ON expert.id = questionnaire_post.questionnaire_expert_id
+JOIN questionnaire_mark AS mark
+  ON mark.id = questionnaire_post.questionnaire_mark_id
+ORDER BY student_post.id;
+
+INSERT OR REPLACE INTO metadata (key, value)
+SELECT 'ingest_watermark', MAX(end_time)
+FROM (
+  SELECT end_time FROM student_pre
+  UNION ALL
+  SELECT end_time FROM student_post
+)
+WHERE end_time IS NOT NULL
+HAVING COUNT(*) > 0;
@@ -0,0 +1,17 @@
+-- Store the answers of every questionnaire packed as int8 BLOB, see
+-- pack_answers in questionnaire_db.py.
+ALTER TABLE questionnaire_you ADD COLUMN answers BLOB;
+ALTER TABLE questionnaire_expert ADD COLUMN answers BLOB;
+ALTER TABLE questionnaire_mark ADD COLUMN answers BLOB;
+
+UPDATE questionnaire_you SET answers = pack_answers(
+  q1, q2, q3, q4, q5, q6, q7, q8, q9, q10, q11, q12, q13, q14, q15, q16,
+  q17, q18, q19, q20, q21, q22, q23, q24, q25, q26, q27, q28, q29, q30);
+
+UPDATE questionnaire_expert SET answers = pack_answers(
+  q1, q2, q3, q4, q5, q6, q7, q8, q9, q10, q11, q12, q13, q14, q15, q16,
+  q17, q18, q19, q20, q21, q22, q23, q24, q25, q26, q27, q28, q29, q30);
+
+UPDATE questionnaire_mark SET answers = pack_answers(
+  q1, q2, q3, q4, q5, q6, q7, q8, q9, q10, q11, q12, q13, q14, q15, q16,
+  q17, q18, q19, q20, q21, q22, q23);
@@ -0,0 +1,43 @@
+-- Keep the pairs of matched pre and post questionnaires in a table, which is
+-- updated when data is inserted, see update_matched_pairs.
+CREATE TABLE IF NOT EXISTS matched_pair (
+  student_course_id INTEGER PRIMARY KEY,
+  course_id INTEGER NOT NULL,
+  student_id INTEGER NOT NULL,
+  questionnaire_pre_id INTEGER NOT NULL,
+  questionnaire_post_id INTEGER NOT NULL,
+  FOREIGN KEY (student_course_id) REFERENCES student_course (id),
+  FOREIGN KEY (student_id) REFERENCES student (id),
+  FOREIGN KEY (questionnaire_pre_id) REFERENCES questionnaire_pre (id),
+  FOREIGN KEY (questionnaire_post_id) REFERENCES questionnaire_post (id)
+);
+CREATE INDEX IF NOT EXISTS matched_pair_course_id ON matched_pair (course_id);
+CREATE INDEX IF NOT EXISTS matched_pair_student_id
+  ON matched_pair (student_id);
+
+DELETE FROM matched_pair;
+INSERT INTO matched_pair (
+  student_course_id,
+  course_id,
+  student_id,
+  questionnaire_pre_id,
+  questionnaire_post_id
+)
+SELECT
+  student_course.id,
+  student_course.course_id,
+  student_course.student_id,
+  MIN(student_pre.questionnaire_pre_id),
+  MIN(student_post.questionnaire_post_id)
+FROM student_course
+JOIN student_pre ON student_pre.student_id = student_course.student_id
+JOIN student_post ON student_post.student_id = student_course.student_id
+WHERE
+  student_pre.valid_control = 1
+AND student_pre.valid_time = 1
+AND student_post.valid_control = 1
+AND student_post.valid_time = 1
+GROUP BY
+  student_course.id
+HAVING
+  COUNT(*) = 1;
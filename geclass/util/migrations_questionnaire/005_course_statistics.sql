@@ -0,0 +1,16 @@
+-- Keep the sufficient statistics of the matched responses of every course,
+-- see refresh_course_statistics. They are computed by migrate-questionnaire-db
+-- after the migration, as they cannot be computed in SQL.
+CREATE TABLE IF NOT EXISTS course_statistics (
+  course_id INTEGER NOT NULL,
+  disagreement INTEGER NOT NULL,
+  block TEXT NOT NULL,
+  students INTEGER NOT NULL,
+  sums BLOB NOT NULL,
+  squares BLOB NOT NULL,
+  counts BLOB NOT NULL,
+  PRIMARY KEY (course_id, disagreement, block)
+);
+
+INSERT OR REPLACE INTO metadata (key, value)
+VALUES ('course_statistics_stale', 1);
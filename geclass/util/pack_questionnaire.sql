@@ -0,0 +1,30 @@
+-- Drop the answer columns of the questionnaires, the answers are only kept
+-- packed in the answers column. The tables are rebuilt, as older versions of
+-- SQLite cannot drop columns.
+
+CREATE TABLE questionnaire_you_packed (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  answers BLOB NOT NULL
+);
+INSERT INTO questionnaire_you_packed (id, answers)
+  SELECT id, answers FROM questionnaire_you;
+DROP TABLE questionnaire_you;
+ALTER TABLE questionnaire_you_packed RENAME TO questionnaire_you;
+
+CREATE TABLE questionnaire_expert_packed (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  answers BLOB NOT NULL
+);
+INSERT INTO questionnaire_expert_packed (id, answers)
+  SELECT id, answers FROM questionnaire_expert;
+DROP TABLE questionnaire_expert;
+ALTER TABLE questionnaire_expert_packed RENAME TO questionnaire_expert;
+
+CREATE TABLE questionnaire_mark_packed (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  answers BLOB NOT NULL
+);
+INSERT INTO questionnaire_mark_packed (id, answers)
+  SELECT id, answers FROM questionnaire_mark;
+DROP TABLE questionnaire_mark;
+ALTER TABLE questionnaire_mark_packed RENAME TO questionnaire_mark;
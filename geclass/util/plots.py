@@ -1,13 +1,21 @@
 """Functions to generate the plots for the report.
 
 Only generate_plots is needed to create all the plots.
+
+The figures are created without pyplot and the rc parameters are only set
+while plotting (see rc_context), so the plots of several reports can be
+rendered at the same time in threads. The single plot functions use the
+current rc parameters, generate_plots renders with LaTeX (LATEX_RC).
 """
 
+import contextlib
 from enum import Enum
+import os
 import textwrap
+import threading
 
 import matplotlib
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
 
 from geclass.util.questions import questions, q_marks
@@ -16,12 +24,85 @@ from geclass.util.statistics import (
         aggregate_confidence_colwise
 )
 
-plt.rcParams['pgf.texsystem'] = 'pdflatex'
-plt.rcParams['font.family'] = 'serif'
-plt.rcParams['text.usetex'] = True
-plt.rcParams['pgf.rcfonts'] = False
-plt.rcParams['pgf.preamble'] = '\\usepackage[utf8x]{inputenc}'
-plt.rcParams['savefig.format'] = 'pgf'
+# Increase whenever the plots change, so the existing reports are rebuilt.
+PLOT_VERSION = 2
+
+# The size of a page and its margin in inches, for plots with a caption.
+A4 = (8.27, 11.69)
+_PAGE_MARGIN = 1.
+
+LATEX_RC = {
+    'pgf.texsystem': 'pdflatex',
+    'font.family': 'serif',
+    'text.usetex': True,
+    'pgf.rcfonts': False,
+    'pgf.preamble': '\\usepackage[utf8x]{inputenc}',
+    'savefig.format': 'pgf',
+}
+
+
+class _SharedRcContext():
+    """Set rc parameters while any thread plots with them.
+
+    The rc parameters of matplotlib are global. Threads that plot with the
+    same parameters share them, they are set by the first and restored by
+    the last thread. A thread with different parameters waits until no other
+    thread plots anymore.
+
+    A thread can nest contexts with the same parameters. Nesting different
+    parameters raises a RuntimeError, as the thread would wait for itself.
+
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._rc = None
+        self._original = None
+        self._users = 0
+        self._thread = threading.local()
+
+    @contextlib.contextmanager
+    def __call__(self, rc):
+        rc = dict(rc)
+        depth = getattr(self._thread, 'depth', 0)
+        with self._condition:
+            if depth and self._rc != rc:
+                raise RuntimeError(
+                    'Cannot nest rc contexts with different parameters')
+            while self._users and self._rc != rc:
+                self._condition.wait()
+            if not self._users:
+                self._original = {
+                    key: matplotlib.rcParams[key] for key in rc}
+                matplotlib.rcParams.update(rc)
+                self._rc = rc
+            self._users += 1
+        self._thread.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._thread.depth = depth
+            with self._condition:
+                self._users -= 1
+                if not self._users:
+                    matplotlib.rcParams.update(self._original)
+                    self._rc = None
+                    self._condition.notify_all()
+
+
+# Use as `with rc_context(LATEX_RC): ...`
+rc_context = _SharedRcContext()
+
+# The PGF backend measures all text with one shared LaTeX process.
+_pgf_lock = threading.Lock()
+
+
+def _text_metrics_lock():
+    """Return the lock needed while text is measured."""
+    if matplotlib.rcParams['savefig.format'] == 'pgf':
+        return _pgf_lock
+    return contextlib.nullcontext()
+
 
 def _get_total_fraction_expertlike(responses):
     """Get the mean and standard error over all q_you questions.
@@ -44,26 +125,87 @@ def _get_total_fraction_expertlike(responses):
     return mean, stderr
 
 
+def _quote(text):
+    """Put German quotes around a text, also if LaTeX is not used."""
+    if matplotlib.rcParams['text.usetex']:
+        return '"`{}"\''.format(text)
+    return '„{}“'.format(text)
+
+
+def _layout(fig, caption=None):
+    """Arrange the axes of a figure.
+
+    With a caption the figure becomes an A4 page, the plot keeps its size and
+    is placed at the top of the page with the caption below.
+
+    """
+    if caption is None:
+        with _text_metrics_lock():
+            fig.tight_layout()
+        return
+    width, height = fig.get_size_inches()
+    page_width, page_height = A4
+    fig.set_size_inches(page_width, page_height)
+    left = (page_width - width) / 2 / page_width
+    top = 1. - _PAGE_MARGIN / page_height
+    bottom = top - height / page_height
+    with _text_metrics_lock():
+        fig.tight_layout(rect=(left, bottom, 1. - left, top))
+    fig.text(
+        _PAGE_MARGIN / page_width, bottom - 0.02,
+        textwrap.fill(caption, int((page_width - 2 * _PAGE_MARGIN) * 12)),
+        va='top', ha='left', fontsize=10)
+
+
+def _show_or_save(fig, outfile):
+    if outfile is None:
+        _show(fig)
+        return
+    with _text_metrics_lock():
+        fig.savefig(outfile)
+
+
+def _show(fig):
+    """Show a figure interactively, this is the only use of pyplot."""
+    import matplotlib.pyplot as plt
+    manager = plt.figure(figsize=fig.get_size_inches()).canvas.manager
+    manager.canvas.figure = fig
+    fig.set_canvas(manager.canvas)
+    plt.show()
+
+
 def overall_score_plot(responses_course, responses_similar, outfile=None):
     """Plot a barplot of the fraction of all expertlike responses.
 
     Args:
         responses_course (QuestionnaireResponses): The answers to the
             questionnaire for the course.
-        responses_similar (QuestionnaireResponses): The answers to the
-            questionnaire for similar courses.
+        responses_similar (QuestionnaireResponses or QuestionnaireSummary):
+            The answers to the questionnaire for similar courses.
         outfile (str, optional): The file name to save the plot to. If it is
             None the plot will be shown.
 
+    """
+    fig = overall_score_figure(responses_course, responses_similar)
+    _show_or_save(fig, outfile)
+
+
+def overall_score_figure(responses_course, responses_similar, caption=None):
+    """Return the figure of overall_score_plot.
+
+    Args:
+        caption (str, optional): A text below the plot.
+
     """
     mean, stderr = _get_total_fraction_expertlike(responses_course)
     mean_sim, stderr_sim = _get_total_fraction_expertlike(responses_similar)
     color_you = 'red'
     color_similar = 'gray'
 
-    fig, ax = plt.subplots(figsize=(5.5, 5))
-    ax.set_title('Gesamtergebnisse der GE-CLASS für\ndie "`Was denken Sie..."\''
-                 'Antworten')
+    fig = Figure(figsize=(5.5, 5))
+    ax = fig.subplots()
+    ax.set_title('Gesamtergebnisse der GE-CLASS für\ndie {} Antworten'
+                 .format(_quote('Was denken Sie...')))
     ax.set_xticks([1., 2.75])
     ax.set_xticklabels(['Prä', 'Post'])
     ax.set_ylabel('Anteil der gleichen\nAntworten wie Experten')
@@ -89,12 +231,8 @@ def overall_score_plot(responses_course, responses_similar, outfile=None):
     ]
     ax.legend(legend_labels, ['Dieser Kurs', 'Ähnliche Kurse'],
               loc='lower left')
-    fig.tight_layout()
-    if outfile is None:
-        plt.show()
-    else:
-        fig.savefig(outfile)
-        plt.close()
+    _layout(fig, caption)
+    return fig
 
 
 def _response_statistics(responses, you_expert):
@@ -156,6 +294,18 @@ def question_overview_plot(responses_1, responses_2, plot_type, outfile=None):
         outfile (str, optional): The file name to save the plot to. If it is
             None the plot will be shown.
 
+    """
+    fig = question_overview_figure(responses_1, responses_2, plot_type)
+    _show_or_save(fig, outfile)
+
+
+def question_overview_figure(responses_1, responses_2, plot_type,
+                             caption=None):
+    """Return the figure of question_overview_plot.
+
+    Args:
+        caption (str, optional): A text below the plot.
+
     """
     color = {
         'you': 'red',
@@ -224,8 +374,7 @@ def question_overview_plot(responses_1, responses_2, plot_type, outfile=None):
     total_size = len(sorted_indx)
     half_size = total_size // 2
 
-    fig, ax = plt.subplots(ncols=2, sharex=True, figsize=(7, 7.5))
-    fig = plt.figure(figsize=(7., 7.5))
+    fig = Figure(figsize=(7., 7.5))
     a = fig.add_subplot(111)
     ax = [fig.add_subplot(121), fig.add_subplot(122)]
     a.spines['top'].set_color('none')
@@ -254,51 +403,37 @@ def question_overview_plot(responses_1, responses_2, plot_type, outfile=None):
     ax[1].set_ylim(half_size + 1, 0)
     np.vectorize(lambda x: x.grid(linestyle='--'))(ax)
 
-    def plot_point(mean, d_mean, confidence, height, color, ax):
-        ax.plot(mean, height, 'o', color=color, zorder=2)
+    def plot_series(mean, d_mean, confidence, heights, color, ax):
+        # one artist each for the confidence intervals, the means and the
+        # shifts of all questions in the panel
         ax.errorbar(
-            mean, height, xerr=confidence, color=color, alpha=0.5,
-            elinewidth=5, zorder=0
-        )
-        if d_mean != 0:
-            ax.arrow(
-                mean, height, d_mean, 0, head_width=.1, head_length=.05,
-                facecolor=color, length_includes_head=True, zorder=1)
-
-    for i in range(total_size - half_size):
-        plot_point(
-            mean_1[sorted_indx][i],
-            d_mean_1[sorted_indx][i],
-            confidence_1[sorted_indx][i],
-            i + 1.12,
-            color_1,
-            ax[0],
-        )
-        plot_point(
-            mean_2[sorted_indx][i],
-            d_mean_2[sorted_indx][i],
-            confidence_2[sorted_indx][i],
-            i + 0.88,
-            color_2,
-            ax[0],
-        )
-    for i in range(half_size):
-        plot_point(
-            mean_1[sorted_indx][i + half_size],
-            d_mean_1[sorted_indx][i + half_size],
-            confidence_1[sorted_indx][i + half_size],
-            i + 1.12,
-            color_1,
-            ax[1],
-        )
-        plot_point(
-            mean_2[sorted_indx][i + half_size],
-            d_mean_2[sorted_indx][i + half_size],
-            confidence_2[sorted_indx][i + half_size],
-            i + 0.88,
-            color_2,
-            ax[1],
+            mean, heights, xerr=confidence, fmt='none', ecolor=color,
+            alpha=0.5, elinewidth=5, zorder=0
         )
+        ax.scatter(mean, heights, color=color, zorder=2)
+        shifted = d_mean != 0
+        if shifted.any():
+            ax.quiver(
+                mean[shifted], heights[shifted], d_mean[shifted],
+                np.zeros(np.count_nonzero(shifted)), angles='xy',
+                scale_units='xy', scale=1, width=0.006, headwidth=6,
+                headlength=7, headaxislength=6, facecolor=color,
+                edgecolor='black', linewidth=0.5, zorder=1)
+
+    # the first total_size - half_size questions are in the left panel
+    panels = [
+        (ax[0], np.arange(total_size - half_size)),
+        (ax[1], np.arange(total_size - half_size, total_size)),
+    ]
+    for axis, indices in panels:
+        questions_panel = sorted_indx[indices]
+        heights = np.arange(len(indices)) + 1.
+        plot_series(
+            mean_1[questions_panel], d_mean_1[questions_panel],
+            confidence_1[questions_panel], heights + 0.12, color_1, axis)
+        plot_series(
+            mean_2[questions_panel], d_mean_2[questions_panel],
+            confidence_2[questions_panel], heights - 0.12, color_2, axis)
 
     legend_labels = [
         matplotlib.lines.Line2D([0], [0], color=color_1, lw=6),
@@ -308,26 +443,43 @@ def question_overview_plot(responses_1, responses_2, plot_type, outfile=None):
         legend_labels, legend_text, loc='upper right', fontsize=8,
         bbox_to_anchor=(0., 1.02))
 
-    fig.tight_layout()
-    if outfile is None:
-        plt.show()
-    else:
-        fig.savefig(outfile)
-        plt.close()
+    _layout(fig, caption)
+    return fig
+
+
+def generate_plots(responses_course, responses_similar, directory='.',
+                   rc=LATEX_RC):
+    """Generate all plots needed for the report.
+
+    Args:
+        responses_course (QuestionnaireResponses): The answers to the
+            questionnaire for the course.
+        responses_similar (QuestionnaireResponses or QuestionnaireSummary):
+            The answers to the questionnaire for similar courses.
+        directory (str, optional): The directory to save the plots to.
+        rc (dict, optional): The rc parameters of the plots, by default they
+            are rendered with LaTeX and saved as PGF.
+
+    """
+    with rc_context(rc):
+        _generate_plots(responses_course, responses_similar, directory)
+
 
+def _generate_plots(responses_course, responses_similar, directory):
+    def outfile(name):
+        return os.path.join(directory, name)
 
-def generate_plots(responses_course, responses_similar):
-    """Generate all plots needed for the report."""
-    overall_score_plot(responses_course, responses_similar, 'overall_score')
+    overall_score_plot(
+            responses_course, responses_similar, outfile('overall_score'))
     question_overview_plot(
             responses_course, responses_similar, OverviewPlotTypes.YOU_SIMILAR,
-            'overview_you')
+            outfile('overview_you'))
     question_overview_plot(
             responses_course, responses_similar,
-            OverviewPlotTypes.EXPERT_SIMILAR, 'overview_expert')
+            OverviewPlotTypes.EXPERT_SIMILAR, outfile('overview_expert'))
     question_overview_plot(
             responses_course, responses_course, OverviewPlotTypes.YOU_EXPERT,
-            'overview_you_expert')
+            outfile('overview_you_expert'))
     question_overview_plot(
             responses_course, responses_similar, OverviewPlotTypes.MARK,
-            'overview_mark')
+            outfile('overview_mark'))
@@ -1,4 +1,7 @@
+import collections
+import hashlib
 import sqlite3
+import threading
 import time
 
 import click
@@ -7,10 +10,174 @@ from flask.cli import with_appcontext
 import numpy as np
 import pandas as pd
 
-from geclass.db import DBConnection
+from geclass.db import DBConnection, migrate, set_schema_version
 from geclass.course_db import CourseDB
-from geclass.util.responses import Responses, QuestionnaireResponses
+from geclass.util.responses import (
+    QuestionnaireResponses, QuestionnaireSummary, ResponseSummary)
 from geclass.util.questionnaire_prepare import PrepareData
+from geclass.util.questionnaire_read import (
+    CHUNKSIZE, read_questionnaire_chunks)
+
+
+# (questionnaire, pre_post, number of questions) in the order of the
+# arguments of Responses
+_ANSWER_BLOCKS = (
+    ('you', 'pre', 30),
+    ('you', 'post', 30),
+    ('expert', 'pre', 30),
+    ('expert', 'post', 30),
+    ('mark', 'post', 23),
+)
+
+# The pairs of pre and post questionnaires of students with exactly one valid
+# pre and one valid post questionnaire, in the columns of matched_pair. The
+# students have to be selected by filling in the condition on student_course.
+_SQL_MATCHING = '''
+    SELECT
+        student_course.id,
+        student_course.course_id,
+        student_course.student_id,
+        MIN(student_pre.questionnaire_pre_id),
+        MIN(student_post.questionnaire_post_id)
+    FROM student_course
+    JOIN student_pre
+        ON student_pre.student_id = student_course.student_id
+    JOIN student_post
+        ON student_post.student_id = student_course.student_id
+    WHERE
+        {condition}
+    AND student_pre.valid_control = 1
+    AND student_pre.valid_time = 1
+    AND student_post.valid_control = 1
+    AND student_post.valid_time = 1
+    GROUP BY
+        student_course.id
+    HAVING
+        COUNT(*) = 1'''
+
+_SQL_INSERT_MATCHED_PAIRS = '''
+    INSERT INTO matched_pair (
+        student_course_id,
+        course_id,
+        student_id,
+        questionnaire_pre_id,
+        questionnaire_post_id
+    )''' + _SQL_MATCHING
+
+# The matched pairs of the courses together with their course and all their
+# answers, see _answer_blocks. The placeholders for the course ids are filled
+# in by execute_in_chunks.
+_SQL_MATCHED_ANSWERS = '''
+    SELECT
+        matched_pair.course_id,
+        {}
+    FROM matched_pair
+    JOIN questionnaire_pre
+        ON questionnaire_pre.id = matched_pair.questionnaire_pre_id
+    JOIN questionnaire_post
+        ON questionnaire_post.id = matched_pair.questionnaire_post_id
+    {}
+    WHERE
+        matched_pair.course_id IN ({{}})
+    ORDER BY
+        matched_pair.course_id, matched_pair.student_course_id'''.format(
+    ',\n        '.join(
+        '{0}_{1}.answers'.format(questionnaire, pre_post)
+        for questionnaire, pre_post, _ in _ANSWER_BLOCKS
+    ),
+    '\n    '.join(
+        'JOIN questionnaire_{0} AS {0}_{1} '
+        'ON {0}_{1}.id = questionnaire_{1}.questionnaire_{0}_id'
+        ''.format(questionnaire, pre_post)
+        for questionnaire, pre_post, _ in _ANSWER_BLOCKS
+    ),
+)
+
+# Value of a missing answer in the packed answers, see pack_answers.
+_MISSING_ANSWER = -1
+
+def _sql_matched_answers(n_courses):
+    """Return the query for the matched answers of n_courses courses."""
+    return _SQL_MATCHED_ANSWERS.format(', '.join(['?'] * n_courses))
+
+
+CourseCounts = collections.namedtuple(
+        'CourseCounts', ['pre', 'post', 'matched'])
+
+
+# Maximum size of the matched responses kept in memory by each process.
+_MATCHED_CACHE_BYTES = 64 * 2**20
+
+
+class _ResponsesCache:
+    """LRU cache of QuestionnaireResponses with a bound on their size.
+
+    It is shared by all requests of a process, the responses are stored as
+    read-only copies.
+
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the responses for the key or None."""
+        with self._lock:
+            responses = self._entries.get(key)
+            if responses is not None:
+                self._entries.move_to_end(key)
+            return responses
+
+    def put(self, key, responses):
+        """Add responses, evicting the least recently used ones."""
+        size = responses.nbytes()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes()
+            self._entries[key] = responses
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_matched_responses_cache = _ResponsesCache(_MATCHED_CACHE_BYTES)
+
+
+class IngestCache:
+    """Lookups of courses and students for the length of an ingestion run.
+
+    The ids of all courses are loaded with one query when the cache is
+    created. The students of a course are loaded with one query the first
+    time the course is inserted into and the students added by
+    `QuestionnaireDB.insert_data` are recorded afterwards.
+
+    Attributes:
+        course_ids (dict): The course id by course identifier.
+        students (dict): The student id by (course id, personal code),
+            None if the code is not unique in the course.
+        loaded_courses (set): The ids of the courses whose students are
+            loaded.
+
+    """
+
+    def __init__(self):
+        self.course_ids = CourseDB().get_all_course_ids()
+        self.students = {}
+        self.loaded_courses = set()
 
 
 class QuestionnaireDB(DBConnection):
@@ -23,27 +190,117 @@ class QuestionnaireDB(DBConnection):
                 detect_types=sqlite3.PARSE_DECLTYPES
             )
             g.questionnaire_db.row_factory = sqlite3.Row
+            g.questionnaire_db.create_function(
+                'response_hash', -1, response_hash, deterministic=True)
+            g.questionnaire_db.create_function(
+                'pack_answers', -1, pack_answers, deterministic=True)
+            g.questionnaire_db.create_function(
+                'course_identifier', 1, _course_identifier)
         self.db = g.questionnaire_db
 
-    def insert_data(self, df):
-        """Insert new data into the database."""
-        course_db = CourseDB()
-        for _, row in df.iterrows():
-            course_id = course_db.get_course_id(row['course_id'])
-            if course_id is not None:
-                student_id = self._add_student(
-                        row['personal_code'], course_id[0])
-            else:
-                student_id = self._add_student(row['personal_code'])
-                self._add_student_unknown_course(student_id, row['course_id'])
-            if row['pre_post'] == 1:
-                questionnaire_id = self._add_pre_questionnaire(row)
-                self._add_student_prepost(
-                        row, student_id, questionnaire_id, 'pre')
-            elif row['pre_post'] == 2:
-                questionnaire_id = self._add_post_questionnaire(row)
-                self._add_student_prepost(
-                        row, student_id, questionnaire_id, 'post')
+    def insert_data(self, df, cache=None):
+        """Insert new data into the database.
+
+        All rows are written in a single transaction. The ids of the new
+        rows are assigned up front, so that each table is filled with one
+        batched INSERT instead of one commit per row.
+
+        Inserting is idempotent: every response is identified by a hash of
+        its content (see `response_hash`) and responses that were already
+        loaded are skipped. Only responses that did not end after the
+        newest loaded response (the watermark) need to be looked up. Rows
+        that are neither pre nor post responses are ignored.
+
+        Args:
+            df (pd.DataFrame): The prepared data, see `PrepareData`.
+            cache (IngestCache, optional): The lookups of courses and
+                students, pass the same cache when inserting multiple
+                batches of one ingestion run.
+
+        """
+        df = df[df['pre_post'].isin((1, 2))]
+        if len(df) == 0:
+            return
+        if cache is None:
+            cache = IngestCache()
+        is_post = (df['pre_post'] == 2).to_numpy()
+        start = _timestamps(df['start'])
+        end = _timestamps(df['end'])
+        you = _answer_rows(df, _answer_columns('you'))
+        expert = _answer_rows(df, _answer_columns('expert'))
+        mark = _answer_rows(df, _answer_columns('mark'))
+        packed_you = _pack_rows(you)
+        packed_expert = _pack_rows(expert)
+        packed_mark = _pack_rows(mark)
+        course_ids = [
+            cache.course_ids.get(course_code)
+            for course_code in df['course_id']
+        ]
+        hashes = np.array([
+            response_hash(code, course_code, 2 if post else 1, s, e, y, x,
+                          *((m,) if post else ()))
+            for code, course_code, post, s, e, y, x, m in zip(
+                df['personal_code'], df['course_id'], is_post, start, end,
+                packed_you, packed_expert, packed_mark)
+        ])
+        with self.transaction():
+            new = self._find_new_responses(hashes, end)
+            if not new.any():
+                return
+            df = df[new]
+            course_ids = [i for i, is_new in zip(course_ids, new) if is_new]
+            is_post = is_post[new]
+            is_pre = ~is_post
+            start = start[new]
+            end = end[new]
+            student_ids, added_students = self._add_students(
+                    df, course_ids, cache)
+            you_ids = self._add_answers(
+                    'questionnaire_you', you[new], packed_you[new])
+            expert_ids = self._add_answers(
+                    'questionnaire_expert', expert[new], packed_expert[new])
+            pre_ids = self._add_pre_questionnaires(
+                    you_ids[is_pre], expert_ids[is_pre])
+            mark_ids = self._add_answers(
+                    'questionnaire_mark', mark[new][is_post],
+                    packed_mark[new][is_post])
+            post_ids = self._add_post_questionnaires(
+                    you_ids[is_post], expert_ids[is_post], mark_ids)
+            student_pre_ids = self._add_student_prepost(
+                    df[is_pre], student_ids[is_pre], pre_ids,
+                    start[is_pre], end[is_pre], 'pre')
+            student_post_ids = self._add_student_prepost(
+                    df[is_post], student_ids[is_post], post_ids,
+                    start[is_post], end[is_post], 'post')
+            self.update_matched_pairs(student_ids.tolist())
+            student_prepost_ids = np.empty(len(df), dtype=np.int64)
+            student_prepost_ids[is_pre] = student_pre_ids
+            student_prepost_ids[is_post] = student_post_ids
+            self.add_many(
+                'ingested_response',
+                ('source_hash', 'pre_post', 'student_prepost_id'),
+                list(zip(hashes[new].tolist(),
+                         np.where(is_post, 2, 1).tolist(),
+                         student_prepost_ids.tolist())))
+            watermark = self.get_metadata('ingest_watermark')
+            self.set_metadata('ingest_watermark', max(
+                int(end.max()), watermark if watermark is not None else 0))
+        # a code that was ambiguous stays ambiguous, the next response with
+        # it gets a new student again
+        cache.students.update(
+            (key, student_id) for key, student_id in added_students.items()
+            if key not in cache.students)
+
+    def get_metadata(self, key):
+        """Return a value from the metadata table or None if it is unset."""
+        row = self.select_one('metadata', 'key', key)
+        return None if row is None else row['value']
+
+    def set_metadata(self, key, value):
+        """Set a value in the metadata table, without committing."""
+        self.execute(
+            'INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)',
+            (key, value))
 
     def get_matched_responses(self, course_id, disagreement=False):
         """Return the valid matched responses for one course.
@@ -53,163 +310,563 @@ class QuestionnaireDB(DBConnection):
                 binary, i.e., 1 and 0 for agreement with experts or to 1, 0,
                 -1 to include disagreement.
         """
-        sql_select_students = '''
-            SELECT student_id
-            FROM student_course
-            WHERE course_id = ?'''
-        students = self.execute(sql_select_students, (course_id,)).fetchall()
-        sql_matched_questionnaires = '''
-            SELECT
-                student_pre.questionnaire_pre_id,
-                student_post.questionnaire_post_id
-            FROM
-                student_pre, student_post
-            WHERE
-                student_pre.student_id = ?
-            AND student_pre.valid_control = 1
-            AND student_pre.valid_time = 1
-            AND student_post.student_id = ?
-            AND student_post.valid_control = 1
-            AND student_post.valid_time = 1
-            GROUP BY
-                student_pre.student_id, student_post.student_id
-            HAVING
-                COUNT(*) = 1'''
-        matched_questionnaires = []
-        for student in students:
-            res = self.execute(
-                    sql_matched_questionnaires, (student[0],)*2).fetchone()
-            if res is None:
-                continue
-            matched_questionnaires.append(res)
-
-        def get_questionnaire_result(questionnaire_id, you_expert_mark,
-                                     pre_post):
-            """Get the answers from a questionnaire."""
-            sql_questionnaire = '''
-                SELECT *
-                FROM questionnaire_{0:}, questionnaire_{1:}
-                WHERE
-                    questionnaire_{1:}.id = ?
-                AND questionnaire_{0:}.id = questionnaire_{1:}.questionnaire_{0:}_id
-            '''.format(you_expert_mark, pre_post)
-            q = self.execute(
-                    sql_questionnaire,
-                    (questionnaire_id,)).fetchone()
-            end = 31 if you_expert_mark != 'mark' else 24
-            return np.array(
-                    [i if i is not None else -999 for i in q[1:end]],
-                    dtype=np.int16)
-
-        results = []
-        for questionnaire in matched_questionnaires:
-            q_you_pre = get_questionnaire_result(
-                    questionnaire[0], 'you', 'pre')
-            q_expert_pre = get_questionnaire_result(
-                    questionnaire[0], 'expert', 'pre')
-            q_you_post = get_questionnaire_result(
-                    questionnaire[1], 'you', 'post')
-            q_expert_post = get_questionnaire_result(
-                    questionnaire[1], 'expert', 'post')
-            q_mark = get_questionnaire_result(
-                    questionnaire[1], 'mark', 'post')
-            results.append(Responses(q_you_pre, q_you_post, q_expert_pre, q_expert_post, q_mark, disagreement))
-        return QuestionnaireResponses(results)
+        return self.get_matched_responses_for_courses(
+                [course_id], disagreement)[course_id]
 
-    def get_course_numbers(self, course_id):
-        """Return the number of students in pre and post questionnaire."""
-        # TODO: Test
-        sql_pre = '''
-            SELECT
-                COUNT(student_pre.id)
-            FROM student_pre, student_course
+    def get_matched_responses_for_courses(self, course_ids,
+                                          disagreement=False, stacked=False):
+        """Return the valid matched responses for multiple courses.
+
+        The pairs are read from the matched_pair table, which is kept up to
+        date when data is inserted, and all the answers are fetched in one
+        pass over the database, instead of one pass per course.
+
+        The responses of each course are kept in a cache of the process,
+        keyed by the course, disagreement and the data version (see
+        data_version), so courses requested again are not read from the
+        database. Their arrays are read-only. Inside of a transaction and
+        for `stacked` the cache is not used.
+
+        Args:
+            course_ids (list(int)): The ids of the courses.
+            disagreement (bool): Determines if the Likert scale is redued to
+                binary, i.e., 1 and 0 for agreement with experts or to 1, 0,
+                -1 to include disagreement.
+            stacked (bool): Return the responses of all courses together
+                instead of one QuestionnaireResponses per course.
+
+        Returns:
+            A dict with the QuestionnaireResponses for each course id. If
+            `stacked` is set a tuple of the QuestionnaireResponses of all
+            courses and an array with the course id of each student.
+
+        >>> matched = get_matched_responses_for_courses([1, 2])
+        >>> matched[2].size()
+        12
+        >>> matched, course_index = get_matched_responses_for_courses(
+        ...     [1, 2], stacked=True)
+        >>> matched.size()
+        20
+        >>> course_index
+        array([1, 1, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2])
+
+        """
+        course_ids = list(dict.fromkeys(course_ids))
+        if stacked:
+            return self._query_matched_responses(
+                    course_ids, disagreement, stacked=True)
+        if self.db.in_transaction:
+            # the data may still change or be rolled back
+            return self._query_matched_responses(course_ids, disagreement)
+        database = current_app.config['QUESTIONNAIRE_DB']
+        version = self.data_version()
+
+        def key(course_id):
+            return (database, version, course_id, bool(disagreement))
+
+        matched = {}
+        for course_id in course_ids:
+            responses = _matched_responses_cache.get(key(course_id))
+            if responses is not None:
+                matched[course_id] = responses
+        missing = [i for i in course_ids if i not in matched]
+        if missing:
+            queried = self._query_matched_responses(missing, disagreement)
+            for course_id, responses in queried.items():
+                responses = responses.read_only_copy()
+                _matched_responses_cache.put(key(course_id), responses)
+                matched[course_id] = responses
+        # a new object for every caller, sharing the read-only arrays
+        return {
+            course_id: matched[course_id].subset(slice(None))
+            for course_id in course_ids
+        }
+
+    def _query_matched_responses(self, course_ids, disagreement,
+                                 stacked=False):
+        """Query the matched responses, see
+        get_matched_responses_for_courses."""
+        rows = self.execute_in_chunks(_SQL_MATCHED_ANSWERS, course_ids)
+        course_index = np.array([row[0] for row in rows], dtype=np.int64)
+        answers = _answer_blocks([tuple(row)[1:] for row in rows])
+        matched = QuestionnaireResponses.from_answers(*answers, disagreement)
+        if stacked:
+            return matched, course_index
+        # the rows are sorted by course, so every course is a slice
+        start = np.searchsorted(course_index, course_ids, side='left')
+        stop = np.searchsorted(course_index, course_ids, side='right')
+        return {
+            course_id: matched.subset(slice(i, j))
+            for course_id, i, j in zip(course_ids, start, stop)
+        }
+
+    def data_version(self):
+        """Return the version of the matched responses.
+
+        The version changes whenever the matched pairs change. It is read
+        once per application context, outside of transactions.
+
+        """
+        if self.db.in_transaction:
+            return self.get_metadata('data_version')
+        if 'questionnaire_data_version' not in g:
+            g.questionnaire_data_version = self.get_metadata('data_version')
+        return g.questionnaire_data_version
+
+    def _bump_data_version(self):
+        """Change the data version, without committing.
+
+        The version is a timestamp in microseconds, so it is not reused
+        after the database was created again.
+
+        """
+        version = self.get_metadata('data_version') or 0
+        self.set_metadata(
+            'data_version', max(version + 1, time.time_ns() // 1000))
+        g.pop('questionnaire_data_version', None)
+
+    def update_matched_pairs(self, student_ids):
+        """Match the questionnaires of the students again, without committing.
+
+        The pairs of the students are deleted and inserted again from their
+        pre and post questionnaires, using the indexes on the student ids.
+        Students without a known course have no pairs. The statistics of the
+        courses of the students are refreshed.
+
+        """
+        student_ids = list(dict.fromkeys(student_ids))
+        self._bump_data_version()
+        course_ids = {row[0] for row in self.execute_in_chunks(
+            'SELECT DISTINCT course_id FROM student_course '
+            'WHERE student_id IN ({})', student_ids)}
+        self.execute_in_chunks(
+            'DELETE FROM matched_pair WHERE student_id IN ({})', student_ids)
+        self.execute_in_chunks(_SQL_INSERT_MATCHED_PAIRS.format(
+            condition='student_course.student_id IN ({})'), student_ids)
+        self.refresh_course_statistics(sorted(course_ids))
+
+    def update_matched_pairs_of_course(self, course_id):
+        """Match the questionnaires of a course again, without committing."""
+        self._bump_data_version()
+        self.execute('DELETE FROM matched_pair WHERE course_id = ?',
+                     (course_id,))
+        self.execute(_SQL_INSERT_MATCHED_PAIRS.format(
+            condition='student_course.course_id = ?'), (course_id,))
+        self.refresh_course_statistics([course_id])
+
+    def refresh_course_statistics(self, course_ids):
+        """Summarize the matched responses of courses, without committing.
+
+        The QuestionnaireSummary of the matched responses, with and without
+        disagreement, is stored in the course_statistics table for every
+        course with matched responses.
+
+        """
+        course_ids = list(dict.fromkeys(course_ids))
+        self.execute_in_chunks(
+            'DELETE FROM course_statistics WHERE course_id IN ({})',
+            course_ids)
+        rows = []
+        for disagreement in (False, True):
+            matched = self.get_matched_responses_for_courses(
+                    course_ids, disagreement)
+            for course_id, responses in matched.items():
+                if responses.size() == 0:
+                    continue
+                summary = QuestionnaireSummary.from_responses(responses)
+                for block, block_summary in summary.items():
+                    rows.append((
+                        course_id, int(disagreement), block,
+                        block_summary.students,
+                        block_summary.sums.tobytes(),
+                        block_summary.squares.tobytes(),
+                        block_summary.counts.tobytes(),
+                    ))
+        self.add_many(
+            'course_statistics',
+            ('course_id', 'disagreement', 'block', 'students', 'sums',
+             'squares', 'counts'),
+            rows)
+
+    def refresh_all_course_statistics(self):
+        """Summarize the matched responses of all courses, see
+        refresh_course_statistics."""
+        self.execute('DELETE FROM course_statistics', ())
+        course_ids = [row[0] for row in self.execute(
+            'SELECT DISTINCT course_id FROM matched_pair', ())]
+        self.refresh_course_statistics(course_ids)
+
+    def refresh_stale_course_statistics(self):
+        """Compute the course statistics again if they are marked as stale.
+
+        A migration marks the statistics as stale if they cannot be computed
+        in SQL, see migrate_questionnaire_db.
+
+        Returns:
+            If the statistics were computed again.
+
+        """
+        if not self.get_metadata('course_statistics_stale'):
+            return False
+        with self.transaction():
+            self.refresh_all_course_statistics()
+            self.execute("DELETE FROM metadata "
+                         "WHERE key = 'course_statistics_stale'", ())
+        return True
+
+    def get_course_statistics(self, course_ids, disagreement=False):
+        """Return the summaries of the matched responses of courses.
+
+        The summaries are read from the course_statistics table, so the
+        statistics of a group of courses are the sum of their summaries
+        instead of computed from all their responses.
+
+        Args:
+            course_ids (list(int)): The ids of the courses.
+            disagreement (bool): See get_matched_responses.
+
+        Returns:
+            A dict with the QuestionnaireSummary for each course id.
+
+        >>> summaries = get_course_statistics([1, 2])
+        >>> QuestionnaireSummary.total(summaries.values()).size()
+        20
+
+        """
+        course_ids = list(dict.fromkeys(course_ids))
+        blocks = {course_id: {} for course_id in course_ids}
+        sql = '''
+            SELECT course_id, block, students, sums, squares, counts
+            FROM course_statistics
             WHERE
-                student_course.course_id = ?
-            AND student_pre.student_id = student_course.student_id'''
-        count_pre = self.execute(sql_pre, (course_id,)).fetchone()[0]
-        sql_post = '''
+                disagreement = ?
+            AND course_id IN ({})'''
+        for row in self.execute_in_chunks(
+                sql, course_ids, (int(disagreement),)):
+            blocks[row['course_id']][row['block']] = ResponseSummary(
+                row['students'],
+                np.frombuffer(row['sums'], dtype=np.int64),
+                np.frombuffer(row['squares'], dtype=np.int64),
+                np.frombuffer(row['counts'], dtype=np.int64))
+        return {
+            course_id: QuestionnaireSummary(summaries)
+            for course_id, summaries in blocks.items()
+        }
+
+    def get_matched_pair_ids(self, course_ids):
+        """Return the ids of the matched pairs of courses.
+
+        A pair is identified by the id of the student in the course and the
+        ids of the pre and post questionnaire, so the ids change whenever a
+        course gets new or different matched responses.
+
+        Returns:
+            A dict with the list of (student_course_id, questionnaire_pre_id,
+            questionnaire_post_id) for each course id.
+
+        """
+        course_ids = list(dict.fromkeys(course_ids))
+        pairs = {course_id: [] for course_id in course_ids}
+        sql = '''
             SELECT
-                COUNT(student_post.id)
-            FROM student_post, student_course
-            WHERE
-                student_course.course_id = ?
-            AND student_post.student_id = student_course.student_id'''
-        count_post = self.execute(sql_post, (course_id,)).fetchone()[0]
-        return count_pre, count_post
+                course_id,
+                student_course_id,
+                questionnaire_pre_id,
+                questionnaire_post_id
+            FROM matched_pair
+            WHERE course_id IN ({})
+            ORDER BY course_id, student_course_id'''
+        for course_id, *pair in self.execute_in_chunks(sql, course_ids):
+            pairs[course_id].append(tuple(pair))
+        return pairs
+
+    def get_course_counts(self, course_ids):
+        """Return the number of responses of courses.
+
+        The pre, post and matched responses of all courses are counted in
+        one statement (per MAX_VALUES_PER_QUERY courses), using the
+        indexes on the course and student ids.
+
+        Returns:
+            A dict with the CourseCounts for each course id.
+
+        >>> get_course_counts([1, 2])
+        {1: CourseCounts(pre=10, post=9, matched=8),
+         2: CourseCounts(pre=14, post=12, matched=12)}
 
+        """
+        sql = '''
+            WITH course(id) AS (VALUES {})
+            SELECT
+                course.id,
+                (SELECT COUNT(*)
+                 FROM student_course
+                 JOIN student_pre
+                    ON student_pre.student_id = student_course.student_id
+                 WHERE student_course.course_id = course.id),
+                (SELECT COUNT(*)
+                 FROM student_course
+                 JOIN student_post
+                    ON student_post.student_id = student_course.student_id
+                 WHERE student_course.course_id = course.id),
+                (SELECT COUNT(*)
+                 FROM matched_pair
+                 WHERE matched_pair.course_id = course.id)
+            FROM course'''
+        return {
+            course_id: CourseCounts(pre, post, matched)
+            for course_id, pre, post, matched in self.execute_in_chunks(
+                sql, dict.fromkeys(course_ids), placeholder='(?)')
+        }
 
-    def _add_student(self, code, course_id=None):
-        if course_id == None:
-            return self.add_and_get_id('student', ('code',), (code,))
+    def get_course_numbers(self, course_id):
+        """Return the number of students in pre and post questionnaire."""
+        counts = self.get_course_counts([course_id])[course_id]
+        return counts.pre, counts.post
+
+    def _load_students(self, cache, course_ids):
+        """Load the students of courses that are not in the cache yet."""
+        course_ids = [
+            course_id for course_id in dict.fromkeys(course_ids)
+            if course_id is not None
+            and course_id not in cache.loaded_courses
+        ]
         sql = '''
-            SELECT student.id
+            SELECT
+                student_course.course_id,
+                student.code,
+                student.id
             FROM student, student_course
             WHERE
-                student_course.course_id = ?
-            AND student.id = student_course.student_id
-            AND student.code = ?'''
-        rows = self.execute(sql, (course_id, code)).fetchall()
-        if len(rows) == 1:
-            return rows[0][0]
-        student_id = self.add_and_get_id('student', ('code',), (code,))
-        self._add_student_course(student_id, course_id)
-        return student_id
-
-    def _add_student_course(self, student_id, course_id):
-        columns = ['student_id', 'course_id']
-        values = [student_id, course_id]
-        self.add(table='student_course', columns=columns, values=values)
-
-    def _add_student_unknown_course(self, student_id, course_code):
-        columns = ['student_id', 'course_code']
-        values = [student_id, course_code]
-        self.add(table='student_unknown_course', columns=columns,
-                 values=values)
-
-    def _add_questionnaire(self, row, you_expert):
-        columns = ['q{:d}'.format(i) for i in range(1, 31)]
-        values = [
-                row['q{:d}_{:d}'.format(i, 1 if you_expert == 'you' else 2)]
-                for i in range(1, 31)
-        ]
-        last_id = self.add_and_get_id('questionnaire_{}'.format(you_expert),
-                                      columns=columns, values=values)
-        return last_id
-
-    def _add_questionnaire_mark(self, row):
-        columns = ['q{:d}'.format(i) for i in range(1, 24)]
-        values = [row['post_{:d}'.format(i)] for i in range(1, 24)]
-        last_id = self.add_and_get_id('questionnaire_mark',
-                                      columns=columns, values=values)
-        return last_id
-
-    def _add_pre_questionnaire(self, row):
+                student_course.course_id IN ({})
+            AND student.id = student_course.student_id'''
+        for course_id, code, student_id in self.execute_in_chunks(
+                sql, course_ids):
+            key = (course_id, code)
+            # a code used by multiple students is ambiguous, the next
+            # response with it gets a new student
+            cache.students[key] = (
+                None if key in cache.students else student_id)
+        cache.loaded_courses.update(course_ids)
+
+    def _add_students(self, df, course_ids, cache):
+        """Find or add the students of all rows.
+
+        Returns:
+            The ids of the students and a dict with the students that were
+            added to a known course, to update the cache after the commit.
+
+        """
+        self._load_students(cache, course_ids)
+        next_student = self.next_id('student')
+        students = []
+        student_courses = []
+        unknown_courses = []
+        added = {}
+        student_ids = []
+        for code, course_id, course_code in zip(
+                df['personal_code'], course_ids, df['course_id']):
+            student_id = None
+            if course_id is not None:
+                key = (course_id, code)
+                student_id = added.get(key, cache.students.get(key))
+            if student_id is None:
+                student_id = next_student
+                next_student += 1
+                students.append((student_id, code))
+                if course_id is not None:
+                    student_courses.append((student_id, course_id))
+                    added[key] = student_id
+                else:
+                    unknown_courses.append((student_id, course_code))
+            student_ids.append(student_id)
+        self.add_many('student', ('id', 'code'), students)
+        self.add_many('student_course', ('student_id', 'course_id'),
+                      student_courses)
+        self.add_many('student_unknown_course', ('student_id', 'course_code'),
+                      unknown_courses)
+        return np.array(student_ids, dtype=np.int64), added
+
+    def _find_new_responses(self, hashes, end):
+        """Return a mask of the responses that are not loaded yet.
+
+        Of responses with the same hash only the first one counts as new.
+        Responses that ended after the watermark cannot be loaded already,
+        only the others are looked up.
+
+        """
+        new = np.zeros(len(hashes), dtype=bool)
+        new[np.unique(hashes, return_index=True)[1]] = True
+        watermark = self.get_metadata('ingest_watermark')
+        if watermark is None:
+            return new
+        candidates = np.unique(hashes[new & (end <= watermark)]).tolist()
+        loaded = {row[0] for row in self.execute_in_chunks(
+            'SELECT source_hash FROM ingested_response '
+            'WHERE source_hash IN ({})', candidates)}
+        return new & ~np.isin(hashes, list(loaded))
+
+    def _add_rows_with_ids(self, table, columns, rows):
+        """Add rows with consecutive new ids and return the ids."""
+        first_id = self.next_id(table)
+        ids = np.arange(first_id, first_id + len(rows), dtype=np.int64)
+        self.add_many(table, ('id', *columns),
+                      [(int(i), *row) for i, row in zip(ids, rows)])
+        return ids
+
+    def _add_answers(self, table, rows, packed):
+        """Add the answers of questionnaires and return the ids.
+
+        The answers are stored packed in the answers column and, unless the
+        database was packed (see `pack-questionnaire-db`), also one by one
+        in the q-columns.
+
+        """
+        if self._has_answer_columns(table):
+            columns = ['q{:d}'.format(i) for i in range(1, rows.shape[1] + 1)]
+            return self._add_rows_with_ids(
+                    table, (*columns, 'answers'),
+                    [(*row, answers) for row, answers in zip(rows, packed)])
+        return self._add_rows_with_ids(
+                table, ('answers',), [(answers,) for answers in packed])
+
+    def _has_answer_columns(self, table):
+        """Return if the answers are also stored in the q-columns."""
+        columns = self.execute(
+            'PRAGMA table_info({})'.format(table), ()).fetchall()
+        return any(column['name'] == 'q1' for column in columns)
+
+    def _add_pre_questionnaires(self, you_ids, expert_ids):
         columns = ['questionnaire_you_id', 'questionnaire_expert_id']
-        you_id = self._add_questionnaire(row, 'you')
-        expert_id = self._add_questionnaire(row, 'expert')
-        values = [you_id, expert_id]
-        last_id = self.add_and_get_id('questionnaire_pre', columns=columns,
-                values=values)
-        return last_id
-
-    def _add_post_questionnaire(self, row):
+        rows = zip(you_ids.tolist(), expert_ids.tolist())
+        return self._add_rows_with_ids('questionnaire_pre', columns,
+                                       list(rows))
+
+    def _add_post_questionnaires(self, you_ids, expert_ids, mark_ids):
         columns = ['questionnaire_you_id', 'questionnaire_expert_id',
-                'questionnaire_mark_id']
-        you_id = self._add_questionnaire(row, 'you')
-        expert_id = self._add_questionnaire(row, 'expert')
-        mark_id = self._add_questionnaire_mark(row)
-        values = [you_id, expert_id, mark_id]
-        last_id = self.add_and_get_id('questionnaire_post', columns=columns,
-                values=values)
-        return last_id
-
-    def _add_student_prepost(self, row, student_id, questionnaire_id, pre_post):
-        # TODO: Check if student does not already in the table
-        start = int(time.mktime(row['start'].timetuple()))
-        end = int(time.mktime(row['end'].timetuple()))
-        columns = ['student_id', 'questionnaire_{}_id'.format(pre_post), 'start_time', 'end_time', 'valid_control', 'valid_time']
-        values = [student_id, questionnaire_id, start, end, int(row['valid_control']), int(row['valid_time'])]
-        self.add('student_{}'.format(pre_post), columns=columns, values=values)
+                   'questionnaire_mark_id']
+        rows = zip(you_ids.tolist(), expert_ids.tolist(), mark_ids.tolist())
+        return self._add_rows_with_ids('questionnaire_post', columns,
+                                       list(rows))
+
+    def _add_student_prepost(self, df, student_ids, questionnaire_ids,
+                             start, end, pre_post):
+        columns = ['student_id', 'questionnaire_{}_id'.format(pre_post),
+                   'start_time', 'end_time', 'valid_control', 'valid_time']
+        rows = zip(
+            student_ids.tolist(),
+            questionnaire_ids.tolist(),
+            start.tolist(),
+            end.tolist(),
+            df['valid_control'].astype(int).tolist(),
+            df['valid_time'].astype(int).tolist(),
+        )
+        return self._add_rows_with_ids(
+                'student_{}'.format(pre_post), columns, list(rows))
+
+
+def response_hash(*values):
+    """Return the hash identifying a response.
+
+    The hash is computed from the personal code, the course code as given in
+    the data, pre_post, the start and end time and the packed answers (see
+    `pack_answers`) of the response. It does not depend on whether the course
+    is known or on the q-columns, so it can be recomputed from every
+    database. Missing values (None, NaN or NA) are hashed alike. It is also
+    available in SQL as `response_hash`.
+
+    >>> response_hash('abcd12', 'ABXCE', 1, 1546297200, 1546383600,
+    ...               pack_answers(4, 5, None))
+    '8b9e759a8bcf2fbd4d461554d7a82c9b01b3a522'
+    >>> response_hash(np.nan, 'ABXCE') == response_hash(None, 'ABXCE')
+    True
+
+    """
+    content = '\x1f'.join(_hash_value(value) for value in values)
+    return hashlib.sha1(content.encode('utf8')).hexdigest()
+
+
+def _hash_value(value):
+    """Return how a value is written into a response hash."""
+    if isinstance(value, bytes):
+        return value.hex()
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    return str(value)
+
+
+def _course_identifier(course_id):
+    """Return the identifier of a course, available in SQL as
+    `course_identifier`."""
+    return CourseDB().get_course_identifier(course_id)
+
+
+def _answer_columns(you_expert_mark):
+    """Return the columns of the prepared data with the answers."""
+    if you_expert_mark == 'mark':
+        return ['post_{:d}'.format(i) for i in range(1, 24)]
+    return ['q{:d}_{:d}'.format(i, 1 if you_expert_mark == 'you' else 2)
+            for i in range(1, 31)]
+
+
+def _timestamps(times):
+    """Return the times as unix timestamps in local time."""
+    return np.array([int(time.mktime(t.timetuple())) for t in times],
+                    dtype=np.int64)
+
+
+def _answer_blocks(rows):
+    """Split the rows of _SQL_MATCHED_ANSWERS into the answer blocks.
+
+    The packed answers of each block are joined and decoded at once with
+    np.frombuffer, without copying them again.
+
+    Returns:
+        The answers to the you pre, you post, expert pre, expert post and mark
+        questions as int8 arrays with one row per student, in this order.
+        Missing answers are -1.
+
+    """
+    blocks = []
+    for i, (_, _, length) in enumerate(_ANSWER_BLOCKS):
+        buffer = b''.join(row[i] for row in rows)
+        blocks.append(
+            np.frombuffer(buffer, dtype=np.int8).reshape(len(rows), length))
+    return blocks
+
+
+def pack_answers(*answers):
+    """Return the answers of a questionnaire packed as int8 bytes.
+
+    Missing answers (None) and all values outside of the Likert scale 1 - 5,
+    like the missing codes -997, -998 and -999 of QUAMP, are stored as -1.
+    It is also available in SQL as `pack_answers`.
+
+    >>> pack_answers(1, None, 5)
+    b'\\x01\\xff\\x05'
+    >>> np.frombuffer(pack_answers(1, None, -998), dtype=np.int8)
+    array([ 1, -1, -1], dtype=int8)
+
+    """
+    return _pack_rows(np.array([answers], dtype=object))[0]
+
+
+def _pack_rows(rows):
+    """Pack every row of an object array of answers, see pack_answers."""
+    answers = np.where(np.equal(rows, None), 0, rows).astype(np.int64)
+    given = (answers >= 1) & (answers <= 5)
+    packed = np.where(given, answers, _MISSING_ANSWER).astype(np.int8)
+    return np.array([row.tobytes() for row in packed], dtype=object)
+
+
+def _answer_rows(df, columns):
+    """Return the answers as an object array of int, missing answers are
+    None."""
+    answers = df[columns].to_numpy(dtype=float, na_value=np.nan)
+    missing = np.isnan(answers)
+    rows = np.where(missing, 0, answers).astype(np.int64).astype(object)
+    rows[missing] = None
+    return rows
 
 
 def init_questionnaire_db():
@@ -217,6 +874,7 @@ def init_questionnaire_db():
     db = QuestionnaireDB()
     with current_app.open_resource('util/schema_questionnaire.sql') as f:
         db().executescript(f.read().decode('utf8'))
+    set_schema_version(db, 'util/migrations_questionnaire')
 
 
 @click.command('init-questionnaire-db')
@@ -232,6 +890,38 @@ def init_questionnaire_db_command():
     click.echo('Initialized the questionnaire database')
 
 
+def migrate_questionnaire_db(db):
+    """Apply all pending migrations to the questionnaire database.
+
+    Course statistics marked as stale by a migration are computed again
+    afterwards, every migration of the questionnaire database has to go
+    through this function.
+
+    Returns:
+        The list of versions that were applied.
+
+    """
+    applied = migrate(db, 'util/migrations_questionnaire')
+    db.refresh_stale_course_statistics()
+    return applied
+
+
+@click.command('migrate-questionnaire-db')
+@with_appcontext
+def migrate_questionnaire_db_command():
+    """Create CLI for updating the database with `flask
+    migrate-questionnaire-db`.
+
+    All migrations the database is missing are applied, the existing data
+    is kept. Course statistics marked as stale by a migration are computed
+    again.
+
+    """
+    applied = migrate_questionnaire_db(QuestionnaireDB())
+    click.echo('Applied {:d} migrations to the questionnaire database'
+               ''.format(len(applied)))
+
+
 def close_questionnaire_db(e=None):
     """Close the database. Needed for the teardown."""
     db = g.pop(name='questionnaire_db', default=None)
@@ -239,15 +929,50 @@ def close_questionnaire_db(e=None):
         db.close()
 
 
+@click.command('pack-questionnaire-db')
+@with_appcontext
+def pack_questionnaire_db_command():
+    """Keep the answers of the questionnaires only in packed form.
+
+    The q-columns of the questionnaires are dropped and the database is
+    vacuumed to free the space. Pending migrations are applied first.
+
+    """
+    db = QuestionnaireDB()
+    migrate_questionnaire_db(db)
+    if not db._has_answer_columns('questionnaire_you'):
+        click.echo('The questionnaire database is already packed')
+        return
+    with current_app.open_resource('util/pack_questionnaire.sql') as f:
+        script = f.read().decode('utf8')
+    try:
+        db().executescript('BEGIN;\n{}\nCOMMIT;'.format(script))
+    except sqlite3.Error:
+        if db().in_transaction:
+            db().rollback()
+        raise
+    db.execute('VACUUM', ())
+    click.echo('Packed the questionnaire database')
+
+
 @click.command('load-questionnaire-data')
 @click.argument('file_location')
+@click.option('--chunksize', default=CHUNKSIZE, show_default=True,
+              help='Number of rows read and inserted at once.')
+@click.option('--cache/--no-cache', default=True, show_default=True,
+              help='Read and write the Parquet cache of excel exports.')
 @with_appcontext
-def load_questionnaire_data(file_location):
-    """Load the questionnaire data from a file into the database."""
-    data = pd.read_excel(file_location)
-    df = PrepareData(data)
+def load_questionnaire_data(file_location, chunksize, cache):
+    """Load the questionnaire data from a file into the database.
+
+    The file can be an excel export, CSV, Parquet or Arrow file. It is read
+    and inserted in chunks of `chunksize` rows.
+
+    """
     questionnaire_db = QuestionnaireDB()
-    questionnaire_db.insert_data(df)
+    ingest_cache = IngestCache()
+    for data in read_questionnaire_chunks(file_location, chunksize, cache):
+        questionnaire_db.insert_data(PrepareData(data), ingest_cache)
     click.echo('Loaded questionnaire data')
 
 
@@ -255,4 +980,6 @@ def init_app(app):
     """Create connection to the factory."""
     app.teardown_appcontext(close_questionnaire_db)
     app.cli.add_command(init_questionnaire_db_command)
+    app.cli.add_command(migrate_questionnaire_db_command)
+    app.cli.add_command(pack_questionnaire_db_command)
     app.cli.add_command(load_questionnaire_data)
@@ -23,12 +23,13 @@ def RemoveUnneededCols(df):
         "user",
         "user_agent",
     ]
-    df = df.drop(to_remove, axis=1)
+    # the streaming reader only reads the needed columns
+    df = df.drop(to_remove, axis=1, errors="ignore")
     return df
 
 
 def RemoveUnfinished(df):
-    df = df[df.privacy == 1]
+    df = df[(df.privacy == 1).fillna(False)]
     df = df.drop(["privacy"], axis=1)
     df = df.dropna(subset=["end"])
     return df
@@ -75,45 +76,62 @@ def CleanData(df):
     return df
 
 
-def CheckValidityControlRow(row):
+def CheckValidityControl(df):
     # control question needs to be answered "stimme eher zu" = 4
-    return row.qcontrol == 4 and row.qcontrol2 == 4
+    valid = (df.qcontrol == 4) & (df.qcontrol2 == 4)
+    return valid.fillna(False).astype(bool)
 
 
-def CheckValidityTimeRow(row, course_db):
-    course_times = course_db.get_course_questionnaire_dates(row["course_id"])
-    if row["pre_post"] == 1 and course_times is not None:
-        min_time = datetime.date.fromtimestamp(int(course_times["pre"]))
-        max_time = min_time + datetime.timedelta(days=14)
-        return row["end"] >= min_time and row["end"] <= max_time
-    elif row["pre_post"] == 2 and course_times is not None:
-        min_time = datetime.date.fromtimestamp(int(course_times["post"]))
-        max_time = min_time + datetime.timedelta(days=14)
-        return row["end"] >= min_time and row["end"] <= max_time
-    return False
+def CheckValidityTime(df, course_dates):
+    """Check if the rows were finished within 14 days of the survey start.
 
+    Args:
+        df (pd.DataFrame): The data with the course_id, pre_post and end.
+        course_dates (dict): The start dates of the surveys for each course
+            identifier, see CourseDB.get_all_questionnaire_dates.
 
-def AddValidity(df):
+    """
+    def start_dates(pre_post):
+        return pd.to_datetime(df["course_id"].map({
+            identifier: datetime.date.fromtimestamp(int(dates[pre_post]))
+            for identifier, dates in course_dates.items()
+        }))
+
+    min_time = start_dates("pre").where(
+            df["pre_post"] == 1, start_dates("post").where(
+                df["pre_post"] == 2))
+    max_time = min_time + pd.Timedelta(days=14)
+    end = pd.to_datetime(df["end"])
+    return (end >= min_time) & (end <= max_time)
+
+
+def AddValidity(df, course_dates=None):
     """Check validity of row.
 
     valid_control tests for the correct answer of the control question and
     valid_time tests for if the end date is within 14 days of the begin of the
-    post test.
+    post test. The dates of all courses are fetched with a single query,
+    unless they are given as `course_dates` (see
+    CourseDB.get_all_questionnaire_dates).
 
     """
-    df["valid_control"] = df.apply(
-            lambda row: CheckValidityControlRow(row), axis=1)
+    df["valid_control"] = CheckValidityControl(df)
     df = df.drop(["qcontrol", "qcontrol2"], axis=1)
-    course_db = CourseDB()
-    df["valid_time"] = df.apply(
-            lambda row: CheckValidityTimeRow(row, course_db), axis=1)
+    if course_dates is None:
+        course_dates = CourseDB().get_all_questionnaire_dates()
+    df["valid_time"] = CheckValidityTime(df, course_dates)
     return df
 
 
-def PrepareData(df):
-    """Fully clean the data."""
+def PrepareData(df, course_dates=None):
+    """Fully clean the data.
+
+    With `course_dates` no database is needed, so the data can also be
+    prepared outside of the application context.
+
+    """
     df = (df
         .pipe(CleanData)
-        .pipe(AddValidity)
+        .pipe(AddValidity, course_dates)
     )
     return df
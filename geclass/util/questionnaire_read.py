@@ -0,0 +1,229 @@
+"""Read the questionnaire data exported from QUAMP.
+
+The exports are read in chunks of a fixed number of rows, so the memory used
+while loading does not grow with the size of the export. Only the columns
+used by `PrepareData` are kept, the answers are stored as int16 and the codes
+as categoricals.
+
+Besides the excel exports, CSV, Parquet and Arrow (Feather) files are read.
+Old .xls workbooks cannot be streamed, they are read at once with pandas.
+When an excel export is read for the first time, it is converted to a Parquet
+file next to it (see `cache_location`), which is read instead the next time.
+Reading Parquet and Arrow files and the cache need pyarrow.
+
+"""
+
+import itertools
+import os
+
+import openpyxl
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+CHUNKSIZE = 5000
+
+ANSWER_COLUMNS = (
+    ['q{:d}_{:d}'.format(i, j) for i in range(1, 31) for j in (1, 2)]
+    + ['post_{:d}'.format(i) for i in range(1, 24)]
+    + ['qcontrol', 'qcontrol2']
+)
+INTEGER_COLUMNS = ['pre_post', 'privacy']
+CODE_COLUMNS = ['personal_code', 'course_code', 'course_id']
+TIME_COLUMNS = ['start', 'end']
+NEEDED_COLUMNS = frozenset(
+    ANSWER_COLUMNS + INTEGER_COLUMNS + CODE_COLUMNS + TIME_COLUMNS)
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+LEGACY_EXCEL_EXTENSIONS = ('.xls',)
+CSV_EXTENSIONS = ('.csv',)
+PARQUET_EXTENSIONS = ('.parquet',)
+ARROW_EXTENSIONS = ('.arrow', '.feather')
+
+
+def _code(value):
+    """Return a code as string, missing codes stay missing."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    return str(value)
+
+
+def CompactDtypes(df):
+    """Store answers and flags as nullable int16 and codes as categoricals.
+
+    The answers keep the missing codes -997, -998 and -999 of QUAMP, which do
+    not fit into int8, they are stored as missing answers by the database.
+    Codes are stored as strings, also if they were read as numbers. The start
+    and end are converted to datetime, unreadable times are missing.
+
+    """
+    for column in df.columns:
+        if column in ANSWER_COLUMNS or column in INTEGER_COLUMNS:
+            df[column] = pd.to_numeric(
+                    df[column], errors='coerce').astype('Int16')
+        elif column in CODE_COLUMNS:
+            df[column] = df[column].map(_code).astype('category')
+        elif column in TIME_COLUMNS:
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+    return df
+
+
+def cache_location(file_location):
+    """Return the location of the Parquet cache of an excel export."""
+    return os.path.splitext(file_location)[0] + '.parquet'
+
+
+def read_questionnaire_chunks(file_location, chunksize=CHUNKSIZE,
+                              use_cache=True):
+    """Read an export of the questionnaire in chunks.
+
+    The format is determined by the extension of the file. Excel workbooks
+    are streamed row by row, old .xls workbooks are read at once, and both
+    are cached as Parquet file, if pyarrow is available. A cache is only used if it is newer than the workbook.
+
+    Args:
+        file_location (str): The path to the export.
+        chunksize (int): The number of rows per chunk.
+        use_cache (bool): Read and write the cache of excel exports.
+
+    Yields:
+        A pd.DataFrame with the needed columns of up to `chunksize` rows.
+
+    """
+    extension = os.path.splitext(file_location)[1].lower()
+    cache = None
+    if extension in CSV_EXTENSIONS:
+        chunks = pd.read_csv(
+            file_location, usecols=lambda name: name in NEEDED_COLUMNS,
+            chunksize=chunksize)
+    elif extension in PARQUET_EXTENSIONS:
+        chunks = _read_parquet(file_location, chunksize)
+    elif extension in ARROW_EXTENSIONS:
+        chunks = _read_arrow(file_location, chunksize)
+    elif extension in EXCEL_EXTENSIONS + LEGACY_EXCEL_EXTENSIONS:
+        if extension in LEGACY_EXCEL_EXTENSIONS:
+            chunks = _read_legacy_excel(file_location, chunksize)
+        else:
+            chunks = _read_excel(file_location, chunksize)
+        if use_cache and pyarrow is not None:
+            cache = cache_location(file_location)
+            if (os.path.exists(cache) and os.path.getmtime(cache)
+                    >= os.path.getmtime(file_location)):
+                chunks = _read_parquet(cache, chunksize)
+                cache = None
+    else:
+        raise ValueError('Unknown file format {}'.format(extension))
+    chunks = map(CompactDtypes, chunks)
+    if cache is not None:
+        chunks = _write_cache(chunks, cache)
+    yield from chunks
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise ImportError('Reading Parquet and Arrow files requires pyarrow')
+
+
+def _read_excel(file_location, chunksize):
+    workbook = openpyxl.load_workbook(
+        file_location, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        indices = [
+            i for i, name in enumerate(header) if name in NEEDED_COLUMNS
+        ]
+        columns = [header[i] for i in indices]
+        while True:
+            chunk = [
+                tuple(row[i] if i < len(row) else None for i in indices)
+                for row in itertools.islice(rows, chunksize)
+            ]
+            if not chunk:
+                return
+            yield pd.DataFrame.from_records(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _read_legacy_excel(file_location, chunksize):
+    """Read an .xls workbook, which cannot be streamed, at once with pandas.
+
+    Reading needs xlrd. Only the needed columns are kept and they are passed
+    on in chunks like the other formats.
+
+    """
+    df = pd.read_excel(
+        file_location, usecols=lambda name: name in NEEDED_COLUMNS)
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize].reset_index(drop=True)
+
+
+def _read_parquet(file_location, chunksize):
+    _require_pyarrow()
+    parquet_file = pyarrow.parquet.ParquetFile(file_location)
+    columns = [
+        name for name in parquet_file.schema_arrow.names
+        if name in NEEDED_COLUMNS
+    ]
+    for batch in parquet_file.iter_batches(
+            batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+
+def _read_arrow(file_location, chunksize):
+    _require_pyarrow()
+    with pyarrow.memory_map(file_location) as source:
+        table = pyarrow.ipc.open_file(source).read_all()
+        table = table.select([
+            name for name in table.schema.names if name in NEEDED_COLUMNS
+        ])
+        for batch in table.to_batches(max_chunksize=chunksize):
+            yield batch.to_pandas()
+
+
+def _arrow_schema(columns):
+    """Return the schema of the cache for the columns of an export."""
+    types = {}
+    for column in columns:
+        if column in CODE_COLUMNS:
+            types[column] = pyarrow.string()
+        elif column in TIME_COLUMNS:
+            types[column] = pyarrow.timestamp('us')
+        else:
+            types[column] = pyarrow.int16()
+    return pyarrow.schema(list(types.items()))
+
+
+def _write_cache(chunks, cache):
+    """Write the chunks to the cache while passing them on.
+
+    The cache is written to a temporary file, which only replaces the cache
+    once all chunks were read.
+
+    """
+    temporary = cache + '.tmp'
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = _arrow_schema(chunk.columns)
+                writer = pyarrow.parquet.ParquetWriter(temporary, schema)
+            writer.write_table(pyarrow.Table.from_pandas(
+                chunk, schema=schema, preserve_index=False))
+            yield chunk
+        if writer is not None:
+            writer.close()
+            writer = None
+            os.replace(temporary, cache)
+    finally:
+        if writer is not None:
+            writer.close()
+            os.remove(temporary)
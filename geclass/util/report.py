@@ -5,10 +5,17 @@ course identifier in /instance. They can be created with the command
 
     $ flask create-reports
 
+With `--jobs N` the reports are rendered by N processes in parallel. Every
+report stores a fingerprint of its inputs, a report is only rebuilt if its
+fingerprint changed or with `--force`. With `--fast` the reports are
+rendered without LaTeX, see report_fast.
+
 """
 
-import copy
+import concurrent.futures
 import datetime
+import hashlib
+import json
 import logging
 import os
 import subprocess
@@ -18,12 +25,21 @@ from flask import current_app
 from flask.cli import with_appcontext
 
 from geclass.course_db import CourseDB
-from geclass.send_email import SendEmail
+import geclass.send_email
 from geclass.util.questionnaire_db import QuestionnaireDB
-from geclass.util.plots import generate_plots
+from geclass.util.responses import QuestionnaireSummary
+from geclass.util.plots import PLOT_VERSION, generate_plots
+from geclass.util.report_fast import layout_hash, render_report_fast
 
 log = logging.getLogger(__name__)
 
+# The file in the report directory with the fingerprint of the inputs.
+FINGERPRINT_FILE = 'fingerprint'
+
+# The name of the pdf while it is rendered, it only replaces report.pdf once
+# it is complete.
+_RENDER_JOBNAME = 'report_new'
+
 
 def sanitize_name(course_name):
     """Sanitize the name of a course for latex."""
@@ -48,28 +64,248 @@ def sanitize_name(course_name):
     return sanitized_name
 
 
+def render_report(report_dir, matched_responses, similar_responses, content,
+                  timeout=None):
+    """Render the plots and the pdf of one report.
+
+    Everything is written to `report_dir`, the working directory of the
+    process is not changed, so multiple reports can be rendered in parallel.
+    The pdf is rendered next to report.pdf and only replaces it if LaTeX
+    succeeded, so a failed run keeps the previous report instead of leaving
+    an incomplete one.
+
+    Args:
+        report_dir (str): The directory of the report.
+        matched_responses (QuestionnaireResponses): The responses of the
+            course.
+        similar_responses (QuestionnaireSummary): The summary of the
+            responses of the similar courses.
+        content (str): The filled in report template.
+        timeout (float, optional): Seconds after which the LaTeX run is
+            aborted.
+
+    Returns:
+        None if the report was created, otherwise the reason of the failure.
+
+    """
+    jobname = '-jobname={}'.format(_RENDER_JOBNAME)
+    rendered_pdf = os.path.join(report_dir, _RENDER_JOBNAME + '.pdf')
+    try:
+        generate_plots(matched_responses, similar_responses, report_dir)
+        with open(os.path.join(report_dir, 'report.tex'), 'w') as f:
+            f.write(content)
+        latexmk_command = [
+            'latexmk', '-pdf', '-quiet', '-f', jobname, 'report.tex']
+        latexmk_clean = ['latexmk', '-c', jobname, 'report.tex']
+        latexmk = subprocess.run(
+            latexmk_command, cwd=report_dir, timeout=timeout,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if latexmk.returncode:
+            return 'latexmk exited with {}'.format(latexmk.returncode)
+        os.replace(rendered_pdf, os.path.join(report_dir, 'report.pdf'))
+        subprocess.run(latexmk_clean, cwd=report_dir, timeout=timeout,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except subprocess.TimeoutExpired:
+        return 'latexmk did not finish within {} seconds'.format(timeout)
+    except Exception as e:
+        return repr(e)
+    finally:
+        if os.path.exists(rendered_pdf):
+            os.remove(rendered_pdf)
+    return None
+
+
+def _render_reports(reports, jobs, timeout, fast=False):
+    """Render the reports and yield each report with its result.
+
+    Args:
+        reports (list(dict)): The reports with the arguments of
+            render_report and render_report_fast, the course id and the
+            course identifier.
+        jobs (int): The number of worker processes, for 1 all reports are
+            rendered in this process.
+        timeout (float): The timeout of the LaTeX run of a single report.
+        fast (bool): Render the reports without LaTeX, see
+            render_report_fast.
+
+    """
+    def arguments(report):
+        if fast:
+            return (report['report_dir'], report['matched_responses'],
+                    report['similar_responses'], report['values'])
+        return (report['report_dir'], report['matched_responses'],
+                report['similar_responses'], report['content'], timeout)
+
+    render = render_report_fast if fast else render_report
+    if jobs <= 1:
+        for report in reports:
+            yield report, render(*arguments(report))
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(render, *arguments(report)): report
+            for report in reports
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                failure = future.result()
+            except Exception as e:
+                failure = repr(e)
+            yield futures[future], failure
+
+
+def report_fingerprint(cohort, pair_ids, cohort_summary, report_info,
+                       template_hash, fast=False):
+    """Return the fingerprint of the inputs of a report.
+
+    The fingerprint changes if the matched pairs of the course or of a
+    similar course change, if a similar course is added, if the statistics
+    the cohort is compared with change (e.g. after they were computed
+    again), if the name or number of students of the course change, if the
+    template (or the layout of fast reports) or the plots change or if the
+    report is rendered differently.
+
+    Args:
+        cohort (tuple(int)): The ids of the course and the similar courses,
+            see CourseDB.get_cohorts.
+        pair_ids (dict): The ids of the matched pairs of (at least) the
+            courses in the cohort, see QuestionnaireDB.get_matched_pair_ids.
+        cohort_summary (QuestionnaireSummary): The summary of the responses
+            of the cohort, see _cohort_responses.
+        report_info (tuple): The name and the number of students of the
+            course.
+        template_hash (str): The hash of the report template or, for fast
+            reports, of their layout, see report_fast.layout_hash.
+        fast (bool): If the report is rendered without LaTeX.
+
+    Returns:
+        The fingerprint as hex string.
+
+    """
+    inputs = {
+        'pairs': [[course_id, pair_ids[course_id]] for course_id in cohort],
+        'statistics': [
+            [summary.students, summary.sums.tolist(),
+             summary.squares.tolist(), summary.counts.tolist()]
+            for summary in (
+                getattr(cohort_summary, attr)
+                for attr in QuestionnaireSummary._attributes)
+        ],
+        'info': list(report_info),
+        'template': template_hash,
+        'plots': PLOT_VERSION,
+        'fast': fast,
+    }
+    return hashlib.sha256(
+        json.dumps(inputs, sort_keys=True).encode('utf8')).hexdigest()
+
+
+def read_fingerprint(report_dir):
+    """Return the fingerprint of an existing report or None."""
+    try:
+        with open(os.path.join(report_dir, FINGERPRINT_FILE), 'r') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def write_fingerprint(report_dir, fingerprint):
+    """Store the fingerprint of the inputs of a report."""
+    with open(os.path.join(report_dir, FINGERPRINT_FILE), 'w') as f:
+        f.write(fingerprint)
+
+
+def _cohort_responses(questionnaire_db, cohorts):
+    """Return the summary of the responses of the cohort of each course.
+
+    The responses of a course are compared to its cohort, the course itself
+    and all similar courses. Courses of the same cohort share the summary,
+    so it is only added up once per cohort. The cohorts are only needed for
+    statistics, so the stored summaries are used instead of loading all
+    responses.
+
+    Args:
+        questionnaire_db (QuestionnaireDB): The database of the responses.
+        cohorts (dict): The cohort of each course, see CourseDB.get_cohorts.
+
+    Returns:
+        A dict with the QuestionnaireSummary of the cohort for each course id.
+
+    """
+    summaries = questionnaire_db.get_course_statistics(
+        {i for cohort in cohorts.values() for i in cohort})
+    totals = {}
+    for cohort in set(cohorts.values()):
+        totals[cohort] = QuestionnaireSummary.total(
+            [summaries[i] for i in cohort])
+    return {course_id: totals[cohort] for course_id, cohort in cohorts.items()}
+
+
 @click.command('create-reports')
+@click.option('--jobs', default=1, show_default=True,
+              help='Number of reports rendered in parallel.')
+@click.option('--timeout', default=600, show_default=True,
+              help='Seconds after which the LaTeX run of a report is '
+                   'aborted.')
+@click.option('--force', is_flag=True,
+              help='Rebuild all reports, also if their inputs did not '
+                   'change.')
+@click.option('--fast/--latex', default=None,
+              help='Render the reports without LaTeX, defaults to the '
+                   'FAST_REPORTS config.')
 @with_appcontext
-def create_reports():
-    """Create the reports for all finished courses."""
+def create_reports(jobs, timeout, force, fast):
+    """Create the reports for all finished courses.
+
+    A report is only created again if its fingerprint changed, see
+    report_fingerprint.
+
+    """
+    if fast is None:
+        fast = current_app.config['FAST_REPORTS']
     course_db = CourseDB()
     questionnaire_db = QuestionnaireDB()
+    # the cohorts are compared with the stored statistics
+    if questionnaire_db.refresh_stale_course_statistics():
+        log.warning('Computed the stale course statistics again')
     finished_courses = course_db.get_postsurveys_starting_before(
             datetime.timedelta(days=15))
+    finished_ids = [course_id for course_id, _ in finished_courses]
+    cohorts = course_db.get_cohorts(finished_ids)
+    pair_ids = questionnaire_db.get_matched_pair_ids(
+        {i for cohort in cohorts.values() for i in cohort})
+    report_infos = course_db.get_course_report_infos(finished_ids)
+    # the summaries are part of the fingerprint, they are read from the
+    # stored statistics for all finished courses
+    cohort_responses = _cohort_responses(questionnaire_db, cohorts)
+    with current_app.open_resource('util/report_template.txt', 'r') as f:
+        template = f.read()
+    # fast reports do not use the template but their own layout
+    if fast:
+        template_hash = layout_hash()
+    else:
+        template_hash = hashlib.sha256(template.encode('utf8')).hexdigest()
+    due_courses = []
     for (course_id, course_identifier) in finished_courses:
         report_dir = os.path.join(current_app.instance_path, course_identifier)
-        if os.path.exists(report_dir):
+        fingerprint = report_fingerprint(
+            cohorts[course_id], pair_ids, cohort_responses[course_id],
+            report_infos[course_id], template_hash, fast)
+        if not force and read_fingerprint(report_dir) == fingerprint:
             continue
-        matched_responses = questionnaire_db.get_matched_responses(course_id)
-        similar_courses = course_db.get_similar_course_ids(course_id)
-        similar_responses = copy.deepcopy(matched_responses)
-        for (similar_id,) in similar_courses:
-            matched = questionnaire_db.get_matched_responses(similar_id)
-            similar_responses.append(matched)
-        os.mkdir(report_dir)
-        os.chdir(report_dir)
+        due_courses.append(
+            (course_id, course_identifier, report_dir, fingerprint))
+    due_ids = [course_id for course_id, _, _, _ in due_courses]
+    all_matched = questionnaire_db.get_matched_responses_for_courses(due_ids)
+    counts = questionnaire_db.get_course_counts(due_ids)
+    reports = []
+    for (course_id, course_identifier, report_dir, fingerprint) \
+            in due_courses:
+        matched_responses = all_matched[course_id]
+        similar_responses = cohort_responses[course_id]
+        os.makedirs(report_dir, exist_ok=True)
         if matched_responses.size() == 0:
-            SendEmail(
+            geclass.send_email.SendEmail(
                 'ge-class@uni-potsdam.de',
                 'Kurs {} hat keine gematched Antworten'
                 .format(course_identifier),
@@ -79,28 +315,41 @@ def create_reports():
             )
             log.warning('Course {} with id {}  has no matched responses'
                         .format(course_identifier, course_id))
+            # an outdated report must not be sent anymore
+            report_pdf = os.path.join(report_dir, 'report.pdf')
+            if os.path.exists(report_pdf):
+                os.remove(report_pdf)
+            write_fingerprint(report_dir, fingerprint)
             continue
-        generate_plots(matched_responses, similar_responses)
-        count_pre, count_post = questionnaire_db.get_course_numbers(course_id)
-        name, count_students = course_db.get_course_report_info(course_id)
-        with current_app.open_resource('util/report_template.txt', 'r') as f:
-            content = f.read().format(
-                course_name=sanitize_name(name),
-                course_pre=count_pre,
-                course_post=count_post,
-                course_matched=matched_responses.size(),
-                course_reported=count_students,
-                course_ratio=matched_responses.size()/count_students,
-                similar_matched=similar_responses.size(),
-            )
-        with open(os.path.join(report_dir, 'report.tex'), 'w') as f:
-            f.write(content)
-        latexmk_command = ['latexmk', '-pdf', '-quiet', '-f', 'report.tex']
-        latexmk_clean = ['latexmk', '-c', 'report.tex']
-        failure = subprocess.call(latexmk_command, stdout=subprocess.DEVNULL,
-                                  stderr=subprocess.DEVNULL)
-        if failure:
-            SendEmail(
+        name, count_students = report_infos[course_id]
+        values = {
+            'course_name': name,
+            'course_pre': counts[course_id].pre,
+            'course_post': counts[course_id].post,
+            'course_matched': matched_responses.size(),
+            'course_reported': count_students,
+            'course_ratio': matched_responses.size()/count_students,
+            'similar_matched': similar_responses.size(),
+        }
+        content = template.format(
+            **dict(values, course_name=sanitize_name(name)))
+        reports.append({
+            'course_id': course_id,
+            'course_identifier': course_identifier,
+            'report_dir': report_dir,
+            'matched_responses': matched_responses,
+            'similar_responses': similar_responses,
+            'content': content,
+            'values': values,
+            'fingerprint': fingerprint,
+        })
+    for report, failure in _render_reports(reports, jobs, timeout, fast):
+        course_identifier = report['course_identifier']
+        course_id = report['course_id']
+        if failure is not None:
+            # without a new fingerprint the report is tried again next time,
+            # until then the previous report.pdf, if any, is kept
+            geclass.send_email.SendEmail(
                 'ge-class@uni-potsdam.de',
                 'Fehler bei Report für Kurs {}'
                 .format(course_identifier),
@@ -109,12 +358,13 @@ def create_reports():
                 .format(course_identifier, course_id)
             )
             log.error('Error while processing of the tex-file for course '
-                      '{} with id {}'.format(course_identifier, course_id))
+                      '{} with id {}: {}'
+                      .format(course_identifier, course_id, failure))
             continue
-        subprocess.call(latexmk_clean, stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL)
+        write_fingerprint(report['report_dir'], report['fingerprint'])
         click.echo('Generated Report for {} with {} matched responses'
-                .format(course_identifier, matched_responses.size()))
+                .format(course_identifier,
+                        report['matched_responses'].size()))
     click.echo('Finished Reports')
 
 
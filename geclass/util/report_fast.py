@@ -0,0 +1,239 @@
+"""Render the reports without LaTeX.
+
+The fast reports contain the same plots as the LaTeX reports, but the pages
+are laid out with matplotlib and written by its PDF backend, the text is
+rendered with mathtext. They need no TeX installation and take a fraction of
+the time, which helps when many reports are regenerated or for a preview.
+They are created with
+
+    $ flask create-reports --fast
+
+or by default if FAST_REPORTS is set in the config.
+
+"""
+
+import hashlib
+import json
+import os
+import textwrap
+
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+from geclass.util.plots import (
+    A4, OverviewPlotTypes, overall_score_figure, question_overview_figure,
+    rc_context)
+
+FAST_RC = {
+    'text.usetex': False,
+    'font.family': 'serif',
+    'mathtext.fontset': 'dejavuserif',
+    'savefig.format': 'pdf',
+}
+
+_TITLE = 'Ergebnisse der GE-CLASS Befragung für den Kurs {course_name}'
+
+_INTRODUCTION = [
+    'Vielen Dank für Ihre Teilnahme an der GE-CLASS. Wir hoffen, dass Sie aus '
+    'dem nachfolgenden Report hilfreiche Schlüsse über das Verständnis der '
+    'Experimentalphysik Ihrer Studenten gewinnen können. Die GE-CLASS ist '
+    'eine Adaption der E-CLASS von Lewandowski et al. von der Univeristy of '
+    'Colorado für den deutschen Sprachraum. In den folgenden Grafiken finden '
+    'Sie einen Vergleich der Antworten Ihrer Studenten mit den Antworten von '
+    'Studenten aus ähnlichen Kursen.',
+    'Sollten Sie Fragen order Anregungen zu der Befragung haben, melden Sie '
+    'sich bitte unter ge-class@uni-potsdam.de',
+]
+
+_OVERVIEW = [
+    ('Anzahl der Antworten für diesen Kurs in der Prä-Befragung:',
+     '{course_pre}'),
+    ('Anzahl der Antworten für diesen Kurs in der Post-Befragung:',
+     '{course_post}'),
+    ('Anzahl der gültigen zusammenhängenden Prä- und Post-Antworten für '
+     'diesen Kurs:', '{course_matched}'),
+    ('Angegebene Anzahl an Studenten für diesen Kurs:', '{course_reported}'),
+    ('Teilnahme dieses Kurses und der Befragung:', '{course_ratio:.2f}'),
+    ('Anzahl der Antworten für ähnliche Kurse zum Vergleich:',
+     '{similar_matched}'),
+]
+
+_EXPLANATION = [
+    'Ähnliche Kurse sind Kurse desselben Jahrgangs (1./2. Semester, oder 3. '
+    'Semester und später) und desselben Studiengangs (Mono Bachelor Physik, '
+    'oder Bachelor Nebenfach, etc.). Die Antworten dieses Kurses werden dabei '
+    'mit betrachtet.',
+    'Als gültige und zusammenhängende Antworten für diesen Kurs gelten '
+    'Antworten, die innerhalb von 14 Tagen nach Beginn der Prä- und '
+    'Post-Befragung abgegeben wurden, bei denen die Kontrollfrage (Frage 22: '
+    'Bitte wählen Sie „stimme eher zu“ aus) richtig beantwortet wurde, und '
+    'bei denen durch den persönlichen Code die Antworten zu der Prä- und '
+    'Post-Befragung zueinander zugeordnet werden könne.',
+]
+
+_CHANGE = (
+    'Die Kreise zeigen den Mittelwert der Prä-Befragung und die Pfeile die '
+    'Änderung von Prä- zu Post-Befragung. Die schattierten Balken markieren '
+    'ein Konfidenzintervall von 95% für die Prä-Befragung.'
+)
+_RIGHT = (
+    'Ein Änderung des Mittelwertes nach rechts zeigt einen höheren Anteil an '
+    'gleichen Ansichten, wie Experten.'
+)
+
+_CAPTIONS = {
+    'overall_score': (
+        'Vergleich zwischen dem Gesamtergebnis der GEclass für die Prä- und '
+        'Post-Befragung für diesen und ähnliche Kurse für Fragen der „Was '
+        'denken SIE ...“-Art. Dieser Kurs (rot) wird mit ähnlichen Kursen '
+        '(grau) derselben Semester-Stufe und desselben Studiengang verglichen. '
+        'Das Ergebnis ist der Mittelwert über alle Studenten und alle Fragen '
+        'verglichen mit den Antworten der Experten. Die Fehlerbalken markieren '
+        'eine Standardmessunsicherheit des Mittelwertes.'),
+    OverviewPlotTypes.YOU_SIMILAR: (
+        'Änderung der Prä- und Post-Antworten der Studenten zu den „Was '
+        'denken SIE...“-Fragen für diesen Kurs (rot) und ähnliche Kurse '
+        '(grau). ' + _CHANGE + ' Die Fragen sind nach dem Mittelwert der '
+        'Prä-Befragung der ähnlichen Kurse sortiert. ' + _RIGHT),
+    OverviewPlotTypes.EXPERT_SIMILAR: (
+        'Änderung der Prä- und Post-Antworten der Studenten zu den „Was '
+        'denken Experten...“-Fragen für diesen Kurs (blau) und ähnliche Kurse '
+        '(grau). ' + _CHANGE + ' Die Fragen sind nach dem Mittelwert der '
+        'Prä-Befragung der ähnlichen Kurse sortiert. ' + _RIGHT),
+    OverviewPlotTypes.YOU_EXPERT: (
+        'Vergleich der Änderung der Antworten auf „Was denken SIE...“- (rot) '
+        'und „Was denken Experten...“-Fragen (blau) für die Prä- und '
+        'Post-Befragung. ' + _CHANGE + ' Die Fragen sind nach dem Mittelwert '
+        'der „Was denken Experten...“-Fragen sortiert. ' + _RIGHT),
+    OverviewPlotTypes.MARK: (
+        'Darstellung der Ansichten der Studenten über die Wichtigkeit von '
+        'verschiedenen Tätigkeiten für die Benotung in diesem Kurs (rot) und '
+        'ähnlichen Kursen (grau). Die Kreise zeigen den Mittelwert und die '
+        'schattierten Balken markieren ein Konfidenzintervall von 95%. Die '
+        'Fragen sind nach dem Mittelwert der Prä-Befragung der ähnlichen Kurse '
+        'sortiert.'),
+}
+
+
+def layout_hash():
+    """Return the hash of the text and the rc parameters of the layout.
+
+    The text is kept in sync with report_template.txt by hand, the hash
+    takes the place of the hash of the template in the fingerprint of fast
+    reports, see report_fingerprint.
+
+    """
+    layout = {
+        'title': _TITLE,
+        'introduction': _INTRODUCTION,
+        'overview': _OVERVIEW,
+        'explanation': _EXPLANATION,
+        'captions': [[str(key), caption] for key, caption in
+                     _CAPTIONS.items()],
+        'rc': FAST_RC,
+    }
+    return hashlib.sha256(
+        json.dumps(layout, sort_keys=True).encode('utf8')).hexdigest()
+
+
+def escape_mathtext(text):
+    """Escape the dollar signs, so a text is not read as mathtext."""
+    return text.replace('$', '\\$')
+
+
+class _Page():
+    """Write text from top to bottom on an A4 page."""
+
+    def __init__(self, margin=1.):
+        self.fig = Figure(figsize=A4)
+        self.margin = margin
+        self.y = A4[1] - margin
+
+    def _position(self, x):
+        return x / A4[0], self.y / A4[1]
+
+    def write(self, text, fontsize=11, weight='normal', indent=0.,
+              width=None, space_after=0.15):
+        """Write a paragraph wrapped to the width (in inches) of the page."""
+        if width is None:
+            width = A4[0] - 2 * self.margin - indent
+        lines = textwrap.wrap(text, int(width * 144 / fontsize))
+        self.fig.text(
+            *self._position(self.margin + indent), '\n'.join(lines),
+            fontsize=fontsize, weight=weight, va='top', ha='left',
+            linespacing=1.3)
+        self.y -= len(lines) * fontsize * 1.3 / 72 + space_after
+
+    def write_row(self, label, value, fontsize=11):
+        """Write a row of a table with the value on the right."""
+        self.fig.text(
+            *self._position(A4[0] - self.margin), value, fontsize=fontsize,
+            va='top', ha='right')
+        self.write(label, fontsize=fontsize, width=A4[0] - 2 * self.margin
+                   - 1., space_after=0.08)
+
+
+def _summary_page(values):
+    page = _Page()
+    page.write(_TITLE.format(**values), fontsize=17, weight='bold',
+               space_after=0.4)
+    for paragraph in _INTRODUCTION:
+        page.write(paragraph)
+    page.y -= 0.2
+    page.write('Übersicht der Ergebnisse', fontsize=14, weight='bold')
+    for label, value in _OVERVIEW:
+        page.write_row(label, value.format(**values))
+    page.y -= 0.2
+    for paragraph in _EXPLANATION:
+        page.write(paragraph)
+    return page.fig
+
+
+def render_report_fast(report_dir, matched_responses, similar_responses,
+                       values):
+    """Render the report of one course as report.pdf without LaTeX.
+
+    Args:
+        report_dir (str): The directory of the report.
+        matched_responses (QuestionnaireResponses): The responses of the
+            course.
+        similar_responses (QuestionnaireSummary): The summary of the
+            responses of the similar courses.
+        values (dict): The values of the report template, the course name is
+            not sanitized for LaTeX.
+
+    Returns:
+        None if the report was created, otherwise the reason of the failure.
+
+    """
+    values = dict(values, course_name=escape_mathtext(values['course_name']))
+    pages = [
+        lambda: _summary_page(values),
+        lambda: overall_score_figure(
+            matched_responses, similar_responses,
+            caption=_CAPTIONS['overall_score']),
+    ] + [
+        # the comparison of you and expert uses only the course
+        lambda plot_type=plot_type: question_overview_figure(
+            matched_responses,
+            matched_responses if plot_type == OverviewPlotTypes.YOU_EXPERT
+            else similar_responses,
+            plot_type, caption=_CAPTIONS[plot_type])
+        for plot_type in (
+            OverviewPlotTypes.YOU_SIMILAR, OverviewPlotTypes.EXPERT_SIMILAR,
+            OverviewPlotTypes.YOU_EXPERT, OverviewPlotTypes.MARK)
+    ]
+    report_pdf = os.path.join(report_dir, 'report.pdf')
+    # the pdf only replaces the previous report once it is complete
+    temporary = report_pdf + '.tmp'
+    try:
+        with rc_context(FAST_RC), PdfPages(temporary) as pdf:
+            for page in pages:
+                pdf.savefig(page())
+        os.replace(temporary, report_pdf)
+    except Exception as e:
+        return repr(e)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return None
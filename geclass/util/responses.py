@@ -2,6 +2,44 @@
 
 import numpy as np
 
+# Reduction of the Likert scale from 5 to 3 levels, indexed by the answer.
+_LIKERT_REDUCTION = np.array([0, -1, -1, 0, 1, 1])
+
+
+def compare_expert(answers, experts, disagreement=False):
+    """Compare the answers of students to the experts.
+
+    Works on the answers of a single student as well as on the answers of
+    many students at once, with one row per student.
+
+    Args:
+        answers (np.array): The answers in Likert-Scale (1 - 5), every other
+            value counts as no answer given.
+        experts (np.array): The answers of the experts (-1, 0 or 1) for each
+            question.
+        disagreement (bool): Determines if the Likert scale is redued to
+            binary, i.e., 1 and 0 for agreement with experts or to 1, 0, -1 to
+            include disagreement.
+
+    Returns:
+        np.array of the same shape as answers with the agreement and -998 for
+        no answer given.
+
+    >>> compare_expert(np.array([[5, 1], [-999, 3]]), np.array([1, 1]))
+    array([[   1,    0],
+           [-998,    0]])
+
+    """
+    answers = np.asarray(answers)
+    given = (answers >= 1) & (answers <= 5)
+    likert = _LIKERT_REDUCTION[np.where(given, answers, 0).astype(np.intp)]
+    if disagreement:
+        compared = likert * experts
+    else:
+        compared = (likert == experts).astype(int)
+    return np.where(given, compared, -998)
+
+
 class Responses:
     """Responses of a single student as compared to the experts.
 
@@ -36,32 +74,13 @@ class Responses:
 
     def __init__(self, q_you_pre, q_you_post, q_expert_pre, q_expert_post,
                  q_mark, disagreement=False):
-        self.q_mark = self._compare_expert(q_mark, self.experts_marks, disagreement)
-        self.q_you_pre = self._compare_expert(q_you_pre, self.experts, disagreement)
-        self.q_you_post = self._compare_expert(q_you_post, self.experts, disagreement)
-        self.q_expert_pre = self._compare_expert(q_expert_pre, self.experts, disagreement)
-        self.q_expert_post = self._compare_expert(q_expert_post, self.experts, disagreement)
-
-    def _likert_reduce(self, responses):
-        """Reduce Likert from 5 to 3 levels."""
-        translation = {1 : -1, 2: -1, 3: 0, 4: 1, 5: 1, -998: -998, -997: -998,
-                       -999: -998}
-        likert = np.vectorize(translation.get)(responses)
-        return likert
-
-    def _compare_expert(self, q_student, a_expert, disagreement):
-        """Compare responses of students to experts."""
-        compared = []
-        q_student = self._likert_reduce(q_student)
-        for response_student, response_experts in zip(q_student, a_expert):
-            if response_student == -998:
-                compared.append(-998)
-            else:
-                if disagreement:
-                    compared.append(int(response_student * response_experts))
-                else:
-                    compared.append(int(response_student == response_experts))
-        return np.array(compared)
+        self.q_mark = compare_expert(q_mark, self.experts_marks, disagreement)
+        self.q_you_pre = compare_expert(q_you_pre, self.experts, disagreement)
+        self.q_you_post = compare_expert(q_you_post, self.experts, disagreement)
+        self.q_expert_pre = compare_expert(
+                q_expert_pre, self.experts, disagreement)
+        self.q_expert_post = compare_expert(
+                q_expert_post, self.experts, disagreement)
 
 
 class ResponseAggregate:
@@ -71,8 +90,15 @@ class ResponseAggregate:
     (excluding answers not given). Access to one element returns a cut through
     all answers at the given position, excluding answers not given.
 
+    The answers are kept in a 2-D array with one row per student together
+    with a mask of the given answers, so the sums and counts of all columns
+    are computed without iterating over the students. The mask is computed
+    once per assignment of `responses`, the array should not be changed in
+    place.
+
     Args:
-        responses (list): List of one type of answers (q_mark, q_you_pre, ...).
+        responses (list or np.array): List of one type of answers (q_mark,
+            q_you_pre, ...) or an array with one row per student.
 
     Attributes:
         responses (np.array): All the responses.
@@ -86,25 +112,65 @@ class ResponseAggregate:
     np.array([1])
     >>> len(x)
     7
+    >>> x.col_sums()
+    array([1, 1, 0, 1, 0])
+    >>> x.valid_counts()
+    array([2, 1, 1, 2, 1])
 
     """
     def __init__(self, responses):
-        self.responses = np.array(responses)
+        self.responses = responses
+
+    @property
+    def responses(self):
+        return self._responses
+
+    @responses.setter
+    def responses(self, responses):
+        responses = np.asarray(responses)
+        if responses.size == 0 and responses.ndim < 2:
+            responses = responses.reshape(0, 0)
+        self._responses = responses
+        self._valid = None
+
+    @property
+    def valid(self):
+        """np.array: Mask of all the answers that were given."""
+        if self._valid is None:
+            self._valid = self._responses != -998
+        return self._valid
+
+    @property
+    def masked(self):
+        """np.ma.MaskedArray: View of the responses masking missing answers."""
+        return np.ma.masked_array(self._responses, mask=~self.valid,
+                                  copy=False)
+
+    def column(self, k):
+        """Return a masked view of all answers at position k."""
+        return self.masked[:, k]
+
+    def col_sums(self):
+        """Return the sum of the given answers for every position."""
+        return np.where(self.valid, self._responses, 0).sum(axis=0)
+
+    def valid_counts(self):
+        """Return the number of given answers for every position."""
+        return self.valid.sum(axis=0)
 
     def __getitem__(self, k):
-        aggregate = []
-        for response in self.responses:
-            if response[k] != -998:
-                aggregate.append(response[k])
-        return np.array(aggregate)
+        return self._responses[:, k][self.valid[:, k]]
+
+    def __iter__(self):
+        for k in range(self._responses.shape[1]):
+            yield self[k]
 
     def __len__(self):
-        count_invalid = (self.responses == -998).sum()
-        return self.responses.size - count_invalid
+        return int(self.valid.sum())
 
     def size(self):
         """Return the total number of students."""
-        return len(self.responses)
+        return len(self._responses)
 
 
 class QuestionnaireResponses:
@@ -124,6 +190,9 @@ class QuestionnaireResponses:
         q_mark (ResponseAggregate): All answers for the q_mark questions.
 
     """
+    _attributes = ('q_mark', 'q_you_pre', 'q_you_post', 'q_expert_pre',
+                   'q_expert_post')
+
     def __init__(self, responses):
         self.q_mark = self._load_responses(responses, 'q_mark')
         self.q_you_pre = self._load_responses(responses, 'q_you_pre')
@@ -131,6 +200,57 @@ class QuestionnaireResponses:
         self.q_expert_pre = self._load_responses(responses, 'q_expert_pre')
         self.q_expert_post = self._load_responses(responses, 'q_expert_post')
 
+    @classmethod
+    def from_answers(cls, q_you_pre, q_you_post, q_expert_pre, q_expert_post,
+                     q_mark, disagreement=False):
+        """Create the responses of many students at once.
+
+        The arguments are the same as for Responses, but with one row per
+        student, so that the comparison with the experts is done for all
+        students in one go.
+
+        """
+        responses = cls([])
+        responses.q_mark = ResponseAggregate(
+            compare_expert(q_mark, Responses.experts_marks, disagreement))
+        responses.q_you_pre = ResponseAggregate(
+            compare_expert(q_you_pre, Responses.experts, disagreement))
+        responses.q_you_post = ResponseAggregate(
+            compare_expert(q_you_post, Responses.experts, disagreement))
+        responses.q_expert_pre = ResponseAggregate(
+            compare_expert(q_expert_pre, Responses.experts, disagreement))
+        responses.q_expert_post = ResponseAggregate(
+            compare_expert(q_expert_post, Responses.experts, disagreement))
+        return responses
+
+    def subset(self, index):
+        """Return the responses of some of the students.
+
+        Args:
+            index (slice or np.array): The students to select, a slice gives
+                a view on the responses without copying them.
+
+        """
+        subset = type(self)([])
+        for attr in self._attributes:
+            setattr(subset, attr, ResponseAggregate(
+                getattr(self, attr).responses[index]))
+        return subset
+
+    def read_only_copy(self):
+        """Return a copy of the responses whose arrays cannot be changed."""
+        copy = type(self)([])
+        for attr in self._attributes:
+            block = getattr(self, attr).responses.copy()
+            block.flags.writeable = False
+            setattr(copy, attr, ResponseAggregate(block))
+        return copy
+
+    def nbytes(self):
+        """Return the number of bytes of all the responses."""
+        return sum(getattr(self, attr).responses.nbytes
+                   for attr in self._attributes)
+
     def _load_responses(self, responses, attr):
         aggregate = []
         for response in responses:
@@ -141,17 +261,192 @@ class QuestionnaireResponses:
         """Return the total number of students."""
         return len(self.q_mark.responses)
 
-    def _append_responses(self, responses, attr):
-        if getattr(self, attr).responses.size == 0:
-            return np.copy(getattr(responses, attr).responses)
-        if getattr(responses, attr).responses.size == 0:
-            return getattr(self, attr).responses
-        return np.append(getattr(self, attr).responses, getattr(responses, attr).responses, axis=0)
+    @classmethod
+    def concatenate(cls, parts):
+        """Join the responses of many QuestionnaireResponses.
+
+        Each type of answers is joined with a single concatenation. If only
+        one of the parts contains responses, its arrays are shared as
+        read-only views instead of being copied.
+
+        Args:
+            parts (list(QuestionnaireResponses)): The responses to join.
+
+        >>> similar = QuestionnaireResponses.concatenate(
+        ...     [course, similar_course_1, similar_course_2])
+        >>> similar.size() == (course.size() + similar_course_1.size()
+        ...                    + similar_course_2.size())
+        True
+
+        """
+        joined = cls([])
+        for attr in cls._attributes:
+            blocks = [getattr(part, attr).responses for part in parts]
+            blocks = [block for block in blocks if block.size > 0] \
+                or blocks[:1]
+            if len(blocks) == 1:
+                block = blocks[0].view()
+                block.flags.writeable = False
+            else:
+                block = np.concatenate(blocks, axis=0)
+            setattr(joined, attr, ResponseAggregate(block))
+        return joined
 
     def append(self, responses):
-        """Append two QuestionnaireResponses to another."""
-        self.q_mark.responses = self._append_responses(responses, 'q_mark')
-        self.q_you_pre.responses = self._append_responses(responses, 'q_you_pre')
-        self.q_you_post.responses = self._append_responses(responses, 'q_you_post')
-        self.q_expert_pre.responses = self._append_responses(responses, 'q_expert_pre')
-        self.q_expert_post.responses = self._append_responses(responses, 'q_expert_post')
+        """Append two QuestionnaireResponses to another.
+
+        This copies all responses on every call, use `concatenate` to join
+        more than two QuestionnaireResponses.
+
+        """
+        joined = self.concatenate([self, responses])
+        for attr in self._attributes:
+            setattr(self, attr, getattr(joined, attr))
+
+
+class ResponseSummary:
+    """Sufficient statistics of a ResponseAggregate.
+
+    The statistics in statistics.py only need the number of students and,
+    for every position, the sum and the sum of squares of the given answers
+    and their number. Summaries can be added and subtracted, so the summary
+    of a group of courses is the sum of the summaries of the courses.
+
+    Args:
+        students (int): The number of students.
+        sums (np.array): The sum of the given answers for every position.
+        squares (np.array): The sum of the squares of the given answers for
+            every position.
+        counts (np.array): The number of given answers for every position.
+
+    >>> x = ResponseAggregate([[0, 1, -998], [1, -998, 0]])
+    >>> summary = ResponseSummary.from_aggregate(x)
+    >>> summary.sums
+    array([1, 1, 0])
+    >>> (summary + summary).counts
+    array([4, 2, 2])
+
+    """
+
+    def __init__(self, students, sums, squares, counts):
+        self.students = int(students)
+        self.sums = np.asarray(sums, dtype=np.int64)
+        self.squares = np.asarray(squares, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def from_aggregate(cls, aggregate, n_questions=None):
+        """Summarize a ResponseAggregate.
+
+        Args:
+            aggregate (ResponseAggregate): The responses.
+            n_questions (int, optional): The number of positions, needed if
+                the aggregate has no students.
+
+        """
+        if aggregate.size() == 0 and n_questions is not None:
+            return cls.empty(n_questions)
+        given = np.where(aggregate.valid, aggregate.responses, 0)
+        return cls(aggregate.size(), given.sum(axis=0),
+                   (given**2).sum(axis=0), aggregate.valid_counts())
+
+    @classmethod
+    def empty(cls, n_questions):
+        """Return the summary of no students."""
+        zeros = np.zeros(n_questions, dtype=np.int64)
+        return cls(0, zeros, zeros, zeros)
+
+    def __add__(self, other):
+        return ResponseSummary(
+            self.students + other.students, self.sums + other.sums,
+            self.squares + other.squares, self.counts + other.counts)
+
+    def __sub__(self, other):
+        return ResponseSummary(
+            self.students - other.students, self.sums - other.sums,
+            self.squares - other.squares, self.counts - other.counts)
+
+    def __eq__(self, other):
+        return (isinstance(other, ResponseSummary)
+                and self.students == other.students
+                and np.array_equal(self.sums, other.sums)
+                and np.array_equal(self.squares, other.squares)
+                and np.array_equal(self.counts, other.counts))
+
+    def size(self):
+        """Return the total number of students."""
+        return self.students
+
+
+class QuestionnaireSummary:
+    """Sufficient statistics of all types of answers of QuestionnaireResponses.
+
+    It can be used in place of QuestionnaireResponses for the statistics and
+    plots of the report, see ResponseSummary.
+
+    Attributes:
+        q_you_pre (ResponseSummary): Summary of the q_you_pre questions.
+        q_you_post (ResponseSummary): Summary of the q_you_post questions.
+        q_expert_pre (ResponseSummary): Summary of the q_expert_pre
+            questions.
+        q_expert_post (ResponseSummary): Summary of the q_expert_post
+            questions.
+        q_mark (ResponseSummary): Summary of the q_mark questions.
+
+    """
+    _attributes = QuestionnaireResponses._attributes
+    _n_questions = {
+        'q_mark': len(Responses.experts_marks),
+        'q_you_pre': len(Responses.experts),
+        'q_you_post': len(Responses.experts),
+        'q_expert_pre': len(Responses.experts),
+        'q_expert_post': len(Responses.experts),
+    }
+
+    def __init__(self, summaries=None):
+        summaries = summaries or {}
+        for attr in self._attributes:
+            setattr(self, attr, summaries.get(attr) or ResponseSummary.empty(
+                self._n_questions[attr]))
+
+    @classmethod
+    def from_responses(cls, responses):
+        """Summarize QuestionnaireResponses."""
+        return cls({
+            attr: ResponseSummary.from_aggregate(
+                getattr(responses, attr), cls._n_questions[attr])
+            for attr in cls._attributes
+        })
+
+    @classmethod
+    def total(cls, summaries):
+        """Return the sum of many QuestionnaireSummary."""
+        total = cls()
+        for summary in summaries:
+            total = total + summary
+        return total
+
+    def items(self):
+        """Return the name and the ResponseSummary of every type of answers."""
+        return [(attr, getattr(self, attr)) for attr in self._attributes]
+
+    def __add__(self, other):
+        return QuestionnaireSummary({
+            attr: getattr(self, attr) + getattr(other, attr)
+            for attr in self._attributes
+        })
+
+    def __sub__(self, other):
+        return QuestionnaireSummary({
+            attr: getattr(self, attr) - getattr(other, attr)
+            for attr in self._attributes
+        })
+
+    def __eq__(self, other):
+        return isinstance(other, QuestionnaireSummary) and all(
+            getattr(self, attr) == getattr(other, attr)
+            for attr in self._attributes)
+
+    def size(self):
+        """Return the total number of students."""
+        return self.q_mark.size()
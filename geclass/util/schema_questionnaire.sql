@@ -1,5 +1,6 @@
 DROP TABLE IF EXISTS student;
 DROP TABLE IF EXISTS student_course;
+DROP TABLE IF EXISTS student_unknown_course;
 DROP TABLE IF EXISTS questionnaire_you;
 DROP TABLE IF EXISTS questionnaire_expert;
 DROP TABLE IF EXISTS questionnaire_mark;
@@ -7,6 +8,10 @@ DROP TABLE IF EXISTS questionnaire_pre;
 DROP TABLE IF EXISTS questionnaire_post;
 DROP TABLE IF EXISTS student_pre;
 DROP TABLE IF EXISTS student_post;
+DROP TABLE IF EXISTS ingested_response;
+DROP TABLE IF EXISTS metadata;
+DROP TABLE IF EXISTS matched_pair;
+DROP TABLE IF EXISTS course_statistics;
 
 PRAGMA encoding='UTF-8';
 
@@ -60,7 +65,8 @@ CREATE TABLE questionnaire_you (
   q27 INTEGER,
   q28 INTEGER,
   q29 INTEGER,
-  q30 INTEGER
+  q30 INTEGER,
+  answers BLOB
 );
 
 CREATE TABLE questionnaire_expert (
@@ -94,7 +100,8 @@ CREATE TABLE questionnaire_expert (
   q27 INTEGER,
   q28 INTEGER,
   q29 INTEGER,
-  q30 INTEGER
+  q30 INTEGER,
+  answers BLOB
 );
 
 CREATE TABLE questionnaire_mark (
@@ -121,7 +128,8 @@ CREATE TABLE questionnaire_mark (
   q20 INTEGER,
   q21 INTEGER,
   q22 INTEGER,
-  q23 INTEGER
+  q23 INTEGER,
+  answers BLOB
 );
 
 CREATE TABLE questionnaire_pre (
@@ -165,3 +173,49 @@ CREATE TABLE student_post (
   FOREIGN KEY (student_id) REFERENCES student (id),
   FOREIGN KEY (questionnaire_post_id) REFERENCES questionnaire_post (id)
 );
+
+CREATE TABLE ingested_response (
+  source_hash TEXT PRIMARY KEY,
+  pre_post INTEGER NOT NULL,
+  student_prepost_id INTEGER NOT NULL
+);
+
+CREATE TABLE metadata (
+  key TEXT PRIMARY KEY,
+  value INTEGER
+);
+
+CREATE TABLE matched_pair (
+  student_course_id INTEGER PRIMARY KEY,
+  course_id INTEGER NOT NULL,
+  student_id INTEGER NOT NULL,
+  questionnaire_pre_id INTEGER NOT NULL,
+  questionnaire_post_id INTEGER NOT NULL,
+  FOREIGN KEY (student_course_id) REFERENCES student_course (id),
+  FOREIGN KEY (student_id) REFERENCES student (id),
+  FOREIGN KEY (questionnaire_pre_id) REFERENCES questionnaire_pre (id),
+  FOREIGN KEY (questionnaire_post_id) REFERENCES questionnaire_post (id)
+);
+
+CREATE TABLE course_statistics (
+  course_id INTEGER NOT NULL,
+  disagreement INTEGER NOT NULL,
+  block TEXT NOT NULL,
+  students INTEGER NOT NULL,
+  sums BLOB NOT NULL,
+  squares BLOB NOT NULL,
+  counts BLOB NOT NULL,
+  PRIMARY KEY (course_id, disagreement, block)
+);
+
+CREATE INDEX student_code ON student (code);
+CREATE INDEX student_course_course_id ON student_course (course_id, student_id);
+CREATE INDEX student_course_student_id ON student_course (student_id);
+CREATE INDEX student_unknown_course_student_id
+  ON student_unknown_course (student_id);
+CREATE INDEX student_pre_matching
+  ON student_pre (student_id, valid_control, valid_time, questionnaire_pre_id);
+CREATE INDEX student_post_matching
+  ON student_post (student_id, valid_control, valid_time, questionnaire_post_id);
+CREATE INDEX matched_pair_course_id ON matched_pair (course_id);
+CREATE INDEX matched_pair_student_id ON matched_pair (student_id);
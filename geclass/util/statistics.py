@@ -1,19 +1,64 @@
-"""Functions to measure statistic values."""
+"""Functions to measure statistic values.
 
-import math
+All functions take a ResponseAggregate or an array of responses with one row
+per student and -998 for answers not given. Arrays can have additional
+leading axes, e.g. to compute the statistics of several courses or of pre and
+post at once, so their shape is (..., students, questions).
+
+They also take a ResponseSummary, which only holds the sums needed for the
+statistics, so the statistics of a group of courses can be computed from the
+sum of their summaries.
+
+"""
+
+import functools
 
 import numpy as np
 import scipy.stats as stats
 
+from geclass.util.responses import ResponseAggregate, ResponseSummary
+
+
+def _responses_and_mask(aggregate):
+    """Return the responses and the mask of the given answers."""
+    if isinstance(aggregate, ResponseAggregate):
+        return aggregate.responses, aggregate.valid
+    responses = np.asarray(aggregate)
+    return responses, responses != -998
+
+
+def _divide(numerator, denominator):
+    """Divide elementwise, giving 0 where the denominator is 0."""
+    numerator, denominator = np.broadcast_arrays(
+            np.asarray(numerator, dtype=float), denominator)
+    result = np.divide(numerator, denominator, out=np.zeros(numerator.shape),
+                       where=denominator != 0)
+    return result if result.ndim > 0 else float(result)
+
+
+@functools.lru_cache(maxsize=None)
+def _chi2_constant(significance):
+    """Return the chi-square quantile for the confidence of a Likert item."""
+    n_likert = 4  # agree or disagree with experts
+    return stats.chi2.ppf(1 - significance / n_likert, 2)
+
+
+def _column_sums(aggregate):
+    """Return the number of students and the sum of the given answers."""
+    if isinstance(aggregate, ResponseSummary):
+        return aggregate.students, aggregate.sums
+    responses, valid = _responses_and_mask(aggregate)
+    return responses.shape[-2], np.where(valid, responses, 0).sum(axis=-2)
+
 
 def aggregate_mean(aggregate):
     """Calculate the mean over all the cols of a ResponseAggregate."""
-    if len(aggregate) == 0:
-        return 0
-    total = 0
-    for col in aggregate:
-        total += sum(col)
-    return total/len(aggregate)
+    if isinstance(aggregate, ResponseSummary):
+        return _divide(aggregate.sums.sum(axis=-1),
+                       aggregate.counts.sum(axis=-1))
+    responses, valid = _responses_and_mask(aggregate)
+    total = np.where(valid, responses, 0).sum(axis=(-2, -1))
+    return _divide(total, valid.sum(axis=(-2, -1)))
 
 
 def aggregate_stderr(aggregate, mean=None):
@@ -21,36 +66,36 @@ def aggregate_stderr(aggregate, mean=None):
     ResponseAggregate."""
     if mean is None:
         mean = aggregate_mean(aggregate)
-    if len(aggregate) == 0:
-        return 0
-    total = 0
-    for col in aggregate:
-        for point in col:
-            total += (point - mean)**2
-    return math.sqrt(1./(len(aggregate) - 1.)*total)/math.sqrt(len(aggregate))
+    if isinstance(aggregate, ResponseSummary):
+        mean = np.asarray(mean, dtype=float)
+        count = aggregate.counts.sum(axis=-1)
+        squares = np.maximum(
+            aggregate.squares.sum(axis=-1)
+            - 2 * mean * aggregate.sums.sum(axis=-1)
+            + mean**2 * count, 0.)
+    else:
+        responses, valid = _responses_and_mask(aggregate)
+        mean = np.asarray(mean, dtype=float)[..., np.newaxis, np.newaxis]
+        squares = np.where(valid, (responses - mean)**2, 0.).sum(
+                axis=(-2, -1))
+        count = valid.sum(axis=(-2, -1))
+    variance = _divide(squares, np.where(count > 1, count - 1, 0))
+    return _divide(np.sqrt(variance), np.sqrt(count))
 
 
 def aggregate_mean_colwise(aggregate, significance=0.05):
     """Calculate the colwise mean of a ResponseAggregate."""
-    mean = []
-    n_likert = 4  # agree or disagree with experts
-    B = stats.chi2.ppf(1 - significance / n_likert, 2)
-    for col in aggregate:
-        mean.append((sum(col) + B / 2.) / (aggregate.size() + B))
-    return np.array(mean)
+    B = _chi2_constant(significance)
+    n_total, n = _column_sums(aggregate)
+    return (n + B / 2.) / (n_total + B)
 
 
 def aggregate_confidence_colwise(aggregate, significance=0.05):
     """Calculate the colwise confidence of a ResponseAggregate."""
-    confidence = []
-    n_likert = 4  # agree or disagree with experts
-    B = stats.chi2.ppf(1 - significance / n_likert, 2)
-    for col in aggregate:
-        n = sum(col)
-        n_total = aggregate.size()
-        confidence.append(np.sqrt(
-            ((B**2) / 4. + B * n * (1. - float(n) / n_total))
-            / (n_total + B)**2
-        ))
-    return np.array(confidence)
-
+    B = _chi2_constant(significance)
+    n_total, n = _column_sums(aggregate)
+    fraction = n / n_total if n_total > 0 else np.zeros(n.shape)
+    return np.sqrt(
+        ((B**2) / 4. + B * n * (1. - fraction))
+        / (n_total + B)**2
+    )
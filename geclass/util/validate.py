@@ -33,6 +33,7 @@ def validate_all(pre_post, course_name):
     )
     """.format(pre_post)
     questionnaire_db.execute(query, (course_id,))
+    questionnaire_db.update_matched_pairs_of_course(course_id)
     questionnaire_db.db.commit()
 
 
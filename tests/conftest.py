@@ -130,6 +130,23 @@ def MonkeyDBDates(monkeypatch):
     return DatesContainer
 
 
+@pytest.fixture
+def MonkeyCourseDates(monkeypatch):
+    import geclass.course_db
+
+    def MockDates(obj):
+        # the identifier 0 matches the dummy course_id of the tests
+        return {0: {
+            "pre": str(int(
+                time.mktime(datetime.date(2001, 1, 5).timetuple()))),
+            "post": str(int(
+                time.mktime(datetime.date(2002, 1, 20).timetuple()))),
+        }}
+
+    monkeypatch.setattr(
+        geclass.course_db.CourseDB, 'get_all_questionnaire_dates', MockDates)
+
+
 @pytest.fixture
 def MonkeyCourseDBCourses(monkeypatch):
     import geclass.course_db
@@ -139,7 +156,17 @@ def MonkeyCourseDBCourses(monkeypatch):
             return None
         return [value]
 
+    def MockIDs(obj):
+        return {value: value for value in range(1, 10)}
+
+    def MockIdentifier(obj, course_id):
+        return course_id if course_id in range(1, 10) else None
+
     monkeypatch.setattr(geclass.course_db.CourseDB, 'get_course_id', MockID)
+    monkeypatch.setattr(
+        geclass.course_db.CourseDB, 'get_course_identifier', MockIdentifier)
+    monkeypatch.setattr(
+        geclass.course_db.CourseDB, 'get_all_course_ids', MockIDs)
 
 
 @pytest.fixture(autouse=True)
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from geclass.util.backfill import find_exports
+from geclass.util.questionnaire_db import QuestionnaireDB
+from test_questionnaire_read import _write_export
+
+
+def test_find_exports(tmp_path):
+    for name in ['data-19_01_01.xlsx', 'data-19_01_01.parquet',
+                 'data-19_01_02.csv', 'old.xls', 'old.parquet',
+                 'other.parquet', 'notes.txt']:
+        (tmp_path / name).touch()
+    assert [os.path.basename(path) for path in find_exports(str(tmp_path))] \
+        == ['data-19_01_01.xlsx', 'data-19_01_02.csv', 'old.xls',
+            'other.parquet']
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_backfill(app, runner, tmp_path, jobs):
+    _write_export(str(tmp_path / 'data-19_01_01.xlsx'), [
+        ('A', 'ABXCE', 1, 1, 4),
+        ('B', 'ABXCE', 1, 1, 3),
+    ])
+    _write_export(str(tmp_path / 'data-19_01_02.xlsx'), [
+        ('B', 'ABXCE', 1, 1, 3),  # already in the first file
+        ('A', 'ABXCE', 2, 1, 5),
+    ])
+    result = runner.invoke(args=[
+        'backfill', '--directory', str(tmp_path), '--jobs', str(jobs)])
+    assert 'Read data-19_01_01.xlsx with 2 rows' in result.output
+    assert 'Dropped 1 duplicate rows' in result.output
+    assert 'Backfilled 2 files' in result.output
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        assert len(questionnaire_db.select_all_entries('student')) == 2
+        assert len(questionnaire_db.select_all_entries('student_pre')) == 2
+        assert questionnaire_db.get_matched_responses(1).size() == 1
+
+    result = runner.invoke(args=[
+        'backfill', '--directory', str(tmp_path), '--jobs', str(jobs)])
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        assert len(questionnaire_db.select_all_entries('student_pre')) == 2
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_backfill_failed_file(app, runner, tmp_path, jobs):
+    (tmp_path / 'data-19_01_01.xlsx').write_text('not a workbook')
+    _write_export(str(tmp_path / 'data-19_01_02.xlsx'), [
+        ('A', 'ABXCE', 1, 1, 4),
+        ('B', 'ABXCE', 1, 1, 3),
+    ])
+    result = runner.invoke(args=[
+        'backfill', '--directory', str(tmp_path), '--jobs', str(jobs)])
+    assert result.exit_code == 1
+    assert 'Failed to read data-19_01_01.xlsx' in result.output
+    assert 'Read data-19_01_02.xlsx with 2 rows' in result.output
+    assert 'Failed to read 1 files: data-19_01_01.xlsx' in result.output
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        assert len(questionnaire_db.select_all_entries('student_pre')) == 2
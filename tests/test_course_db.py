@@ -172,6 +172,13 @@ def test_get_course_id(app):
             assert course_id[0] == identifiers[key]
 
 
+def test_get_all_course_ids(app):
+    with app.app_context():
+        identifiers = {'abxce': 1, 'tryui': 2, 'oiuyt': 3, 'ertyu': 4}
+        course_db = CourseDB()
+        assert course_db.get_all_course_ids() == identifiers
+
+
 def test_get_similar_course(app):
     with app.app_context():
         similar = {1: [4], 2: [None], 3: [None], 4: [1]}
@@ -182,6 +189,14 @@ def test_get_similar_course(app):
                 assert val[0] == similar[key][indx]
 
 
+def test_get_cohorts(app):
+    with app.app_context():
+        course_db = CourseDB()
+        cohorts = course_db.get_cohorts([4, 1, 2, 5])
+        assert cohorts == {1: (1, 4), 2: (2,), 4: (1, 4)}
+        assert course_db.get_cohorts([]) == {}
+
+
 def test_course_report_info(app):
     with app.app_context():
         results = {
@@ -196,3 +211,13 @@ def test_course_report_info(app):
             assert info[0] == results[key][0]
             assert info[1] == results[key][1]
 
+
+def test_course_report_infos(app):
+    with app.app_context():
+        course_db = CourseDB()
+        infos = course_db.get_course_report_infos([3, 1, 5])
+        assert infos == {
+            1: ('Bachelor Physiker', 32),
+            3: ('Nebenfach Grundpraktikum', 25),
+        }
+        assert course_db.get_course_report_infos([]) == {}
@@ -1,6 +1,9 @@
+import sqlite3
+
 import pytest
 
 from geclass.course_db import CourseDB
+from geclass.util.questionnaire_db import QuestionnaireDB
 
 
 def test_only_registered(client, auth):
@@ -19,6 +22,53 @@ def test_only_registered(client, auth):
     assert b'Nebenfach Grundpraktikum' not in response.data
 
 
+def test_overview_counts(client, auth, monkeypatch):
+    counted = []
+
+    def get_course_counts(self, course_ids):
+        counted.append(list(course_ids))
+        return {course_id: (course_id, 2 * course_id, 0)
+                for course_id in course_ids}
+
+    monkeypatch.setattr(QuestionnaireDB, 'get_course_counts',
+                        get_course_counts)
+    auth.login()
+    response = client.get('/')
+    assert b'Gematched' in response.data
+    # the counts of all courses are requested at once
+    assert len(counted) == 1
+    assert sorted(counted[0]) == [1, 2]
+
+
+def test_overview_without_counts(client, auth, monkeypatch):
+    def get_course_counts(self, course_ids):
+        raise sqlite3.OperationalError('no such table: matched_pair')
+
+    monkeypatch.setattr(QuestionnaireDB, 'get_course_counts',
+                        get_course_counts)
+    auth.login()
+    response = client.get('/')
+    assert response.status_code == 200
+    assert b'<td>-</td>' in response.data
+
+
+def test_report_link(client, app, auth, tmp_path):
+    app.instance_path = str(tmp_path)
+    auth.login()
+    # the directory of a course without report
+    (tmp_path / 'abxce').mkdir()
+    response = client.get('/')
+    assert b'/report/abxce.pdf' not in response.data
+    assert client.get('/report/abxce.pdf').status_code == 404
+
+    (tmp_path / 'abxce' / 'report.pdf').write_bytes(b'%PDF')
+    response = client.get('/')
+    assert b'/report/abxce.pdf' in response.data
+    response = client.get('/report/abxce.pdf')
+    assert response.status_code == 200
+    assert response.data == b'%PDF'
+
+
 def test_add_new_course(client, app, auth, MonkeyEmail):
     # non logged in user redirected to log in
     response = client.get('/add_course')
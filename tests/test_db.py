@@ -27,3 +27,97 @@ def test_init_db_command(runner, monkeypatch):
     result = runner.invoke(args=['init-db'])
     assert 'Initialized' in result.output
     assert init['called']
+
+
+def _index_names(db):
+    rows = db.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' "
+        "AND name NOT LIKE 'sqlite_%'", ()).fetchall()
+    return sorted(row[0] for row in rows)
+
+
+def test_migrate_db_command(app, runner):
+    with app.app_context():
+        db = DBConnection()
+        indexes = _index_names(db)
+        assert 'course_identifier' in indexes
+        version = db.execute('PRAGMA user_version', ()).fetchone()[0]
+        assert version >= 1
+        n_courses = len(db.select_all_entries('course'))
+        # simulate a database from before the migrations
+        for name in indexes:
+            db.execute('DROP INDEX {}'.format(name), ())
+        db.execute('PRAGMA user_version = 0', ())
+        db().commit()
+
+    result = runner.invoke(args=['migrate-db'])
+    assert 'Applied {:d} migrations'.format(version) in result.output
+
+    with app.app_context():
+        db = DBConnection()
+        assert _index_names(db) == indexes
+        assert db.execute('PRAGMA user_version', ()).fetchone()[0] == version
+        assert len(db.select_all_entries('course')) == n_courses
+
+    result = runner.invoke(args=['migrate-db'])
+    assert 'Applied 0 migrations' in result.output
+
+
+def test_course_queries_use_indexes(app):
+    with app.app_context():
+        db = DBConnection()
+        queries = [
+            ('SELECT id FROM course WHERE identifier = ?', ('abxce',)),
+            ('SELECT id FROM course WHERE experience_id = ? '
+             'AND program_id = ?', (1, 1)),
+            ('SELECT id FROM course WHERE start_date_post <= ?', ('1',)),
+            ('SELECT * FROM course WHERE user_id = ?', (1,)),
+        ]
+        for sql, parameters in queries:
+            plan = db.execute('EXPLAIN QUERY PLAN ' + sql, parameters)
+            details = [row['detail'] for row in plan.fetchall()]
+            assert not any(d.startswith('SCAN course') for d in details), sql
+
+
+def test_nested_transaction(app):
+    with app.app_context():
+        db = DBConnection()
+        db.execute("INSERT INTO user (email, password) VALUES ('outer', 'a')",
+                   ())
+        assert db().in_transaction
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                db.execute("INSERT INTO user (email, password) "
+                           "VALUES ('inner', 'b')", ())
+                raise RuntimeError()
+        # the outer work is neither committed nor rolled back
+        assert db().in_transaction
+        with db.transaction():
+            db.execute("INSERT INTO user (email, password) "
+                       "VALUES ('inner', 'c')", ())
+        db().rollback()
+        emails = [row[0] for row in db.execute('SELECT email FROM user', ())]
+        assert 'outer' not in emails
+        assert 'inner' not in emails
+
+
+def test_execute_in_chunks(app, monkeypatch):
+    monkeypatch.setattr('geclass.db.MAX_VALUES_PER_QUERY', 2)
+    executed = []
+    execute = DBConnection.execute
+
+    def CountingExecute(obj, sql, parameters=None):
+        executed.append(parameters)
+        return execute(obj, sql, parameters)
+
+    monkeypatch.setattr(DBConnection, 'execute', CountingExecute)
+    with app.app_context():
+        db = DBConnection()
+        rows = db.execute_in_chunks(
+            'SELECT id FROM user WHERE email != ? AND id IN ({}) ORDER BY id',
+            [3, 1, 2, 4, 5], ('admin',))
+        assert [row[0] for row in rows] == [3, 2]
+        assert executed == [['admin', 3, 1], ['admin', 2, 4], ['admin', 5]]
+        assert [row[0] for row in db.execute_in_chunks(
+            'WITH ids(id) AS (VALUES {}) SELECT id FROM ids', [7, 8, 9],
+            placeholder='(?)')] == [7, 8, 9]
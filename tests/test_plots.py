@@ -0,0 +1,138 @@
+import concurrent.futures
+import threading
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from geclass.util import plots
+from geclass.util.report_fast import render_report_fast
+from geclass.util.responses import QuestionnaireResponses, QuestionnaireSummary
+
+
+@pytest.fixture
+def no_tex():
+    # render without a LaTeX installation
+    with matplotlib.rc_context({'text.usetex': False,
+                                'savefig.format': 'png'}):
+        yield
+
+
+def _random_responses(n, seed):
+    rng = np.random.default_rng(seed)
+    return QuestionnaireResponses.from_answers(
+        *[rng.integers(1, 6, size=(n, 30)) for _ in range(4)],
+        rng.integers(1, 6, size=(n, 23)))
+
+
+def test_generate_plots(tmp_path):
+    usetex = matplotlib.rcParams['text.usetex']
+    figures = plt.get_fignums()
+    plots.generate_plots(
+        _random_responses(10, 0), _random_responses(50, 1), str(tmp_path),
+        rc={'text.usetex': False, 'savefig.format': 'png'})
+    for name in ('overall_score', 'overview_you', 'overview_expert',
+                 'overview_you_expert', 'overview_mark'):
+        assert (tmp_path / (name + '.png')).exists()
+    # pyplot and the global rc parameters are not touched
+    assert plt.get_fignums() == figures
+    assert matplotlib.rcParams['text.usetex'] == usetex
+
+
+def test_rc_context():
+    rc_1 = {'lines.linewidth': 3.}
+    rc_2 = {'lines.linewidth': 4.}
+    linewidth = matplotlib.rcParams['lines.linewidth']
+    entered = threading.Event()
+    release = threading.Event()
+    seen = []
+
+    def same():
+        with plots.rc_context(rc_1):
+            seen.append(('same', matplotlib.rcParams['lines.linewidth']))
+
+    def other():
+        entered.set()
+        with plots.rc_context(rc_2):
+            seen.append(('other', matplotlib.rcParams['lines.linewidth']))
+
+    with plots.rc_context(rc_1):
+        # threads with the same parameters share them
+        thread = threading.Thread(target=same)
+        thread.start()
+        thread.join(5)
+        assert seen == [('same', 3.)]
+        # threads with other parameters wait
+        thread = threading.Thread(target=other)
+        thread.start()
+        entered.wait(5)
+        thread.join(0.2)
+        assert thread.is_alive()
+        assert matplotlib.rcParams['lines.linewidth'] == 3.
+    thread.join(5)
+    assert seen == [('same', 3.), ('other', 4.)]
+    assert matplotlib.rcParams['lines.linewidth'] == linewidth
+
+
+def test_rc_context_nested():
+    rc_1 = {'lines.linewidth': 3.}
+    rc_2 = {'lines.linewidth': 4.}
+    linewidth = matplotlib.rcParams['lines.linewidth']
+    with plots.rc_context(rc_1):
+        with plots.rc_context(rc_1):
+            assert matplotlib.rcParams['lines.linewidth'] == 3.
+        assert matplotlib.rcParams['lines.linewidth'] == 3.
+        # waiting for the outer context would never end
+        with pytest.raises(RuntimeError):
+            with plots.rc_context(rc_2):
+                pass
+        assert matplotlib.rcParams['lines.linewidth'] == 3.
+    assert matplotlib.rcParams['lines.linewidth'] == linewidth
+    # the failed context is not counted
+    with plots.rc_context(rc_2):
+        assert matplotlib.rcParams['lines.linewidth'] == 4.
+    assert matplotlib.rcParams['lines.linewidth'] == linewidth
+
+
+def test_render_reports_in_threads(tmp_path):
+    course = _random_responses(10, 0)
+    similar = QuestionnaireSummary.from_responses(_random_responses(50, 1))
+    values = {
+        'course_name': 'Kurs $1', 'course_pre': 12, 'course_post': 11,
+        'course_matched': 10, 'course_reported': 20, 'course_ratio': 0.5,
+        'similar_matched': 50,
+    }
+    directories = [tmp_path / str(i) for i in range(4)]
+    for directory in directories:
+        directory.mkdir()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        failures = list(pool.map(
+            lambda directory: render_report_fast(
+                str(directory), course, similar, values),
+            directories))
+    assert failures == [None] * 4
+    for directory in directories:
+        report = (directory / 'report.pdf').read_bytes()
+        assert report.count(b'/Type /Page') - report.count(b'/Type /Pages') \
+            == 6
+
+
+@pytest.mark.parametrize('plot_type', list(plots.OverviewPlotTypes))
+def test_question_overview_plot_batched(tmp_path, no_tex, monkeypatch,
+                                        plot_type):
+    calls = []
+    errorbar = matplotlib.axes.Axes.errorbar
+
+    def count_errorbar(self, x, *args, **kwargs):
+        calls.append(len(x))
+        return errorbar(self, x, *args, **kwargs)
+
+    monkeypatch.setattr(matplotlib.axes.Axes, 'errorbar', count_errorbar)
+    plots.question_overview_plot(
+        _random_responses(10, 0), _random_responses(50, 1), plot_type,
+        str(tmp_path / 'plot'))
+    # one call per panel and series, every question is plotted once
+    assert len(calls) == 4
+    n_questions = 23 if plot_type == plots.OverviewPlotTypes.MARK else 30
+    assert sum(calls) == 2 * n_questions
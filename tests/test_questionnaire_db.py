@@ -3,11 +3,15 @@ import sqlite3
 
 import pytest
 from flask import g
+import numpy as np
 import pandas as pd
 import datetime
 import time
 
-from geclass.util.questionnaire_db import QuestionnaireDB
+from geclass.util.questionnaire_db import (
+    IngestCache, QuestionnaireDB, _ResponsesCache, _SQL_INSERT_MATCHED_PAIRS,
+    _sql_matched_answers, pack_answers)
+from geclass.util.responses import QuestionnaireResponses, QuestionnaireSummary
 
 
 def test_get_close_db(app):
@@ -96,3 +100,571 @@ def test_insert_data(app, MonkeyCourseDBCourses):
         assert s_post_list[0] == [1, 1, 1, start, end, 0, 1]
         assert s_post_list[1] == [2, 2, 2, start, end, 1, 1]
 
+
+def test_insert_data_rolls_back(app, MonkeyCourseDBCourses):
+    data = {
+        'personal_code': ['a', 'b'],
+        'course_id': [1, 1],
+        'pre_post': [1, 2],
+        'valid_control': [True, True],
+        'valid_time': [True, True],
+        'start': [datetime.datetime.today()] * 2,
+        'end': [datetime.datetime.today()] * 2,
+    }
+    for i in range(1, 31):
+        data['q{:d}_1'.format(i)] = [1, 1]
+        data['q{:d}_2'.format(i)] = [1, 1]
+    # the post_* answers are missing, so the insert fails halfway through
+    df = pd.DataFrame(data=data)
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        with pytest.raises(KeyError):
+            questionnaire_db.insert_data(df)
+        assert questionnaire_db.select_all_entries('student') == []
+        assert questionnaire_db.select_all_entries('questionnaire_you') == []
+
+
+def _responses_frame(rows):
+    """Create prepared data from (code, pre_post, valid, you, expert, mark)."""
+    data = {
+        'personal_code': [row[0] for row in rows],
+        'course_id': [1 for _ in rows],
+        'pre_post': [row[1] for row in rows],
+        'valid_control': [row[2] for row in rows],
+        'valid_time': [True for _ in rows],
+        'start': [datetime.datetime(2019, 1, 1) for _ in rows],
+        'end': [datetime.datetime(2019, 1, 2) for _ in rows],
+    }
+    for i in range(1, 31):
+        data['q{:d}_1'.format(i)] = [row[3] for row in rows]
+        data['q{:d}_2'.format(i)] = [row[4] for row in rows]
+    for i in range(1, 24):
+        data['post_{:d}'.format(i)] = [row[5] for row in rows]
+    return pd.DataFrame(data=data)
+
+
+def test_get_matched_responses(app, MonkeyCourseDBCourses):
+    df = _responses_frame([
+        ('a', 1, True, 5, 1, None),
+        ('b', 1, True, 5, 5, None),  # no post
+        ('c', 1, True, 5, 5, None),
+        ('c', 2, False, 5, 5, 5),  # invalid post
+        ('d', 1, True, 5, 5, None),
+        ('d', 1, True, 4, 4, None),  # two pre
+        ('d', 2, True, 5, 5, 5),
+        ('a', 2, True, 1, None, 4),
+    ])
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(df)
+        matched = questionnaire_db.get_matched_responses(1)
+        assert matched.size() == 1
+        experts = np.array([1, 1, -1, -1, 1, 1, -1, 1, 1, 1, 1, -1, 1, 1, 1,
+                            -1, -1, 1, 1, 1, -1, 1, 1, 1, -1, 1, -1, -1, -1,
+                            1])
+        np.testing.assert_array_equal(
+            matched.q_you_pre.responses[0], (experts == 1).astype(int))
+        np.testing.assert_array_equal(
+            matched.q_you_post.responses[0], (experts == -1).astype(int))
+        np.testing.assert_array_equal(
+            matched.q_expert_pre.responses[0], (experts == -1).astype(int))
+        np.testing.assert_array_equal(
+            matched.q_expert_post.responses[0], np.full(30, -998))
+        assert (matched.q_mark.responses[0] != -998).all()
+        assert questionnaire_db.get_matched_responses(2).size() == 0
+
+
+def test_get_matched_responses_for_courses(app, MonkeyCourseDBCourses):
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, 5, 5),
+        ('b', 1, True, 1, 1, None),
+        ('b', 2, True, 1, 1, 1),
+        ('c', 1, True, 3, 3, None),
+        ('c', 2, True, 3, 3, 3),
+    ])
+    df['course_id'] = [1, 1, 2, 2, 1, 1]
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(df)
+        matched = questionnaire_db.get_matched_responses_for_courses([2, 1, 3])
+        assert list(matched) == [2, 1, 3]
+        assert matched[1].size() == 2
+        assert matched[2].size() == 1
+        assert matched[3].size() == 0
+        single = questionnaire_db.get_matched_responses(1)
+        np.testing.assert_array_equal(
+            matched[1].q_you_pre.responses, single.q_you_pre.responses)
+        stacked, course_index = \
+            questionnaire_db.get_matched_responses_for_courses(
+                [1, 2], stacked=True)
+        np.testing.assert_array_equal(course_index, [1, 1, 2])
+        np.testing.assert_array_equal(
+            stacked.q_mark.responses[2], matched[2].q_mark.responses[0])
+
+
+def test_get_course_counts(app, MonkeyCourseDBCourses):
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, 5, 5),
+        ('b', 1, True, 1, 1, None),
+        ('b', 2, True, 1, 1, 1),
+        ('c', 1, True, 3, 3, None),
+        ('d', 2, True, 3, 3, 3),
+    ])
+    df['course_id'] = [1, 1, 2, 2, 1, 1]
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(df)
+        counts = questionnaire_db.get_course_counts([2, 1, 3, 1])
+        assert list(counts) == [2, 1, 3]
+        assert counts[1] == (2, 2, 1)
+        assert (counts[1].pre, counts[1].post, counts[1].matched) == (2, 2, 1)
+        assert counts[2] == (1, 1, 1)
+        assert counts[3] == (0, 0, 0)
+        assert questionnaire_db.get_course_numbers(1) == (2, 2)
+        assert questionnaire_db.get_course_counts([]) == {}
+        pairs = questionnaire_db.get_matched_pair_ids([1, 3])
+        assert len(pairs[1]) == 1
+        assert pairs[3] == []
+
+
+def _drop_packed_answers(db):
+    # undo migration 003, so the migrations can be applied again
+    for table in ['questionnaire_you', 'questionnaire_expert',
+                  'questionnaire_mark']:
+        db.execute('ALTER TABLE {} DROP COLUMN answers'.format(table), ())
+
+
+def test_migrate_questionnaire_db_command(app, runner, MonkeyCourseDBCourses):
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(_responses_frame([
+            ('a', 1, True, 5, 5, None),
+            ('a', 2, True, 5, 5, 5),
+        ]))
+        indexes = sorted(row[0] for row in questionnaire_db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' "
+            "AND name NOT LIKE 'sqlite_%'", ()).fetchall())
+        assert 'student_pre_matching' in indexes
+        version = questionnaire_db.execute(
+            'PRAGMA user_version', ()).fetchone()[0]
+        for name in indexes:
+            questionnaire_db.execute('DROP INDEX {}'.format(name), ())
+        _drop_packed_answers(questionnaire_db)
+        questionnaire_db.execute('PRAGMA user_version = 0', ())
+        questionnaire_db().commit()
+
+    result = runner.invoke(args=['migrate-questionnaire-db'])
+    assert 'Applied {:d} migrations'.format(version) in result.output
+
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        migrated = sorted(row[0] for row in questionnaire_db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' "
+            "AND name NOT LIKE 'sqlite_%'", ()).fetchall())
+        assert migrated == indexes
+        assert questionnaire_db.get_matched_responses(1).size() == 1
+
+
+def test_matched_responses_query_plan(app):
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        plan = questionnaire_db.execute(
+            'EXPLAIN QUERY PLAN ' + _sql_matched_answers(2), (1, 2))
+        details = [row['detail'] for row in plan.fetchall()]
+        assert any(
+            d.startswith('SEARCH matched_pair USING INDEX '
+                         'matched_pair_course_id')
+            for d in details
+        ), details
+        assert not any(d.startswith('SCAN') for d in details), details
+
+
+def test_matching_query_plan(app):
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        plan = questionnaire_db.execute(
+            'EXPLAIN QUERY PLAN ' + _SQL_INSERT_MATCHED_PAIRS.format(
+                condition='student_course.student_id IN (?, ?)'), (1, 2))
+        details = [row['detail'] for row in plan.fetchall()]
+        for table in ('student_course', 'student_pre', 'student_post'):
+            assert any(
+                d.startswith('SEARCH {} USING'.format(table))
+                for d in details
+            ), details
+        assert not any(d.startswith('SCAN') for d in details), details
+
+
+def test_matched_pairs(app, runner, MonkeyCourseDBCourses, monkeypatch):
+    def pairs(db):
+        return [tuple(row) for row in db.execute(
+            'SELECT * FROM matched_pair ORDER BY student_course_id',
+            ()).fetchall()]
+
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(_responses_frame([
+            ('a', 1, True, 5, 5, None),
+            ('b', 1, True, 5, 5, None),
+            ('c', 2, True, 5, 5, 5),
+        ]))
+        assert pairs(questionnaire_db) == []
+        later = _responses_frame([
+            ('a', 2, True, 4, 4, 4),
+            ('b', 2, True, 4, 4, 4),
+            ('b', 2, True, 3, 3, 3),  # two valid post questionnaires
+        ])
+        later['valid_time'] = [True, True, False]
+        questionnaire_db.insert_data(later)
+        # student id, questionnaire ids of the pre (1, 2) and post (1 - 4)
+        assert pairs(questionnaire_db) == [(1, 1, 1, 1, 2), (2, 1, 2, 2, 3)]
+
+        questionnaire_db.execute(
+            'UPDATE student_post SET valid_time = 0 WHERE id = 1', ())
+        questionnaire_db().commit()
+
+    monkeypatch.setattr(
+        'geclass.course_db.CourseDB.get_course_id', lambda obj, name: [1])
+    result = runner.invoke(args=['validate_time', 'post', 'abxce'])
+    assert result.exception is None
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        # the second valid post questionnaire of b breaks its pair
+        assert pairs(questionnaire_db) == [(1, 1, 1, 1, 2)]
+        assert questionnaire_db.get_matched_responses(1).size() == 1
+
+
+def _count(db, table):
+    return db.execute('SELECT COUNT(*) FROM {}'.format(table), ()).fetchone()[0]
+
+
+def test_insert_data_idempotent(app, MonkeyCourseDBCourses):
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, 5, 5),
+        ('a', 2, True, 5, 5, 5),  # duplicated in the same file
+        ('b', 1, True, 4, 4, None),
+    ])
+    df.loc[3, 'course_id'] = 0
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(df)
+        assert _count(questionnaire_db, 'student_pre') == 2
+        assert _count(questionnaire_db, 'student_post') == 1
+        assert questionnaire_db.get_metadata('ingest_watermark') == \
+            int(time.mktime(datetime.datetime(2019, 1, 2).timetuple()))
+
+        questionnaire_db.insert_data(df)
+        counts = {'student': 2, 'student_pre': 2, 'student_post': 1,
+                  'questionnaire_you': 3, 'student_unknown_course': 1}
+        for table, count in counts.items():
+            assert _count(questionnaire_db, table) == count
+        assert questionnaire_db.get_matched_responses(1).size() == 1
+
+        later = _responses_frame([
+            ('a', 2, True, 5, 5, 5),
+            ('c', 1, True, 5, 5, None),
+        ])
+        later['end'] = datetime.datetime(2019, 1, 3)
+        later.loc[0, 'end'] = datetime.datetime(2019, 1, 2)
+        questionnaire_db.insert_data(later)
+        assert _count(questionnaire_db, 'student_pre') == 3
+        assert _count(questionnaire_db, 'student_post') == 1
+        assert questionnaire_db.get_metadata('ingest_watermark') == \
+            int(time.mktime(datetime.datetime(2019, 1, 3).timetuple()))
+
+
+def test_migration_hashes_existing_responses(app, runner,
+                                             MonkeyCourseDBCourses):
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, None, 5),
+        ('b', 1, True, 4, 4, None),
+        ('c', 2, True, 5, -999, -998),  # missing codes of QUAMP
+        ('d', 1, True, 3, 3, None),  # no course code
+    ])
+    df['course_id'] = df['course_id'].astype(object)
+    df.loc[2, 'course_id'] = 0
+    df.loc[4, 'course_id'] = np.nan
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(df)
+        hashes = questionnaire_db.execute(
+            'SELECT * FROM ingested_response ORDER BY source_hash',
+            ()).fetchall()
+        questionnaire_db.execute('DELETE FROM ingested_response', ())
+        questionnaire_db.execute('DELETE FROM metadata', ())
+        _drop_packed_answers(questionnaire_db)
+        questionnaire_db.execute('PRAGMA user_version = 1', ())
+        questionnaire_db().commit()
+
+    result = runner.invoke(args=['migrate-questionnaire-db'])
+    assert 'Applied' in result.output
+
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        migrated = questionnaire_db.execute(
+            'SELECT * FROM ingested_response ORDER BY source_hash',
+            ()).fetchall()
+        assert [tuple(row) for row in migrated] == \
+            [tuple(row) for row in hashes]
+        questionnaire_db.insert_data(df)
+        assert _count(questionnaire_db, 'student_pre') == 3
+        assert _count(questionnaire_db, 'student_post') == 2
+
+
+def test_insert_data_with_cache(app, MonkeyCourseDBCourses, monkeypatch):
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(_responses_frame([
+            ('a', 1, True, 5, 5, None),
+        ]))
+        cache = IngestCache()
+        queries = []
+        execute = QuestionnaireDB.execute
+
+        def CountingExecute(obj, sql, values):
+            queries.append(sql)
+            return execute(obj, sql, values)
+
+        monkeypatch.setattr(QuestionnaireDB, 'execute', CountingExecute)
+        questionnaire_db.insert_data(_responses_frame([
+            ('a', 2, True, 5, 5, 5),
+            ('b', 1, True, 4, 4, None),
+        ]), cache)
+        assert cache.students == {(1, 'a'): 1, (1, 'b'): 2}
+        loads = len([sql for sql in queries if 'student.code' in sql])
+        questionnaire_db.insert_data(_responses_frame([
+            ('b', 2, True, 4, 4, 4),
+        ]), cache)
+        assert len([sql for sql in queries if 'student.code' in sql]) == loads
+        assert _count(questionnaire_db, 'student') == 2
+        assert questionnaire_db.get_matched_responses(1).size() == 2
+
+
+def test_insert_data_with_cache_ambiguous_code(app, MonkeyCourseDBCourses):
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        # two students of course 1 used the same code
+        with questionnaire_db.transaction():
+            questionnaire_db.add_many(
+                'student', ('id', 'code'), [(1, 'a'), (2, 'a')])
+            questionnaire_db.add_many(
+                'student_course', ('student_id', 'course_id'),
+                [(1, 1), (2, 1)])
+        cache = IngestCache()
+        questionnaire_db.insert_data(_responses_frame([
+            ('a', 1, True, 5, 5, None),
+        ]), cache)
+        assert cache.students == {(1, 'a'): None}
+        questionnaire_db.insert_data(_responses_frame([
+            ('a', 1, True, 4, 4, None),
+        ]), cache)
+        assert cache.students == {(1, 'a'): None}
+        # like without the cache, every response gets a new student
+        assert _count(questionnaire_db, 'student') == 4
+        questionnaire_db.insert_data(_responses_frame([
+            ('a', 1, True, 3, 3, None),
+        ]))
+        assert _count(questionnaire_db, 'student') == 5
+
+
+def test_packed_answers(app, runner, MonkeyCourseDBCourses):
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 4, None, 2),
+    ])
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(df)
+        you = questionnaire_db.select_all_entries('questionnaire_you')
+        assert np.frombuffer(you[1]['answers'], dtype=np.int8).tolist() \
+            == [4] * 30
+        expert = questionnaire_db.select_all_entries('questionnaire_expert')
+        assert expert[1]['answers'] == pack_answers(*[None] * 30)
+        matched = questionnaire_db.get_matched_responses(1)
+
+    result = runner.invoke(args=['pack-questionnaire-db'])
+    assert 'Packed' in result.output
+
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        columns = questionnaire_db.execute(
+            'PRAGMA table_info(questionnaire_mark)', ()).fetchall()
+        assert [column['name'] for column in columns] == ['id', 'answers']
+        packed = questionnaire_db.get_matched_responses(1)
+        for attribute in ['q_you_pre', 'q_you_post', 'q_expert_pre',
+                          'q_expert_post', 'q_mark']:
+            assert np.array_equal(getattr(packed, attribute).responses,
+                                  getattr(matched, attribute).responses)
+        questionnaire_db.insert_data(_responses_frame([
+            ('b', 1, True, 3, 3, None),
+            ('b', 2, True, 3, 3, 3),
+        ]))
+        assert questionnaire_db.select_one(
+            'questionnaire_you', 'id', 4)['answers'] == pack_answers(*[3] * 30)
+        assert questionnaire_db.get_matched_responses(1).size() == 2
+
+
+def test_packed_missing_codes(app, runner, MonkeyCourseDBCourses):
+    # QUAMP marks answers that were not given with -997, -998 and -999
+    df = _responses_frame([
+        ('a', 1, True, -998, -999, None),
+        ('a', 2, True, 4, -997, -998),
+    ])
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(df)
+        for table in ['questionnaire_you', 'questionnaire_expert',
+                      'questionnaire_mark']:
+            for row in questionnaire_db.select_all_entries(table):
+                answers = np.frombuffer(row['answers'], dtype=np.int8)
+                assert set(answers.tolist()) <= {-1, 4}
+        matched = questionnaire_db.get_matched_responses(1)
+        assert (matched.q_you_pre.responses == -998).all()
+        assert (matched.q_mark.responses == -998).all()
+        packed = {
+            table: questionnaire_db.select_all_entries(table)
+            for table in ['questionnaire_you', 'questionnaire_expert',
+                          'questionnaire_mark']
+        }
+        _drop_packed_answers(questionnaire_db)
+        questionnaire_db.execute('PRAGMA user_version = 2', ())
+        questionnaire_db().commit()
+
+    result = runner.invoke(args=['migrate-questionnaire-db'])
+    assert 'Applied' in result.output
+
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        for table, rows in packed.items():
+            migrated = questionnaire_db.select_all_entries(table)
+            assert [row['answers'] for row in migrated] == \
+                [row['answers'] for row in rows]
+
+
+def test_course_statistics(app, runner, MonkeyCourseDBCourses):
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, 4, 5),
+        ('b', 1, True, 1, 2, None),
+        ('b', 2, True, 3, 1, 1),
+    ])
+    df['course_id'] = [1, 1, 2, 2]
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(df)
+        for disagreement in (False, True):
+            summaries = questionnaire_db.get_course_statistics(
+                [1, 2, 3], disagreement)
+            for course_id in (1, 2):
+                assert summaries[course_id] == \
+                    QuestionnaireSummary.from_responses(
+                        questionnaire_db.get_matched_responses(
+                            course_id, disagreement))
+            assert summaries[3].size() == 0
+
+        questionnaire_db.execute(
+            'UPDATE student_pre SET valid_time = 0 WHERE student_id = 2', ())
+        questionnaire_db.update_matched_pairs_of_course(2)
+        questionnaire_db().commit()
+        assert questionnaire_db.get_course_statistics([2])[2].size() == 0
+
+        questionnaire_db.execute('DELETE FROM course_statistics', ())
+        questionnaire_db.execute('PRAGMA user_version = 4', ())
+        questionnaire_db().commit()
+
+    result = runner.invoke(args=['migrate-questionnaire-db'])
+    assert 'Applied 1 migrations' in result.output
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        assert questionnaire_db.get_course_statistics([1])[1].size() == 1
+        assert questionnaire_db.get_metadata('course_statistics_stale') is None
+
+
+def test_pack_refreshes_course_statistics(app, runner,
+                                          MonkeyCourseDBCourses):
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, 5, 5),
+        ('b', 1, True, 4, 3, None),
+        ('b', 2, True, 3, 1, 1),
+    ])
+    df['course_id'] = [1, 1, 2, 2]
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(df)
+        # a database from before migration 005
+        questionnaire_db.execute('DROP TABLE course_statistics', ())
+        questionnaire_db.execute('PRAGMA user_version = 4', ())
+        questionnaire_db().commit()
+
+    result = runner.invoke(args=['pack-questionnaire-db'])
+    assert 'Packed' in result.output
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        assert questionnaire_db.get_metadata('course_statistics_stale') is None
+        summaries = questionnaire_db.get_course_statistics([1, 2])
+        for course_id in (1, 2):
+            assert summaries[course_id].size() == 1
+            assert summaries[course_id] == \
+                QuestionnaireSummary.from_responses(
+                    questionnaire_db.get_matched_responses(course_id))
+
+
+def test_matched_responses_cache(app, MonkeyCourseDBCourses, monkeypatch):
+    queries = []
+    execute = QuestionnaireDB.execute
+
+    def CountingExecute(obj, sql, values):
+        if 'matched_pair.course_id IN' in sql:
+            queries.append(sql)
+        return execute(obj, sql, values)
+
+    monkeypatch.setattr(QuestionnaireDB, 'execute', CountingExecute)
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(_responses_frame([
+            ('a', 1, True, 5, 5, None),
+            ('a', 2, True, 5, 5, 5),
+        ]))
+        queries.clear()
+        first = questionnaire_db.get_matched_responses(1)
+        assert len(queries) == 1
+        assert not first.q_you_pre.responses.flags.writeable
+        with pytest.raises(ValueError):
+            first.q_you_pre.responses[0, 0] = 0
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        second = questionnaire_db.get_matched_responses_for_courses([1, 2])
+        assert len(queries) == 2  # only course 2 was not cached
+        assert second[1] is not first
+        assert np.shares_memory(second[1].q_mark.responses,
+                                first.q_mark.responses)
+        version = questionnaire_db.data_version()
+        questionnaire_db.insert_data(_responses_frame([
+            ('b', 1, True, 5, 5, None),
+            ('b', 2, True, 5, 5, 5),
+        ]))
+        assert questionnaire_db.data_version() > version
+        assert questionnaire_db.get_matched_responses(1).size() == 2
+
+
+def test_responses_cache_eviction():
+    def responses(n_students):
+        return QuestionnaireResponses.from_answers(
+            *[np.ones((n_students, 30), dtype=np.int8)] * 4,
+            np.ones((n_students, 23), dtype=np.int8))
+
+    size = responses(10).nbytes()
+    cache = _ResponsesCache(max_bytes=2 * size)
+    cache.put('a', responses(10))
+    cache.put('b', responses(10))
+    assert cache.get('a') is not None
+    cache.put('c', responses(10))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    cache.put('d', responses(30))
+    assert cache.get('d') is None
+    assert len(cache) == 2
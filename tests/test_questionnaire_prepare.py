@@ -91,7 +91,7 @@ def test_clean_data():
     assert df.equals(result)
 
 
-def test_validity(app, MonkeyDBDates):
+def test_validity(app, MonkeyCourseDates):
     df = pd.DataFrame(data={
         "course_id": [0, 0, 0, 0, 0],  # dummy
         "pre_post": [1, 1, 2, 2, 0],
@@ -160,3 +160,26 @@ def test_pipeline(app):
     with app.app_context():
         df = PrepareData(df)
     assert df.equals(result)
+
+
+def test_validity_time_from_course_db(app):
+    start_pre = datetime.date.fromtimestamp(123456789)
+    start_post = datetime.date.fromtimestamp(123456989)
+    df = pd.DataFrame(data={
+        "course_id": ['abxce', 'abxce', 'abxce', 'oiuyt', 'unknown', np.nan],
+        "pre_post": [1, 1, 2, 1, 1, 1],
+        "qcontrol": [4, 4, 4, 4, 4, 4],
+        "qcontrol2": [4, 4, 4, 4, 4, 4],
+        "end": pd.to_datetime([
+            start_pre + datetime.timedelta(days=14),
+            start_pre + datetime.timedelta(days=15),
+            start_post,
+            start_pre - datetime.timedelta(days=1),
+            start_pre,
+            start_pre,
+        ]),
+    })
+    with app.app_context():
+        df = AddValidity(df)
+    assert df.valid_time.tolist() == [True, False, True, False, False, False]
+    assert df.valid_control.all()
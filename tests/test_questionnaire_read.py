@@ -0,0 +1,148 @@
+import datetime
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from geclass.util.questionnaire_db import QuestionnaireDB
+from geclass.util.questionnaire_read import (
+    cache_location, read_questionnaire_chunks)
+
+
+def _write_export(path, rows):
+    header = (['data_id', 'history', 'user_agent', 'personal_code',
+               'course_code', 'pre_post', 'privacy', 'start', 'end',
+               'qcontrol', 'qcontrol2']
+              + ['q{:d}_{:d}'.format(i, j)
+                 for i in range(1, 31) for j in (1, 2)]
+              + ['post_{:d}'.format(i) for i in range(1, 24)])
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(header)
+    start = datetime.datetime(1973, 11, 30)
+    end = datetime.datetime(1973, 12, 1)
+    for code, course, pre_post, privacy, answer in rows:
+        sheet.append([1, 'long history', 'browser', code, course, pre_post,
+                      privacy, start, end, 4, 4]
+                     + [answer] * 60
+                     + [answer if pre_post == 2 else None] * 23)
+    workbook.save(path)
+
+
+def test_read_questionnaire_chunks(tmp_path):
+    path = str(tmp_path / 'data.xlsx')
+    _write_export(path, [
+        ('A', 'ABXCE', 1, 1, 4),
+        ('A', 'ABXCE', 2, 1, 5),
+        ('B', 'ABXCE', 1, 1, None),
+    ])
+    chunks = list(read_questionnaire_chunks(path, chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    df = pd.concat(chunks)
+    assert 'history' not in df.columns
+    assert 'user_agent' not in df.columns
+    assert str(df['q1_1'].dtype) == 'Int16'
+    assert str(df['pre_post'].dtype) == 'Int16'
+    assert str(chunks[0]['personal_code'].dtype) == 'category'
+    assert df['post_1'].isna().tolist() == [True, False, True]
+
+
+def test_load_questionnaire_data_in_chunks(app, runner, tmp_path):
+    path = str(tmp_path / 'data.xlsx')
+    _write_export(path, [
+        ('A', 'ABXCE', 1, 1, 4),
+        ('B', 'ABXCE', 1, 1, 3),
+        ('B', 'ABXCE', 1, 0, 3),  # no privacy agreement
+        ('A', 'ABXCE', 2, 1, 5),
+        ('C', 'unknown', 1, 1, 5),
+    ])
+    result = runner.invoke(
+        args=['load-questionnaire-data', path, '--chunksize', '2'])
+    assert 'Loaded' in result.output
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        assert len(questionnaire_db.select_all_entries('student')) == 3
+        assert len(questionnaire_db.select_all_entries('student_pre')) == 3
+        assert questionnaire_db.get_matched_responses(1).size() == 1
+
+
+def _read(path, **kwargs):
+    return pd.concat(read_questionnaire_chunks(path, chunksize=2, **kwargs),
+                     ignore_index=True)
+
+
+def test_read_excel_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'data.xlsx')
+    _write_export(path, [
+        ('A', 'ABXCE', 1, 1, 4),
+        ('A', 123, 2, 1, 5),
+        ('B', 'ABXCE', 1, 1, None),
+    ])
+    df = _read(path)
+    assert df['course_code'].tolist() == ['ABXCE', '123', 'ABXCE']
+    assert (tmp_path / 'data.parquet').exists()
+    assert cache_location(path) == str(tmp_path / 'data.parquet')
+
+    def NoExcel(*args, **kwargs):
+        raise AssertionError('the workbook was parsed again')
+
+    monkeypatch.setattr(openpyxl, 'load_workbook', NoExcel)
+    cached = _read(path)
+    assert cached.equals(df)
+    with pytest.raises(AssertionError):
+        _read(path, use_cache=False)
+
+
+def test_read_missing_codes(tmp_path):
+    path = str(tmp_path / 'data.xlsx')
+    _write_export(path, [
+        ('A', 'ABXCE', 1, 1, -998),
+        ('A', 'ABXCE', 2, 1, -999),
+        ('B', 'ABXCE', -997, 1, 4),
+    ])
+    df = _read(path)
+    assert df['q1_1'].tolist() == [-998, -999, 4]
+    assert df['post_1'].tolist()[1] == -999
+    assert df['pre_post'].tolist() == [1, 2, -997]
+    assert _read(path).equals(df)
+
+
+def test_read_columnar_formats(tmp_path):
+    path = str(tmp_path / 'data.xlsx')
+    _write_export(path, [
+        ('A', 'ABXCE', 1, 1, 4),
+        ('A', 'ABXCE', 2, 1, 5),
+        ('B', 'ABXCE', 1, 1, None),
+    ])
+    df = _read(path, use_cache=False)
+    exported = df.assign(history='long history')
+    exported.to_csv(str(tmp_path / 'data.csv'), index=False)
+    exported.to_parquet(str(tmp_path / 'data.parquet'))
+    exported.to_feather(str(tmp_path / 'data.arrow'))
+    for name in ['data.csv', 'data.parquet', 'data.arrow']:
+        assert _read(str(tmp_path / name)).equals(df)
+    with pytest.raises(ValueError):
+        _read(str(tmp_path / 'data.txt'))
+
+
+def test_read_legacy_excel(tmp_path, monkeypatch):
+    path = str(tmp_path / 'data.xlsx')
+    _write_export(path, [
+        ('A', 'ABXCE', 1, 1, 4),
+        ('A', 'ABXCE', 2, 1, 5),
+        ('B', 'ABXCE', 1, 1, None),
+    ])
+    df = _read(path, use_cache=False)
+    read_excel = pd.read_excel
+
+    def ReadXls(file_location, **kwargs):
+        # xlrd cannot be used to write an .xls workbook for the test
+        assert file_location == str(tmp_path / 'old.xls')
+        return read_excel(path, **kwargs)
+
+    monkeypatch.setattr(pd, 'read_excel', ReadXls)
+    chunks = list(read_questionnaire_chunks(
+        str(tmp_path / 'old.xls'), chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert pd.concat(chunks, ignore_index=True).equals(df)
+    assert (tmp_path / 'old.parquet').exists()
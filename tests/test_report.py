@@ -0,0 +1,283 @@
+import os
+import subprocess
+
+import pytest
+
+import geclass.util.report
+import geclass.util.report_fast
+from geclass.util.questionnaire_db import QuestionnaireDB
+
+from test_questionnaire_db import _responses_frame
+
+
+@pytest.fixture
+def MonkeyRendering(monkeypatch):
+    """Replace the plotting and latexmk, the report for tryui fails."""
+
+    def MockPlots(responses_course, responses_similar, directory='.'):
+        if directory.endswith('tryui'):
+            raise RuntimeError('broken plot')
+        with open(os.path.join(directory, 'overall_score.pgf'), 'w') as f:
+            f.write(str(responses_similar.size()))
+
+    def MockRun(command, cwd=None, **kwargs):
+        assert os.path.exists(os.path.join(cwd, 'report.tex'))
+        if '-pdf' in command:
+            jobname = command[command.index('-f') + 1].split('=')[1]
+            with open(os.path.join(cwd, jobname + '.pdf'), 'w') as f:
+                f.write('%PDF')
+        return subprocess.CompletedProcess(command, 0)
+
+    monkeypatch.setattr(geclass.util.report, 'generate_plots', MockPlots)
+    monkeypatch.setattr(geclass.util.report.subprocess, 'run', MockRun)
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_create_reports(app, runner, tmp_path, jobs, MonkeyCourseDBCourses,
+                        MonkeyEmailList, MonkeyRendering):
+    app.instance_path = str(tmp_path)
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, 5, 5),
+        ('b', 1, True, 5, 5, None),
+        ('b', 2, True, 5, 5, 5),
+    ])
+    df['course_id'] = [1, 1, 2, 2]
+    with app.app_context():
+        QuestionnaireDB().insert_data(df)
+    cwd = os.getcwd()
+    result = runner.invoke(args=['create-reports', '--jobs', str(jobs)])
+    assert os.getcwd() == cwd
+    assert 'Generated Report for abxce with 1 matched responses' \
+        in result.output
+    assert 'Finished Reports' in result.output
+    assert os.path.exists(tmp_path / 'abxce' / 'report.tex')
+    assert os.listdir(tmp_path / 'abxce').count('report.pdf') == 1
+    assert not os.path.exists(tmp_path / 'abxce' / 'report_new.pdf')
+    # course 4 is similar to course 1
+    assert (tmp_path / 'abxce' / 'overall_score.pgf').read_text() == '1'
+    subjects = MonkeyEmailList.subject
+    assert 'Fehler bei Report für Kurs tryui' in subjects
+    assert 'Kurs oiuyt hat keine gematched Antworten' in subjects
+    assert 'Kurs ertyu hat keine gematched Antworten' in subjects
+    for identifier in ('abxce', 'tryui', 'oiuyt', 'ertyu'):
+        assert os.path.isdir(tmp_path / identifier)
+    # the failed report is tried again the next time
+    assert not os.path.exists(tmp_path / 'tryui' / 'fingerprint')
+    result = runner.invoke(args=['create-reports', '--jobs', str(jobs)])
+    assert subjects.count('Fehler bei Report für Kurs tryui') == 2
+    assert 'Generated Report' not in result.output
+
+
+def test_create_reports_shares_cohorts(app, runner, tmp_path, monkeypatch,
+                                       MonkeyCourseDBCourses, MonkeyEmailList,
+                                       MonkeyRendering):
+    app.instance_path = str(tmp_path)
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, 5, 5),
+        ('b', 1, True, 5, 5, None),
+        ('b', 2, True, 5, 5, 5),
+        ('c', 1, True, 5, 5, None),
+        ('c', 2, True, 5, 5, 5),
+    ])
+    df['course_id'] = [1, 1, 4, 4, 4, 4]
+    with app.app_context():
+        QuestionnaireDB().insert_data(df)
+    requested = []
+    get_course_statistics = QuestionnaireDB.get_course_statistics
+
+    def MockStatistics(self, course_ids, *args, **kwargs):
+        requested.append(sorted(course_ids))
+        return get_course_statistics(self, course_ids, *args, **kwargs)
+
+    monkeypatch.setattr(
+        QuestionnaireDB, 'get_course_statistics', MockStatistics)
+    runner.invoke(args=['create-reports'])
+    assert requested == [[1, 2, 3, 4]]
+    # abxce and ertyu are compared to the responses of both courses
+    assert (tmp_path / 'abxce' / 'overall_score.pgf').read_text() == '3'
+    assert (tmp_path / 'ertyu' / 'overall_score.pgf').read_text() == '3'
+
+
+def test_create_reports_fingerprint(app, runner, tmp_path,
+                                    MonkeyCourseDBCourses, MonkeyEmailList,
+                                    MonkeyRendering):
+    app.instance_path = str(tmp_path)
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, 5, 5),
+    ])
+    df['course_id'] = [1, 1]
+    with app.app_context():
+        QuestionnaireDB().insert_data(df)
+    result = runner.invoke(args=['create-reports'])
+    assert 'Generated Report for abxce' in result.output
+    fingerprint = (tmp_path / 'abxce' / 'fingerprint').read_text()
+    assert len(MonkeyEmailList.subject) == 3
+
+    # nothing changed, nothing is rebuilt
+    result = runner.invoke(args=['create-reports'])
+    assert 'Generated Report' not in result.output
+    assert len(MonkeyEmailList.subject) == 3
+
+    # a late response of the similar course 4 changes abxce and ertyu
+    df = _responses_frame([
+        ('b', 1, True, 5, 5, None),
+        ('b', 2, True, 5, 5, 5),
+    ])
+    df['course_id'] = [4, 4]
+    with app.app_context():
+        QuestionnaireDB().insert_data(df)
+    result = runner.invoke(args=['create-reports'])
+    assert 'Generated Report for abxce' in result.output
+    assert 'Generated Report for ertyu' in result.output
+    assert 'tryui' not in ' '.join(MonkeyEmailList.subject[3:])
+    assert (tmp_path / 'abxce' / 'fingerprint').read_text() != fingerprint
+    assert (tmp_path / 'abxce' / 'overall_score.pgf').read_text() == '2'
+
+    result = runner.invoke(args=['create-reports', '--force'])
+    assert 'Generated Report for abxce' in result.output
+    assert 'Generated Report for ertyu' in result.output
+
+
+def test_create_reports_fast(app, runner, tmp_path, monkeypatch,
+                             MonkeyCourseDBCourses, MonkeyEmailList):
+    def MockRun(command, **kwargs):
+        raise AssertionError('LaTeX must not be run')
+
+    monkeypatch.setattr(geclass.util.report.subprocess, 'run', MockRun)
+    app.instance_path = str(tmp_path)
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, 5, 5),
+        ('b', 1, True, 1, 1, None),
+        ('b', 2, True, 4, 2, 4),
+    ])
+    df['course_id'] = [1, 1, 1, 1]
+    with app.app_context():
+        QuestionnaireDB().insert_data(df)
+    result = runner.invoke(args=['create-reports', '--fast'])
+    assert 'Generated Report for abxce with 2 matched responses' \
+        in result.output
+    report = (tmp_path / 'abxce' / 'report.pdf').read_bytes()
+    assert report.startswith(b'%PDF')
+    # the summary and the five plots
+    assert report.count(b'/Type /Page') - report.count(b'/Type /Pages') == 6
+    assert not (tmp_path / 'abxce' / 'report.tex').exists()
+
+    # a changed text of the fast layout changes the fingerprint
+    result = runner.invoke(args=['create-reports', '--fast'])
+    assert 'Generated Report' not in result.output
+    monkeypatch.setattr(geclass.util.report_fast, '_INTRODUCTION',
+                        ['Ein neuer Text.'])
+    result = runner.invoke(args=['create-reports', '--fast'])
+    assert 'Generated Report for abxce' in result.output
+
+    # switching to LaTeX changes the fingerprint
+    monkeypatch.setattr(geclass.util.report, 'render_report',
+                        lambda *args: None)
+    result = runner.invoke(args=['create-reports'])
+    assert 'Generated Report for abxce' in result.output
+
+
+def test_create_reports_keeps_previous_pdf(app, runner, tmp_path, monkeypatch,
+                                           MonkeyCourseDBCourses,
+                                           MonkeyEmailList, MonkeyRendering):
+    app.instance_path = str(tmp_path)
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, 5, 5),
+    ])
+    df['course_id'] = [1, 1]
+    with app.app_context():
+        QuestionnaireDB().insert_data(df)
+    runner.invoke(args=['create-reports'])
+    report_pdf = tmp_path / 'abxce' / 'report.pdf'
+    fingerprint = (tmp_path / 'abxce' / 'fingerprint').read_text()
+
+    def FailingRun(command, cwd=None, **kwargs):
+        # LaTeX leaves an incomplete pdf behind
+        with open(os.path.join(cwd, 'report_new.pdf'), 'w') as f:
+            f.write('%PDF incomplete')
+        return subprocess.CompletedProcess(command, 1)
+
+    monkeypatch.setattr(geclass.util.report.subprocess, 'run', FailingRun)
+    result = runner.invoke(args=['create-reports', '--force'])
+    assert 'Generated Report for abxce' not in result.output
+    assert report_pdf.read_text() == '%PDF'
+    assert not (tmp_path / 'abxce' / 'report_new.pdf').exists()
+    assert (tmp_path / 'abxce' / 'fingerprint').read_text() == fingerprint
+
+
+def test_render_report_fast_failure(tmp_path, monkeypatch):
+    report_pdf = tmp_path / 'report.pdf'
+    report_pdf.write_text('%PDF previous')
+
+    def BrokenFigure(*args, **kwargs):
+        raise RuntimeError('broken plot')
+
+    monkeypatch.setattr(geclass.util.report_fast, 'overall_score_figure',
+                        BrokenFigure)
+    values = {'course_name': 'abxce', 'course_pre': 1, 'course_post': 1,
+              'course_matched': 1, 'course_reported': 1, 'course_ratio': 1.,
+              'similar_matched': 1}
+    failure = geclass.util.report_fast.render_report_fast(
+        str(tmp_path), None, None, values)
+    assert 'broken plot' in failure
+    assert report_pdf.read_text() == '%PDF previous'
+    assert os.listdir(tmp_path) == ['report.pdf']
+
+
+def test_create_reports_refreshes_stale_statistics(app, runner, tmp_path,
+                                                   MonkeyCourseDBCourses,
+                                                   MonkeyEmailList,
+                                                   MonkeyRendering):
+    app.instance_path = str(tmp_path)
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, 5, 5),
+    ])
+    df['course_id'] = [1, 1]
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(df)
+        questionnaire_db.execute('DELETE FROM course_statistics', ())
+        questionnaire_db.set_metadata('course_statistics_stale', 1)
+        questionnaire_db().commit()
+    result = runner.invoke(args=['create-reports'])
+    assert 'Generated Report for abxce' in result.output
+    assert (tmp_path / 'abxce' / 'overall_score.pgf').read_text() == '1'
+    with app.app_context():
+        assert QuestionnaireDB().get_metadata(
+            'course_statistics_stale') is None
+
+
+def test_create_reports_fingerprint_statistics(app, runner, tmp_path,
+                                               MonkeyCourseDBCourses,
+                                               MonkeyEmailList,
+                                               MonkeyRendering):
+    app.instance_path = str(tmp_path)
+    df = _responses_frame([
+        ('a', 1, True, 5, 5, None),
+        ('a', 2, True, 5, 5, 5),
+    ])
+    df['course_id'] = [1, 1]
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        questionnaire_db.insert_data(df)
+        # statistics that were lost without being marked as stale
+        questionnaire_db.execute('DELETE FROM course_statistics', ())
+        questionnaire_db().commit()
+    result = runner.invoke(args=['create-reports'])
+    assert 'Generated Report for abxce' in result.output
+    assert (tmp_path / 'abxce' / 'overall_score.pgf').read_text() == '0'
+
+    # the report is rebuilt with the repaired statistics
+    with app.app_context():
+        questionnaire_db = QuestionnaireDB()
+        with questionnaire_db.transaction():
+            questionnaire_db.refresh_all_course_statistics()
+    result = runner.invoke(args=['create-reports'])
+    assert 'Generated Report for abxce' in result.output
+    assert (tmp_path / 'abxce' / 'overall_score.pgf').read_text() == '1'
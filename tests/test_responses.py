@@ -0,0 +1,121 @@
+import numpy as np
+
+from geclass.util.responses import (
+        compare_expert, Responses, ResponseAggregate, QuestionnaireResponses,
+        QuestionnaireSummary, ResponseSummary)
+
+
+def test_compare_expert():
+    experts = np.array([1, -1, 1, -1, 1])
+    answers = np.array([5, 5, 3, -999, 0])
+    np.testing.assert_array_equal(
+        compare_expert(answers, experts), [1, 0, 0, -998, -998])
+    np.testing.assert_array_equal(
+        compare_expert(answers, experts, disagreement=True),
+        [1, -1, 0, -998, -998])
+    answers = np.array([[1, 2, 3, 4, 5], [-997, -998, 2, 4, 1]])
+    np.testing.assert_array_equal(
+        compare_expert(answers, experts),
+        [[0, 1, 0, 0, 1], [-998, -998, 0, 0, 0]])
+
+
+def _random_answers(rng, n_students, n_questions):
+    answers = rng.integers(1, 6, size=(n_students, n_questions))
+    answers[rng.random(size=answers.shape) < 0.1] = -999
+    return answers
+
+
+def test_from_answers_equals_responses():
+    rng = np.random.default_rng(3)
+    for disagreement in (False, True):
+        answers = [_random_answers(rng, 7, 30) for _ in range(4)]
+        answers.append(_random_answers(rng, 7, 23))
+        students = [
+            Responses(*(block[i] for block in answers), disagreement)
+            for i in range(7)
+        ]
+        expected = QuestionnaireResponses(students)
+        result = QuestionnaireResponses.from_answers(*answers, disagreement)
+        for attr in ('q_mark', 'q_you_pre', 'q_you_post', 'q_expert_pre',
+                     'q_expert_post'):
+            np.testing.assert_array_equal(
+                getattr(result, attr).responses,
+                getattr(expected, attr).responses)
+        assert result.size() == 7
+        subset = result.subset(slice(2, 4))
+        assert subset.size() == 2
+        np.testing.assert_array_equal(
+            subset.q_mark.responses, expected.q_mark.responses[2:4])
+
+
+def test_response_aggregate():
+    q_mark_1 = np.array([0, 1, -998, 1, 0])
+    q_mark_2 = np.array([1, -998, 0, 0, -998])
+    aggregate = ResponseAggregate([q_mark_1, q_mark_2])
+    np.testing.assert_array_equal(aggregate[0], [0, 1])
+    np.testing.assert_array_equal(aggregate[1], [1])
+    assert len(aggregate) == 7
+    assert aggregate.size() == 2
+    assert len(list(aggregate)) == 5
+    np.testing.assert_array_equal(aggregate.col_sums(), [1, 1, 0, 1, 0])
+    np.testing.assert_array_equal(aggregate.valid_counts(), [2, 1, 1, 2, 1])
+    column = aggregate.column(1)
+    assert np.shares_memory(column, aggregate.responses)
+    assert column.sum() == 1
+    aggregate.responses = np.array([q_mark_1])
+    assert len(aggregate) == 4
+    np.testing.assert_array_equal(aggregate.valid_counts(), [1, 1, 0, 1, 1])
+
+
+def test_empty_response_aggregate():
+    aggregate = ResponseAggregate([])
+    assert len(aggregate) == 0
+    assert aggregate.size() == 0
+    assert list(aggregate) == []
+
+
+def test_concatenate():
+    rng = np.random.default_rng(5)
+    parts = []
+    for n_students in (3, 0, 4):
+        answers = [_random_answers(rng, n_students, 30) for _ in range(4)]
+        answers.append(_random_answers(rng, n_students, 23))
+        parts.append(QuestionnaireResponses.from_answers(*answers))
+    parts.append(QuestionnaireResponses([]))
+    joined = QuestionnaireResponses.concatenate(parts)
+    assert joined.size() == 7
+    np.testing.assert_array_equal(
+        joined.q_you_pre.responses,
+        np.concatenate([parts[0].q_you_pre.responses,
+                        parts[2].q_you_pre.responses]))
+    appended = QuestionnaireResponses([])
+    for part in parts:
+        appended.append(part)
+    np.testing.assert_array_equal(
+        appended.q_mark.responses, joined.q_mark.responses)
+
+    shared = QuestionnaireResponses.concatenate(parts[:2])
+    assert shared.size() == 3
+    assert np.shares_memory(shared.q_mark.responses, parts[0].q_mark.responses)
+    assert not shared.q_mark.responses.flags.writeable
+    assert parts[0].q_mark.responses.flags.writeable
+
+
+def test_questionnaire_summary():
+    rng = np.random.default_rng(7)
+    parts = []
+    for n_students in (3, 0, 4):
+        answers = [_random_answers(rng, n_students, 30) for _ in range(4)]
+        answers.append(_random_answers(rng, n_students, 23))
+        parts.append(QuestionnaireResponses.from_answers(*answers))
+    summaries = [QuestionnaireSummary.from_responses(part) for part in parts]
+    assert summaries[1] == QuestionnaireSummary()
+    total = QuestionnaireSummary.total(summaries)
+    assert total == QuestionnaireSummary.from_responses(
+        QuestionnaireResponses.concatenate(parts))
+    assert total.size() == 7
+    assert total.q_mark.sums.shape == (23,)
+    assert total - summaries[0] == summaries[2]
+    np.testing.assert_array_equal(
+        total.q_you_pre.counts,
+        parts[0].q_you_pre.valid_counts() + parts[2].q_you_pre.valid_counts())
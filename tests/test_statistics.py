@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+import pytest
+import scipy.stats as stats
+
+from geclass.util.responses import ResponseAggregate, ResponseSummary
+from geclass.util.statistics import (
+        aggregate_mean, aggregate_stderr, aggregate_mean_colwise,
+        aggregate_confidence_colwise
+)
+
+
+@pytest.fixture
+def responses():
+    return np.array([
+        [1, 0, -998, 1],
+        [1, 1, 0, -998],
+        [0, 1, 0, 1],
+    ])
+
+
+def test_aggregate_mean(responses):
+    assert aggregate_mean(ResponseAggregate(responses)) == pytest.approx(6/10)
+    assert aggregate_mean(ResponseAggregate([])) == 0
+
+
+def test_aggregate_stderr(responses):
+    aggregate = ResponseAggregate(responses)
+    mean = 0.6
+    expected = math.sqrt((6 * 0.4**2 + 4 * 0.6**2) / 9) / math.sqrt(10)
+    assert aggregate_stderr(aggregate) == pytest.approx(expected)
+    assert aggregate_stderr(aggregate, mean=mean) == pytest.approx(expected)
+    assert aggregate_stderr(ResponseAggregate([])) == 0
+
+
+def test_aggregate_colwise(responses):
+    aggregate = ResponseAggregate(responses)
+    B = stats.chi2.ppf(1 - 0.05 / 4, 2)
+    n = np.array([2, 2, 0, 2])
+    np.testing.assert_allclose(
+        aggregate_mean_colwise(aggregate), (n + B / 2) / (3 + B))
+    np.testing.assert_allclose(
+        aggregate_confidence_colwise(aggregate),
+        np.sqrt((B**2 / 4 + B * n * (1 - n / 3)) / (3 + B)**2))
+
+
+def test_batch_axis(responses):
+    other = np.where(responses == -998, -998, 1 - responses)
+    other[0, 0] = -998
+    batch = np.stack([responses, other])
+    for function in (aggregate_mean, aggregate_stderr, aggregate_mean_colwise,
+                     aggregate_confidence_colwise):
+        result = function(batch)
+        np.testing.assert_allclose(result[0], function(responses))
+        np.testing.assert_allclose(result[1], function(other))
+
+
+def test_summary(responses):
+    other = np.where(responses == -998, -998, 1 - responses)
+    disagreement = np.array([[-1, 0, 1, -998], [1, 1, -1, 0]])
+    for function in (aggregate_mean, aggregate_stderr, aggregate_mean_colwise,
+                     aggregate_confidence_colwise):
+        for part in (responses, disagreement):
+            np.testing.assert_allclose(
+                function(ResponseSummary.from_aggregate(
+                    ResponseAggregate(part))),
+                function(ResponseAggregate(part)))
+        summary = (ResponseSummary.from_aggregate(ResponseAggregate(responses))
+                   + ResponseSummary.from_aggregate(ResponseAggregate(other)))
+        np.testing.assert_allclose(
+            function(summary),
+            function(ResponseAggregate(np.concatenate([responses, other]))))